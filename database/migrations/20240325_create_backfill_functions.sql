@@ -0,0 +1,80 @@
+-- Funções de backfill "set-based" usadas pelos scripts de correção de chaves estrangeiras.
+-- Cada chamada processa um único lote de chaves (ordenadas pelo ID do Bubble) em um
+-- UPDATE ... FROM e devolve a quantidade de linhas afetadas e a última chave do lote.
+-- O script chama a função em loop, passando a última chave, até ela retornar NULL;
+-- assim cada lote roda em uma transação curta e a tabela não fica bloqueada.
+
+-- aulas.id_modulo a partir de modulos.id_bubble_modulo
+CREATE OR REPLACE FUNCTION public.backfill_aulas_id_modulo(
+    p_apos TEXT DEFAULT NULL,
+    p_limite INTEGER DEFAULT 5000
+)
+RETURNS TABLE (atualizadas INTEGER, ultima_chave TEXT) AS $$
+BEGIN
+    RETURN QUERY
+    WITH lote AS (
+        SELECT DISTINCT a.id_bubble_aula
+        FROM public.aulas a
+        WHERE a.id_bubble_aula IS NOT NULL
+        AND (p_apos IS NULL OR a.id_bubble_aula > p_apos)
+        ORDER BY a.id_bubble_aula
+        LIMIT p_limite
+    ), alteradas AS (
+        UPDATE public.aulas a
+        SET id_modulo = m.id_modulo
+        FROM lote l, public.modulos m
+        WHERE a.id_bubble_aula = l.id_bubble_aula
+        AND m.id_bubble_modulo = a.id_bubble_modulo
+        AND a.id_modulo IS DISTINCT FROM m.id_modulo
+        RETURNING 1
+    )
+    SELECT
+        (SELECT COUNT(*) FROM alteradas)::INTEGER,
+        (SELECT MAX(l.id_bubble_aula) FROM lote l)::TEXT;
+END;
+$$ LANGUAGE plpgsql;
+
+-- modulos.id_curso a partir de cursos.id_bubble_curso.
+-- p_coluna_curso indica qual coluna de cursos é gravada em modulos.id_curso
+-- ('id_curso' em update_modulos_curso_id.py, 'id' em update_modules.py).
+CREATE OR REPLACE FUNCTION public.backfill_modulos_id_curso(
+    p_apos TEXT DEFAULT NULL,
+    p_limite INTEGER DEFAULT 5000,
+    p_coluna_curso TEXT DEFAULT 'id_curso',
+    p_somente_nulos BOOLEAN DEFAULT false
+)
+RETURNS TABLE (atualizadas INTEGER, ultima_chave TEXT) AS $$
+BEGIN
+    IF p_coluna_curso NOT IN ('id', 'id_curso') THEN
+        RAISE EXCEPTION 'Coluna de curso inválida: %', p_coluna_curso;
+    END IF;
+
+    RETURN QUERY EXECUTE format($sql$
+        WITH lote AS (
+            SELECT DISTINCT mo.id_bubble_modulo
+            FROM public.modulos mo
+            WHERE mo.id_bubble_modulo IS NOT NULL
+            AND ($1::TEXT IS NULL OR mo.id_bubble_modulo > $1)
+            ORDER BY mo.id_bubble_modulo
+            LIMIT $2
+        ), alteradas AS (
+            UPDATE public.modulos mo
+            SET id_curso = c.%1$I
+            FROM lote l, public.cursos c
+            WHERE mo.id_bubble_modulo = l.id_bubble_modulo
+            AND c.id_bubble_curso = mo.id_bubble_curso
+            AND (NOT $3 OR mo.id_curso IS NULL)
+            AND mo.id_curso IS DISTINCT FROM c.%1$I
+            RETURNING 1
+        )
+        SELECT
+            (SELECT COUNT(*) FROM alteradas)::INTEGER,
+            (SELECT MAX(l.id_bubble_modulo) FROM lote l)::TEXT
+    $sql$, p_coluna_curso)
+    USING p_apos, p_limite, p_somente_nulos;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Os índices nas chaves do Bubble mantêm cada lote barato
+CREATE INDEX IF NOT EXISTS idx_aulas_id_bubble_aula ON public.aulas(id_bubble_aula);
+CREATE INDEX IF NOT EXISTS idx_modulos_id_bubble_modulo ON public.modulos(id_bubble_modulo);
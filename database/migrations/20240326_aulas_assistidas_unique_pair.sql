@@ -0,0 +1,13 @@
+-- Par (id_aula, id_usuario) único em aulas_assistidas.
+-- Permite que scripts/aulas_assistidas.py --incremental use upsert com
+-- on_conflict=id_aula,id_usuario, tornando a importação idempotente.
+
+-- Remove duplicados de execuções anteriores do import, mantendo a linha mais antiga
+DELETE FROM public.aulas_assistidas a
+USING public.aulas_assistidas b
+WHERE a.id_aula = b.id_aula
+AND a.id_usuario = b.id_usuario
+AND a.ctid > b.ctid;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_aulas_assistidas_aula_usuario
+    ON public.aulas_assistidas (id_aula, id_usuario);
@@ -0,0 +1,38 @@
+-- Backfill genérico de chaves substitutas (UUID) usado por scripts/backfill_chaves.py --servidor.
+-- Cada chamada preenche p_coluna_chave com gen_random_uuid() para um lote de até p_limite
+-- valores de p_coluna_natural cuja chave ainda é nula, em uma transação curta, e devolve
+-- as linhas afetadas e o último valor natural do lote. O script chama em loop a partir
+-- desse valor até receber NULL (mesmo contrato de 20240325_create_backfill_functions.sql).
+CREATE OR REPLACE FUNCTION public.backfill_chave_uuid(
+    p_tabela TEXT,
+    p_coluna_chave TEXT,
+    p_coluna_natural TEXT,
+    p_apos TEXT DEFAULT NULL,
+    p_limite INTEGER DEFAULT 5000
+)
+RETURNS TABLE (atualizadas INTEGER, ultima_chave TEXT) AS $$
+BEGIN
+    RETURN QUERY EXECUTE format($sql$
+        WITH lote AS (
+            SELECT DISTINCT t.%3$I::TEXT AS natural
+            FROM public.%1$I t
+            WHERE t.%2$I IS NULL
+            AND t.%3$I IS NOT NULL
+            AND ($1::TEXT IS NULL OR t.%3$I::TEXT > $1)
+            ORDER BY 1
+            LIMIT $2
+        ), alteradas AS (
+            UPDATE public.%1$I t
+            SET %2$I = gen_random_uuid()
+            FROM lote l
+            WHERE t.%3$I::TEXT = l.natural
+            AND t.%2$I IS NULL
+            RETURNING 1
+        )
+        SELECT
+            (SELECT COUNT(*) FROM alteradas)::INTEGER,
+            (SELECT MAX(l.natural) FROM lote l)
+    $sql$, p_tabela, p_coluna_chave, p_coluna_natural)
+    USING p_apos, p_limite;
+END;
+$$ LANGUAGE plpgsql;
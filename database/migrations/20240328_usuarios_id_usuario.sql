@@ -0,0 +1,25 @@
+-- Coluna id_usuario (UUID) em usuarios, antes criada por scripts/tabela_usuarios.py.
+-- A coluna é adicionada sem DEFAULT (um DEFAULT volátil reescreveria a tabela inteira
+-- dentro do ALTER); o DEFAULT vem em seguida e só vale para linhas novas. As linhas
+-- existentes são preenchidas em faixas de id pelo scripts/aplicar_migracoes.py, cada
+-- faixa em uma transação curta. Todos os passos podem ser repetidos sem efeito.
+ALTER TABLE public.usuarios ADD COLUMN IF NOT EXISTS id_usuario UUID;
+ALTER TABLE public.usuarios ALTER COLUMN id_usuario SET DEFAULT gen_random_uuid();
+
+-- migrar:backfill tabela=usuarios chave=id lote=5000
+UPDATE public.usuarios
+SET id_usuario = gen_random_uuid()
+WHERE id BETWEEN %(de)s AND %(ate)s
+AND id_usuario IS NULL;
+-- migrar:fim
+
+-- migrar:autocommit
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS unique_id_usuario ON public.usuarios (id_usuario);
+-- migrar:fim
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'unique_id_usuario') THEN
+        ALTER TABLE public.usuarios ADD CONSTRAINT unique_id_usuario UNIQUE USING INDEX unique_id_usuario;
+    END IF;
+END $$;
@@ -0,0 +1,78 @@
+-- Índices para os padrões de acesso dos scripts de migração (gerado por scripts/verificar_indices.py).
+-- Aplicar com scripts/aplicar_migracoes.py: os blocos autocommit rodam fora de transação.
+
+-- aulas(id_bubble_aula) único
+DO $$
+DECLARE
+    duplicados TEXT;
+BEGIN
+    SELECT string_agg(chave, ', ') INTO duplicados FROM (
+        SELECT concat_ws('/', id_bubble_aula) AS chave FROM public.aulas
+        WHERE (id_bubble_aula) IS NOT NULL
+        GROUP BY id_bubble_aula HAVING COUNT(*) > 1 LIMIT 20
+    ) d;
+    IF duplicados IS NOT NULL THEN
+        RAISE EXCEPTION 'aulas(id_bubble_aula) tem valores duplicados: %', duplicados;
+    END IF;
+END $$;
+
+-- migrar:autocommit
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_aulas_id_bubble_aula ON public.aulas (id_bubble_aula);
+-- migrar:fim
+
+-- cursos(id_bubble_curso) único (usado por backfill_modulos_id_curso, bubble_cache)
+DO $$
+DECLARE
+    duplicados TEXT;
+BEGIN
+    SELECT string_agg(chave, ', ') INTO duplicados FROM (
+        SELECT concat_ws('/', id_bubble_curso) AS chave FROM public.cursos
+        WHERE (id_bubble_curso) IS NOT NULL
+        GROUP BY id_bubble_curso HAVING COUNT(*) > 1 LIMIT 20
+    ) d;
+    IF duplicados IS NOT NULL THEN
+        RAISE EXCEPTION 'cursos(id_bubble_curso) tem valores duplicados: %', duplicados;
+    END IF;
+END $$;
+
+-- migrar:autocommit
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_cursos_id_bubble_curso ON public.cursos (id_bubble_curso);
+-- migrar:fim
+
+-- modulos(id_bubble_modulo) único (usado por preenche_modulos)
+DO $$
+DECLARE
+    duplicados TEXT;
+BEGIN
+    SELECT string_agg(chave, ', ') INTO duplicados FROM (
+        SELECT concat_ws('/', id_bubble_modulo) AS chave FROM public.modulos
+        WHERE (id_bubble_modulo) IS NOT NULL
+        GROUP BY id_bubble_modulo HAVING COUNT(*) > 1 LIMIT 20
+    ) d;
+    IF duplicados IS NOT NULL THEN
+        RAISE EXCEPTION 'modulos(id_bubble_modulo) tem valores duplicados: %', duplicados;
+    END IF;
+END $$;
+
+-- migrar:autocommit
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_modulos_id_bubble_modulo ON public.modulos (id_bubble_modulo);
+-- migrar:fim
+
+-- usuarios(id_bubble_usuario) único (usado por aulas_assistidas, bubble_cache)
+DO $$
+DECLARE
+    duplicados TEXT;
+BEGIN
+    SELECT string_agg(chave, ', ') INTO duplicados FROM (
+        SELECT concat_ws('/', id_bubble_usuario) AS chave FROM public.usuarios
+        WHERE (id_bubble_usuario) IS NOT NULL
+        GROUP BY id_bubble_usuario HAVING COUNT(*) > 1 LIMIT 20
+    ) d;
+    IF duplicados IS NOT NULL THEN
+        RAISE EXCEPTION 'usuarios(id_bubble_usuario) tem valores duplicados: %', duplicados;
+    END IF;
+END $$;
+
+-- migrar:autocommit
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_usuarios_id_bubble_usuario ON public.usuarios (id_bubble_usuario);
+-- migrar:fim
@@ -0,0 +1,48 @@
+-- Progresso materializado por usuário, módulo e curso.
+-- Preenchido por scripts/progresso_usuarios.py a partir de aulas_assistidas
+-- (aulas -> modulos -> cursos pelos IDs do Bubble), para que o frontend leia
+-- uma linha pronta em vez de juntar aulas_assistidas a cada carregamento.
+-- Só existem linhas com ao menos uma aula assistida: ausência = 0%.
+
+CREATE TABLE IF NOT EXISTS public.progresso_usuarios (
+    id_usuario UUID NOT NULL,
+    escopo TEXT NOT NULL CHECK (escopo IN ('modulo', 'curso')),
+    id_bubble TEXT NOT NULL,
+    id_bubble_curso TEXT NOT NULL,
+    aulas_assistidas INTEGER NOT NULL,
+    total_aulas INTEGER NOT NULL,
+    percentual NUMERIC(5, 2) NOT NULL,
+    atualizado_em TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id_usuario, escopo, id_bubble)
+);
+
+-- Progresso de todos os módulos de um curso para um usuário (página do curso)
+CREATE INDEX IF NOT EXISTS idx_progresso_usuarios_usuario_curso
+    ON public.progresso_usuarios (id_usuario, id_bubble_curso);
+
+-- Remoção das linhas que não foram regravadas em um recálculo completo
+CREATE INDEX IF NOT EXISTS idx_progresso_usuarios_atualizado_em
+    ON public.progresso_usuarios (atualizado_em);
+
+-- Recálculo incremental: busca todas as aulas assistidas dos usuários alterados (.in_('id_usuario', ...))
+-- migrar:autocommit
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_aulas_assistidas_id_usuario
+    ON public.aulas_assistidas (id_usuario);
+-- migrar:fim
+
+-- Políticas de segurança: cada usuário lê só o próprio progresso (usuarios.id_usuario
+-- ligado ao login pelo email de users). Não há política de escrita: só o service role,
+-- usado por scripts/progresso_usuarios.py, grava na tabela.
+ALTER TABLE public.progresso_usuarios ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Usuários veem o próprio progresso" ON public.progresso_usuarios;
+CREATE POLICY "Usuários veem o próprio progresso" ON public.progresso_usuarios
+    FOR SELECT USING (
+        EXISTS (
+            SELECT 1
+            FROM public.usuarios u
+            JOIN public.users us ON us.email = u.email
+            WHERE u.id_usuario = progresso_usuarios.id_usuario
+            AND us.id = auth.uid()
+        )
+    );
@@ -0,0 +1,85 @@
+-- Refaz as funções de 20240325_create_backfill_functions.sql paginando pela chave
+-- primária (id) em vez do ID do Bubble: as linhas com id_bubble_aula / id_bubble_modulo
+-- NULL ficavam fora de todos os lotes e nunca eram preenchidas. O contrato não muda:
+-- p_apos é a última chave do lote anterior (como texto) e ultima_chave volta NULL
+-- quando a tabela acaba. O tipo de id é lido do catálogo, então o mesmo SQL serve
+-- para chaves UUID ou inteiras, e cada lote usa o índice da chave primária.
+
+-- aulas.id_modulo a partir de modulos.id_bubble_modulo
+CREATE OR REPLACE FUNCTION public.backfill_aulas_id_modulo(
+    p_apos TEXT DEFAULT NULL,
+    p_limite INTEGER DEFAULT 5000
+)
+RETURNS TABLE (atualizadas INTEGER, ultima_chave TEXT) AS $$
+DECLARE
+    v_tipo TEXT := (
+        SELECT format_type(atttypid, atttypmod) FROM pg_attribute
+        WHERE attrelid = 'public.aulas'::regclass AND attname = 'id'
+    );
+BEGIN
+    RETURN QUERY EXECUTE format($sql$
+        WITH lote AS (
+            SELECT a.id
+            FROM public.aulas a
+            WHERE ($1::TEXT IS NULL OR a.id > $1::%1$s)
+            ORDER BY a.id
+            LIMIT $2
+        ), alteradas AS (
+            UPDATE public.aulas a
+            SET id_modulo = m.id_modulo
+            FROM lote l, public.modulos m
+            WHERE a.id = l.id
+            AND m.id_bubble_modulo = a.id_bubble_modulo
+            AND a.id_modulo IS DISTINCT FROM m.id_modulo
+            RETURNING 1
+        )
+        SELECT
+            (SELECT COUNT(*) FROM alteradas)::INTEGER,
+            (SELECT l.id FROM lote l ORDER BY l.id DESC LIMIT 1)::TEXT
+    $sql$, v_tipo)
+    USING p_apos, p_limite;
+END;
+$$ LANGUAGE plpgsql;
+
+-- modulos.id_curso a partir de cursos.id_bubble_curso (mesmos parâmetros de 20240325)
+CREATE OR REPLACE FUNCTION public.backfill_modulos_id_curso(
+    p_apos TEXT DEFAULT NULL,
+    p_limite INTEGER DEFAULT 5000,
+    p_coluna_curso TEXT DEFAULT 'id_curso',
+    p_somente_nulos BOOLEAN DEFAULT false
+)
+RETURNS TABLE (atualizadas INTEGER, ultima_chave TEXT) AS $$
+DECLARE
+    v_tipo TEXT := (
+        SELECT format_type(atttypid, atttypmod) FROM pg_attribute
+        WHERE attrelid = 'public.modulos'::regclass AND attname = 'id'
+    );
+BEGIN
+    IF p_coluna_curso NOT IN ('id', 'id_curso') THEN
+        RAISE EXCEPTION 'Coluna de curso inválida: %', p_coluna_curso;
+    END IF;
+
+    RETURN QUERY EXECUTE format($sql$
+        WITH lote AS (
+            SELECT mo.id
+            FROM public.modulos mo
+            WHERE ($1::TEXT IS NULL OR mo.id > $1::%2$s)
+            ORDER BY mo.id
+            LIMIT $2
+        ), alteradas AS (
+            UPDATE public.modulos mo
+            SET id_curso = c.%1$I
+            FROM lote l, public.cursos c
+            WHERE mo.id = l.id
+            AND c.id_bubble_curso = mo.id_bubble_curso
+            AND (NOT $3 OR mo.id_curso IS NULL)
+            AND mo.id_curso IS DISTINCT FROM c.%1$I
+            RETURNING 1
+        )
+        SELECT
+            (SELECT COUNT(*) FROM alteradas)::INTEGER,
+            (SELECT l.id FROM lote l ORDER BY l.id DESC LIMIT 1)::TEXT
+    $sql$, p_coluna_curso, v_tipo)
+    USING p_apos, p_limite, p_somente_nulos;
+END;
+$$ LANGUAGE plpgsql;
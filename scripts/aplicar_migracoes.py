@@ -0,0 +1,303 @@
+import argparse
+import glob
+import hashlib
+import os
+import re
+import sys
+import time
+from collections import namedtuple
+
+from dotenv import load_dotenv
+
+from metricas import Metricas, perfilar
+from pg_copy import MIGRATIONS_DIR, conectar
+
+# Carrega as variáveis de ambiente (SUPABASE_DB_URL)
+load_dotenv()
+
+# Chaves por lote padrão de um passo "migrar:backfill"
+BACKFILL_LOTE = 5000
+# Identificador do advisory lock que impede duas execuções simultâneas
+LOCK_ID = 7_240_328
+
+SQL_CONTROLE = """
+CREATE SCHEMA IF NOT EXISTS migracoes;
+CREATE TABLE IF NOT EXISTS migracoes.aplicadas (
+    versao TEXT PRIMARY KEY,
+    checksum TEXT NOT NULL,
+    aplicada_em TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    duracao_ms INTEGER
+);
+"""
+
+# Passo de uma migração: tipo ('sql', 'backfill' ou 'autocommit'), texto SQL e opções da diretiva
+Passo = namedtuple('Passo', 'tipo sql opcoes')
+Migracao = namedtuple('Migracao', 'versao path checksum')
+
+_DIRETIVA = re.compile(r'^\s*--\s*migrar:(\w+)(.*)$')
+
+def listar_migracoes(migrations_dir=MIGRATIONS_DIR):
+    """Lista database/migrations/*.sql em ordem de nome (a versão é o nome sem extensão)."""
+    migracoes = []
+    for path in sorted(glob.glob(os.path.join(migrations_dir, '*.sql'))):
+        with open(path, 'rb') as file:
+            checksum = hashlib.sha256(file.read()).hexdigest()
+        migracoes.append(Migracao(os.path.splitext(os.path.basename(path))[0], path, checksum))
+    return migracoes
+
+def _opcoes(texto):
+    opcoes = dict(item.split('=', 1) for item in texto.split())
+    if 'lote' in opcoes:
+        opcoes['lote'] = int(opcoes['lote'])
+    if 'pausa' in opcoes:
+        opcoes['pausa'] = float(opcoes['pausa'])
+    return opcoes
+
+def dividir_passos(texto):
+    """Divide o SQL de uma migração nos passos delimitados pelas diretivas `-- migrar:`.
+
+    Fora das diretivas o SQL roda em uma única transação. Os blocos especiais são:
+
+    -- migrar:backfill tabela=<tabela> chave=<coluna> [lote=5000] [pausa=0]
+        Um UPDATE com `BETWEEN %(de)s AND %(ate)s` sobre `chave`, executado em faixas
+        de `lote` chaves, cada faixa em sua própria transação. Use `%%` para um `%` literal.
+    -- migrar:autocommit
+        Um único comando que não pode rodar em transação (CREATE INDEX CONCURRENTLY).
+
+    Cada bloco termina em `-- migrar:fim`.
+    """
+    passos, linhas, atual = [], [], ('sql', {})
+
+    def fechar():
+        sql = "\n".join(linhas).strip()
+        # Trechos só com comentários viram consultas vazias, que o driver rejeita
+        if any(linha.strip() and not linha.strip().startswith('--') for linha in linhas):
+            passos.append(Passo(atual[0], sql, atual[1]))
+        linhas.clear()
+
+    for numero, linha in enumerate(texto.splitlines(), start=1):
+        diretiva = _DIRETIVA.match(linha)
+        if not diretiva:
+            linhas.append(linha)
+            continue
+        nome, resto = diretiva.groups()
+        if nome == 'fim':
+            if atual[0] == 'sql':
+                raise ValueError(f"linha {numero}: 'migrar:fim' sem bloco aberto")
+            fechar()
+            atual = ('sql', {})
+        elif nome in ('backfill', 'autocommit'):
+            if atual[0] != 'sql':
+                raise ValueError(f"linha {numero}: bloco 'migrar:{atual[0]}' não foi fechado")
+            fechar()
+            atual = (nome, _opcoes(resto))
+            if nome == 'backfill' and not {'tabela', 'chave'} <= set(atual[1]):
+                raise ValueError(f"linha {numero}: 'migrar:backfill' precisa de tabela= e chave=")
+        else:
+            raise ValueError(f"linha {numero}: diretiva desconhecida 'migrar:{nome}'")
+    if atual[0] != 'sql':
+        raise ValueError(f"bloco 'migrar:{atual[0]}' não foi fechado")
+    fechar()
+    return passos
+
+def executar_backfill(conn, passo, metricas, rotulo=''):
+    """Executa o UPDATE do passo em faixas de chaves, uma transação curta por faixa.
+
+    A faixa seguinte é obtida por keyset (as próximas `lote` chaves depois da última
+    faixa), então funciona para chaves numéricas, texto ou UUID sem varrer a tabela
+    inteira. Retorna o total de linhas atualizadas.
+    """
+    from psycopg import sql
+
+    tabela, chave = passo.opcoes['tabela'], passo.opcoes['chave']
+    lote = passo.opcoes.get('lote', BACKFILL_LOTE)
+    pausa = passo.opcoes.get('pausa', 0)
+    coluna, fonte = sql.Identifier(chave), sql.Identifier('public', tabela)
+    primeira = sql.SQL("SELECT min(k), max(k), count(*) FROM (SELECT {c} AS k FROM {t} ORDER BY {c} LIMIT %s) s")
+    seguinte = sql.SQL(
+        "SELECT min(k), max(k), count(*) FROM (SELECT {c} AS k FROM {t} WHERE {c} > %s ORDER BY {c} LIMIT %s) s"
+    )
+
+    total, lotes, apos = 0, 0, None
+    inicio = time.perf_counter()
+    while True:
+        with conn.cursor() as cur:
+            if apos is None:
+                cur.execute(primeira.format(c=coluna, t=fonte), (lote,))
+            else:
+                cur.execute(seguinte.format(c=coluna, t=fonte), (apos, lote))
+            de, ate, chaves = cur.fetchone()
+        if not chaves:
+            break
+
+        with conn.transaction():
+            with conn.cursor() as cur:
+                cur.execute(passo.sql, {'de': de, 'ate': ate})
+                atualizadas = max(cur.rowcount, 0)
+
+        lotes += 1
+        total += atualizadas
+        apos = ate
+        metricas.contar('backfill_linhas', atualizadas)
+        print(f"{rotulo}Lote {lotes}: {atualizadas} linhas atualizadas ({de} .. {ate})")
+        if pausa:
+            time.sleep(pausa)
+
+    print(f"{rotulo}Backfill de {tabela}: {total} linhas em {lotes} lotes ({time.perf_counter() - inicio:.2f}s)")
+    return total
+
+def aplicar_migracao(conn, migracao, metricas):
+    """Executa os passos da migração e a registra em migracoes.aplicadas.
+
+    O registro só é gravado depois do último passo. Se um passo falhar depois que outro
+    já foi confirmado, a migração fica pendente e é executada de novo por inteiro na
+    próxima vez, por isso migrações com vários passos precisam ser idempotentes
+    (IF NOT EXISTS, WHERE coluna IS NULL etc.).
+    """
+    with open(migracao.path, 'r', encoding='utf-8') as file:
+        passos = dividir_passos(file.read())
+
+    rotulo = f"[{migracao.versao}] "
+    inicio = time.perf_counter()
+    with metricas.fase(migracao.versao):
+        for passo in passos:
+            if passo.tipo == 'backfill':
+                executar_backfill(conn, passo, metricas, rotulo)
+            elif passo.tipo == 'autocommit':
+                with conn.cursor() as cur:
+                    cur.execute(passo.sql)
+            else:
+                with conn.transaction():
+                    with conn.cursor() as cur:
+                        cur.execute(passo.sql)
+        with conn.transaction():
+            with conn.cursor() as cur:
+                cur.execute(
+                    "INSERT INTO migracoes.aplicadas (versao, checksum, duracao_ms) VALUES (%s, %s, %s)",
+                    (migracao.versao, migracao.checksum, int((time.perf_counter() - inicio) * 1000)),
+                )
+    metricas.contar('aplicadas')
+    print(f"{rotulo}aplicada em {time.perf_counter() - inicio:.2f}s")
+
+def _aplicadas(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT versao, checksum FROM migracoes.aplicadas")
+        return dict(cur.fetchall())
+
+def _ate(migracoes, ate):
+    if ate is None:
+        return migracoes
+    versoes = [m.versao for m in migracoes]
+    if ate not in versoes:
+        raise ValueError(f"Migração {ate} não encontrada em {MIGRATIONS_DIR}")
+    return migracoes[:versoes.index(ate) + 1]
+
+def _somente(migracoes, somente):
+    if somente is None:
+        return migracoes
+    faltando = set(somente) - {m.versao for m in migracoes}
+    if faltando:
+        raise ValueError(f"Migrações não encontradas em {MIGRATIONS_DIR}: {', '.join(sorted(faltando))}")
+    return [m for m in migracoes if m.versao in somente]
+
+def _banco_com_tabelas(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT count(*) FROM information_schema.tables WHERE table_schema = 'public'")
+        return cur.fetchone()[0] > 0
+
+def aplicar_pendentes(conninfo=None, ate=None, baseline=False, somente=None, migrations_dir=MIGRATIONS_DIR):
+    """Aplica, em ordem, as migrações ainda não registradas (até a versão `ate`, inclusive).
+
+    Com `baseline=True` as migrações são só registradas, sem executar, para bancos em
+    que elas já foram aplicadas à mão. `somente` restringe a execução a essas versões,
+    sem tocar nas anteriores. Um advisory lock impede execuções simultâneas.
+    Retorna as versões aplicadas (ou registradas).
+
+    Sem `somente`, um banco com tabelas em public e nada em migracoes.aplicadas é
+    recusado: as migrações antigas (01_create_users_table etc.) não são idempotentes,
+    então é preciso registrar antes o que já existe com `--baseline --ate <versão>`.
+    """
+    metricas = Metricas('aplicar_migracoes')
+    migracoes = _somente(_ate(listar_migracoes(migrations_dir), ate), somente)
+    feitas = []
+    try:
+        with conectar(conninfo) as conn:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_lock(%s)", (LOCK_ID,))
+            try:
+                with conn.transaction():
+                    with conn.cursor() as cur:
+                        cur.execute(SQL_CONTROLE)
+                aplicadas = _aplicadas(conn)
+                if not aplicadas and not baseline and somente is None and _banco_com_tabelas(conn):
+                    raise RuntimeError(
+                        "migracoes.aplicadas está vazia, mas o banco já tem tabelas. Registre primeiro as "
+                        "migrações já aplicadas à mão: python aplicar_migracoes.py --baseline --ate <versão>"
+                    )
+                for migracao in migracoes:
+                    if migracao.versao in aplicadas:
+                        if aplicadas[migracao.versao] != migracao.checksum:
+                            print(f"Aviso: {migracao.versao} mudou depois de aplicada (checksum diferente)")
+                        continue
+                    if baseline:
+                        with conn.cursor() as cur:
+                            cur.execute(
+                                "INSERT INTO migracoes.aplicadas (versao, checksum) VALUES (%s, %s)",
+                                (migracao.versao, migracao.checksum),
+                            )
+                        metricas.contar('registradas')
+                        print(f"[{migracao.versao}] registrada sem executar (baseline)")
+                    else:
+                        print(f"\n=== Aplicando {migracao.versao} ===")
+                        aplicar_migracao(conn, migracao, metricas)
+                    feitas.append(migracao.versao)
+            finally:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT pg_advisory_unlock(%s)", (LOCK_ID,))
+        if not feitas:
+            print("Nenhuma migração pendente.")
+        return feitas
+    finally:
+        metricas.finalizar()
+
+def status(conninfo=None, migrations_dir=MIGRATIONS_DIR):
+    """Mostra cada migração como aplicada, pendente ou alterada depois de aplicada."""
+    with conectar(conninfo) as conn:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('migracoes.aplicadas') IS NOT NULL")
+            existe = cur.fetchone()[0]
+        aplicadas = _aplicadas(conn) if existe else {}
+    for migracao in listar_migracoes(migrations_dir):
+        if migracao.versao not in aplicadas:
+            estado = 'pendente'
+        elif aplicadas[migracao.versao] != migracao.checksum:
+            estado = 'alterada'
+        else:
+            estado = 'aplicada'
+        print(f"  {estado:<9} {migracao.versao}")
+
+if __name__ == "__main__":
+    # Uso: python aplicar_migracoes.py [--status] [--ate VERSAO] [--baseline] (requer SUPABASE_DB_URL)
+    # Em um banco que já existia antes deste script, rode uma vez, antes de tudo,
+    #   python aplicar_migracoes.py --baseline --ate <última migração já aplicada à mão>
+    # para registrar as migrações antigas sem executá-las; sem isso o script se recusa a rodar.
+    parser = argparse.ArgumentParser(
+        description="Aplica as migrações pendentes de database/migrations",
+        epilog="Banco já existente: rode antes --baseline --ate <última versão já aplicada> "
+               "para registrar as migrações antigas sem executá-las.",
+    )
+    parser.add_argument('--status', action='store_true', help="Só lista migrações aplicadas e pendentes")
+    parser.add_argument('--ate', help="Aplica até esta versão (nome do arquivo sem .sql), inclusive")
+    parser.add_argument('--baseline', action='store_true',
+                        help="Registra as migrações como aplicadas sem executá-las (banco já migrado à mão); "
+                             "obrigatório uma vez antes da primeira execução em um banco existente")
+    parser.add_argument('--profile', action='store_true', help="Executa sob cProfile e grava aplicar_migracoes.prof")
+    args = parser.parse_args()
+
+    if args.status:
+        status()
+        sys.exit(0)
+    with perfilar(args.profile, 'aplicar_migracoes'):
+        aplicar_pendentes(ate=args.ate, baseline=args.baseline)
@@ -0,0 +1,181 @@
+import asyncio
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+import httpx
+
+from cliente_supabase import configuracao, http2_disponivel
+
+# Requisições simultâneas por padrão
+CONCURRENCY = 8
+# Tentativas por operação antes de desistir
+MAX_RETRIES = 5
+# Base e teto do backoff exponencial (segundos)
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+# Respostas que valem nova tentativa
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# Operações que podem ser reenviadas sem duplicar linhas: um insert que falhou por
+# timeout ou 5xx pode ter sido gravado, então só é repetido após 429 (recusado antes de chegar ao banco)
+IDEMPOTENTES = {'upsert', 'update'}
+
+@dataclass
+class Operacao:
+    """Uma escrita no PostgREST: insert, update (com filtros `eq`; None filtra por `is.null`) ou upsert.
+
+    Um upsert com `ignorar_duplicados` só insere as linhas novas (como `ignore_duplicates=True`
+    do supabase-py): é a forma idempotente de um insert.
+    """
+    tabela: str
+    tipo: str
+    dados: Any
+    filtros: dict = field(default_factory=dict)
+    on_conflict: Optional[str] = None
+    contexto: Any = None
+    ignorar_duplicados: bool = False
+
+@dataclass
+class ResultadoEscrita:
+    """Totais, falhas e latências de uma execução do writer."""
+    sucesso: int = 0
+    falhas: list = field(default_factory=list)
+    tentativas: int = 0
+    latencias: list = field(default_factory=list)
+    duracao: float = 0.0
+
+    def percentil(self, p):
+        if not self.latencias:
+            return 0.0
+        ordenadas = sorted(self.latencias)
+        return ordenadas[min(len(ordenadas) - 1, int(round(p / 100 * (len(ordenadas) - 1))))]
+
+    def resumo(self):
+        return (
+            f"Operações: {self.sucesso} ok, {len(self.falhas)} falhas, {self.tentativas} requisições "
+            f"em {self.duracao:.2f}s | latência p50={self.percentil(50) * 1000:.0f}ms "
+            f"p90={self.percentil(90) * 1000:.0f}ms p99={self.percentil(99) * 1000:.0f}ms"
+        )
+
+class ErroPostgrest(Exception):
+    def __init__(self, status, corpo):
+        super().__init__(f"HTTP {status}: {corpo}")
+        self.status = status
+
+def _requisicao(op):
+    """Traduz uma Operacao para (método, caminho, params, headers, json)."""
+    params = {coluna: 'is.null' if valor is None else f"eq.{valor}" for coluna, valor in op.filtros.items()}
+    headers = {'Prefer': 'return=minimal'}
+    if op.tipo == 'insert':
+        return 'POST', f"/{op.tabela}", params, headers
+    if op.tipo == 'upsert':
+        resolucao = 'ignore-duplicates' if op.ignorar_duplicados else 'merge-duplicates'
+        headers['Prefer'] = f"return=minimal,resolution={resolucao}"
+        if op.on_conflict:
+            params['on_conflict'] = op.on_conflict
+        return 'POST', f"/{op.tabela}", params, headers
+    if op.tipo == 'update':
+        if not params:
+            raise ValueError(f"Update em {op.tabela} sem filtros")
+        return 'PATCH', f"/{op.tabela}", params, headers
+    raise ValueError(f"Tipo de operação desconhecido: {op.tipo}")
+
+def _espera(tentativa, retry_after=None):
+    """Backoff exponencial com jitter completo (respeita Retry-After quando presente)."""
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** tentativa))
+
+async def _enviar(client, op, resultado, max_retries, ao_concluir=None):
+    """Envia `op` com backoff; operações fora de IDEMPOTENTES só são repetidas após 429."""
+    metodo, caminho, params, headers = _requisicao(op)
+    idempotente = op.tipo in IDEMPOTENTES
+    for tentativa in range(max_retries + 1):
+        inicio = time.perf_counter()
+        retry_after = None
+        try:
+            response = await client.request(metodo, caminho, params=params, headers=headers, json=op.dados)
+            resultado.tentativas += 1
+            resultado.latencias.append(time.perf_counter() - inicio)
+            if response.status_code < 300:
+                resultado.sucesso += 1
+                if ao_concluir:
+                    ao_concluir(op, None)
+                return
+            erro = ErroPostgrest(response.status_code, response.text)
+            if response.status_code not in RETRY_STATUS or not (idempotente or response.status_code == 429):
+                break
+            retry_after = response.headers.get('Retry-After')
+        except httpx.TransportError as e:
+            resultado.tentativas += 1
+            erro = e
+            if not idempotente:
+                break
+        if tentativa < max_retries:
+            await asyncio.sleep(_espera(tentativa, retry_after))
+    resultado.falhas.append((op, erro))
+    if ao_concluir:
+        ao_concluir(op, erro)
+
+async def escrever_async(operacoes, concorrencia=CONCURRENCY, url=None, key=None,
+                         max_retries=MAX_RETRIES, base_url=None, transport=None, ao_concluir=None):
+    """Envia um fluxo de operações mantendo até `concorrencia` requisições em andamento.
+
+    `operacoes` pode ser um iterável comum ou assíncrono. `ao_concluir(op, erro)` é
+    chamado ao fim de cada operação (`erro` é None em caso de sucesso). `base_url` e
+    `transport` permitem apontar o writer para um servidor local que imita o PostgREST.
+    """
+    if not url or not key:
+        url_padrao, key_padrao = configuracao()
+        url, key = url or url_padrao, key or key_padrao
+    base_url = base_url or f"{url.rstrip('/')}/rest/v1"
+    headers = {'apikey': key, 'Authorization': f"Bearer {key}"}
+    limits = httpx.Limits(max_connections=concorrencia, max_keepalive_connections=concorrencia)
+    http2 = transport is None and http2_disponivel()
+
+    resultado = ResultadoEscrita()
+    fila = asyncio.Queue(maxsize=concorrencia * 2)
+    inicio = time.perf_counter()
+
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, http2=http2,
+                                 transport=transport, timeout=60.0) as client:
+        async def trabalhador():
+            while True:
+                op = await fila.get()
+                if op is None:
+                    return
+                try:
+                    await _enviar(client, op, resultado, max_retries, ao_concluir)
+                except Exception as e:
+                    # Erro inesperado no envio ou no próprio ao_concluir: a operação conta como falha
+                    # (uma vez só; _enviar pode já tê-la registrado antes do callback falhar)
+                    if not resultado.falhas or resultado.falhas[-1][0] is not op:
+                        resultado.falhas.append((op, e))
+                    if ao_concluir:
+                        # Um segundo erro do callback não pode derrubar o trabalhador (a fila pararia)
+                        try:
+                            ao_concluir(op, e)
+                        except Exception as erro_callback:
+                            print(f"Erro em ao_concluir ({op.tabela}, {op.contexto}): {erro_callback}")
+
+        trabalhadores = [asyncio.create_task(trabalhador()) for _ in range(concorrencia)]
+        if hasattr(operacoes, '__aiter__'):
+            async for op in operacoes:
+                await fila.put(op)
+        else:
+            for op in operacoes:
+                await fila.put(op)
+        for _ in trabalhadores:
+            await fila.put(None)
+        await asyncio.gather(*trabalhadores)
+
+    resultado.duracao = time.perf_counter() - inicio
+    return resultado
+
+def escrever(operacoes, concorrencia=CONCURRENCY, **kwargs):
+    """Versão síncrona de `escrever_async` para os scripts."""
+    return asyncio.run(escrever_async(operacoes, concorrencia, **kwargs))
@@ -1,63 +1,119 @@
-import os
-from dotenv import load_dotenv
-from supabase import create_client, Client
+import sys
+from cliente_supabase import supabase
+from bubble_cache import BubbleIdCache
+from backfill_rpc import executar_backfill_rpc
+from async_writer import CONCURRENCY, Operacao, escrever
+from table_scan import escanear_tabela
+from metricas import Metricas, perfilar
 
-# Carrega as variáveis de ambiente
-load_dotenv()
-
-# Configuração do cliente Supabase
-url: str = os.environ.get("VITE_SUPABASE_URL")
-key: str = os.environ.get("VITE_SUPABASE_ANON_KEY")
-supabase: Client = create_client(url, key)
+cache = BubbleIdCache(supabase)
 
 def update_aulas_with_id_modulo():
+    metricas = Metricas('atualizar_aula')
+    metricas.instrumentar_cliente(supabase)
     try:
-        # Busca todas as aulas com id_bubble_modulo
-        response_aulas = supabase.table('aulas').select('id, id_bubble_modulo').execute()
-
-        if not response_aulas.data:
-            print("Nenhuma aula encontrada ou erro ao buscar aulas.")
-            return
-
-        aulas = response_aulas.data
-        print(f"Total de aulas encontradas: {len(aulas)}")
+        # Carrega o mapeamento id_bubble_modulo -> id_modulo de uma vez
+        with metricas.fase('resolver'):
+            cache.aquecer('modulos', 'id_bubble_modulo', 'id_modulo')
 
-        for aula in aulas:
+        # Percorre as aulas página a página (memória constante)
+        aulas = escanear_tabela(supabase, 'aulas', 'id, id_bubble_modulo', prefetch=True)
+        for aula in metricas.iterar('ler', aulas):
+            metricas.contar('lidas')
             id_aula = aula.get('id')
             id_bubble_modulo = aula.get('id_bubble_modulo')
 
             # Verifica se os campos necessários estão disponíveis
             if not id_aula or not id_bubble_modulo:
-                print(f"Aula {id_aula} sem id_bubble_modulo. Ignorando...")
+                metricas.contar('ignoradas', exemplo=f"Aula {id_aula} sem id_bubble_modulo")
                 continue
 
-            # Busca o id_modulo correspondente na tabela modulos
-            response_modulo = supabase.table('modulos')\
-                .select('id_modulo')\
-                .eq('id_bubble_modulo', id_bubble_modulo)\
-                .execute()
+            # Busca o id_modulo correspondente no cache de módulos
+            with metricas.fase('resolver'):
+                id_modulo = cache.resolver('modulos', 'id_bubble_modulo', 'id_modulo', id_bubble_modulo)
 
-            if not response_modulo.data:
-                print(f"Nenhum módulo encontrado para id_bubble_modulo {id_bubble_modulo}.")
+            if not id_modulo:
+                metricas.contar('ignoradas', exemplo=f"Nenhum módulo encontrado para id_bubble_modulo {id_bubble_modulo}")
                 continue
-
-            id_modulo = response_modulo.data[0]['id_modulo']
+            metricas.contar('resolvidas')
 
             # Atualiza a tabela aulas com o id_modulo
-            update_response = supabase.table('aulas')\
-                .update({'id_modulo': id_modulo})\
-                .eq('id', id_aula)\
-                .execute()
+            with metricas.fase('gravar'):
+                update_response = supabase.table('aulas')\
+                    .update({'id_modulo': id_modulo})\
+                    .eq('id', id_aula)\
+                    .execute()
 
             if not update_response.data:
-                print(f"Erro ao atualizar aula {id_aula}.")
+                metricas.falha(f"Erro ao atualizar aula {id_aula}.")
             else:
-                print(f"Aula {id_aula} atualizada com sucesso. id_modulo: {id_modulo}")
+                metricas.contar('gravadas')
+
+        if not metricas.contadores['lidas']:
+            print("Nenhuma aula encontrada ou erro ao buscar aulas.")
+            return metricas.ok
+        print(f"\nAtualização concluída! Total de aulas encontradas: {metricas.contadores['lidas']}")
+
+    except Exception as e:
+        metricas.erro(f"Erro durante a execução: {str(e)}")
+    finally:
+        metricas.finalizar()
+    return metricas.ok
+
+def update_aulas_with_id_modulo_set_based():
+    """Executa o mesmo backfill com UPDATE ... FROM no Postgres, em lotes de chaves."""
+    metricas = Metricas('atualizar_aula')
+    metricas.instrumentar_cliente(supabase)
+    try:
+        with metricas.fase('gravar'):
+            total = executar_backfill_rpc(supabase, 'backfill_aulas_id_modulo')
+        metricas.contar('gravadas', total)
+        print(f"\nAtualização concluída! Aulas atualizadas: {total}")
+    except Exception as e:
+        metricas.erro(f"Erro durante a execução: {str(e)}")
+    finally:
+        metricas.finalizar()
+    return metricas.ok
+
+def update_aulas_with_id_modulo_async(concorrencia=CONCURRENCY):
+    """Resolve os módulos pelo cache e envia os updates com `concorrencia` requisições simultâneas."""
+    metricas = Metricas('atualizar_aula')
+    metricas.instrumentar_cliente(supabase)
+    try:
+        with metricas.fase('resolver'):
+            cache.aquecer('modulos', 'id_bubble_modulo', 'id_modulo')
 
-        print("\nAtualização concluída!")
+        def operacoes():
+            aulas = escanear_tabela(supabase, 'aulas', 'id, id_bubble_modulo', prefetch=True)
+            for aula in metricas.iterar('ler', aulas):
+                metricas.contar('lidas')
+                if not aula.get('id') or not aula.get('id_bubble_modulo'):
+                    metricas.contar('ignoradas')
+                    continue
+                id_modulo = cache.resolver('modulos', 'id_bubble_modulo', 'id_modulo', aula['id_bubble_modulo'])
+                if id_modulo:
+                    metricas.contar('resolvidas')
+                    yield Operacao('aulas', 'update', {'id_modulo': id_modulo}, filtros={'id': aula['id']})
+                else:
+                    metricas.contar('ignoradas')
 
+        resultado = escrever(operacoes(), concorrencia, ao_concluir=metricas.ao_concluir)
+        metricas.registrar_escrita(resultado)
+        for op, erro in resultado.falhas:
+            print(f"Erro ao atualizar aula {op.filtros['id']}: {erro}")
+        print(f"\nAtualização concluída! {resultado.resumo()}")
     except Exception as e:
-        print(f"Erro durante a execução: {str(e)}")
+        metricas.erro(f"Erro durante a execução: {str(e)}")
+    finally:
+        metricas.finalizar()
+    return metricas.ok
 
 if __name__ == "__main__":
-    update_aulas_with_id_modulo()
+    with perfilar('--profile' in sys.argv[1:], 'atualizar_aula'):
+        if '--set-based' in sys.argv[1:]:
+            ok = update_aulas_with_id_modulo_set_based()
+        elif '--async' in sys.argv[1:]:
+            ok = update_aulas_with_id_modulo_async()
+        else:
+            ok = update_aulas_with_id_modulo()
+    sys.exit(0 if ok else 1)
@@ -1,17 +1,23 @@
 import os
 import csv
-from dotenv import load_dotenv
-from supabase import create_client, Client
+import sys
+import time
+from collections import namedtuple
+from cliente_supabase import supabase
+from bubble_cache import BubbleIdCache
+from async_writer import CONCURRENCY, Operacao, escrever
+from lote_adaptativo import LoteAdaptativo, bloco_checkpoint, gravar_adaptativo
+from checkpoint import DiarioCheckpoint
+from pg_copy import carregar_via_copy
+from metricas import Metricas, perfilar
+from csv_paralelo import processar_em_paralelo
+from table_scan import escanear_tabela
 
-# Carrega as variáveis de ambiente
-load_dotenv()
-
-# Configuração do cliente Supabase
-url: str = os.environ.get("VITE_SUPABASE_URL")
-key: str = os.environ.get("VITE_SUPABASE_ANON_KEY")
-supabase: Client = create_client(url, key)
+cache = BubbleIdCache(supabase)
 
 def processar_aulas_assistidas(csv_file_path):
+    metricas = Metricas('aulas_assistidas')
+    metricas.instrumentar_cliente(supabase)
     try:
         # Abre o arquivo CSV com delimitador correto
         with open(csv_file_path, mode='r', encoding='utf-8') as file:
@@ -22,13 +28,14 @@ def processar_aulas_assistidas(csv_file_path):
             print("Colunas identificadas no CSV:", reader.fieldnames)
 
             # Processa cada linha do CSV
-            for row in reader:
+            for row in metricas.iterar('ler', reader):
+                metricas.contar('lidas')
                 # Limpa os campos e remove colunas extras
                 row = {key.strip(): value.strip() for key, value in row.items() if key and value}
 
                 # Verifica se as colunas esperadas estão presentes
                 if 'id_aula_bubble' not in row or 'usuarios' not in row:
-                    print(f"Colunas ausentes na linha: {row}")
+                    metricas.contar('ignoradas', exemplo=f"Colunas ausentes na linha: {row}")
                     continue
 
                 # Obtém os campos necessários
@@ -37,7 +44,7 @@ def processar_aulas_assistidas(csv_file_path):
 
                 # Ignorar linhas onde `usuarios` está vazio ou `id_aula_bubble` ausente
                 if not id_aula_bubble or not usuarios:
-                    print(f"Aviso: Linha ignorada devido a valores ausentes: {row}")
+                    metricas.contar('ignoradas', exemplo=f"Linha ignorada devido a valores ausentes: {row}")
                     continue
 
                 # Divide os usuários por vírgula e remove valores vazios
@@ -45,51 +52,491 @@ def processar_aulas_assistidas(csv_file_path):
 
                 # Ignorar linhas onde não há usuários válidos
                 if not usuarios_list:
-                    print(f"Aviso: Nenhum usuário válido na linha: {row}")
+                    metricas.contar('ignoradas', exemplo=f"Nenhum usuário válido na linha: {row}")
                     continue
 
                 # Busca o id_aula na tabela aulas
-                aula_response = supabase.table('aulas')\
-                    .select('id_aula')\
-                    .eq('id_bubble_aula', id_aula_bubble)\
-                    .execute()
+                with metricas.fase('resolver'):
+                    aula_response = supabase.table('aulas')\
+                        .select('id_aula')\
+                        .eq('id_bubble_aula', id_aula_bubble)\
+                        .execute()
 
                 if not aula_response.data:
-                    print(f"Nenhuma aula encontrada para id_aula_bubble {id_aula_bubble}")
+                    metricas.contar('ignoradas', exemplo=f"Nenhuma aula encontrada para id_aula_bubble {id_aula_bubble}")
                     continue
 
                 id_aula = aula_response.data[0]['id_aula']
 
                 for id_bubble_usuario in usuarios_list:
                     # Busca o id_usuario na tabela usuarios
-                    usuario_response = supabase.table('usuarios')\
-                        .select('id_usuario')\
-                        .eq('id_bubble_usuario', id_bubble_usuario)\
-                        .execute()
+                    with metricas.fase('resolver'):
+                        usuario_response = supabase.table('usuarios')\
+                            .select('id_usuario')\
+                            .eq('id_bubble_usuario', id_bubble_usuario)\
+                            .execute()
 
                     if not usuario_response.data:
-                        print(f"Nenhum usuário encontrado para id_bubble_usuario {id_bubble_usuario}")
+                        metricas.contar('ignoradas', exemplo=f"Nenhum usuário encontrado para id_bubble_usuario {id_bubble_usuario}")
                         continue
 
                     id_usuario = usuario_response.data[0]['id_usuario']
+                    metricas.contar('resolvidas')
 
                     # Insere a linha na tabela aulas_assistidas
-                    insert_response = supabase.table('aulas_assistidas').insert({
-                        'id_aula': id_aula,
-                        'id_usuario': id_usuario
-                    }).execute()
+                    with metricas.fase('gravar'):
+                        insert_response = supabase.table('aulas_assistidas').insert({
+                            'id_aula': id_aula,
+                            'id_usuario': id_usuario
+                        }).execute()
 
                     if insert_response.data:
-                        print(f"Linha inserida com sucesso: Aula {id_aula}, Usuário {id_usuario}")
+                        metricas.contar('gravadas')
                     else:
-                        print(f"Erro ao inserir: Aula {id_aula}, Usuário {id_usuario}")
+                        metricas.falha(f"Erro ao inserir: Aula {id_aula}, Usuário {id_usuario}")
 
         print("\nProcessamento concluído!")
 
     except Exception as e:
-        print(f"Erro durante a execução: {str(e)}")
+        metricas.erro(f"Erro durante a execução: {str(e)}")
+    finally:
+        metricas.finalizar(f"{csv_file_path}.metricas.json")
+    return metricas.ok
+
+# Quantidade de linhas por requisição de insert em lote
+INSERT_CHUNK_SIZE = 500
+# Chave única de aulas_assistidas usada na paginação por keyset
+CHAVE_AULAS_ASSISTIDAS = 'id'
+# Par que identifica uma aula assistida (índice único da migração 20240326)
+CONFLITO_AULAS_ASSISTIDAS = 'id_aula,id_usuario'
+
+def _chunks(items, size):
+    """Divide uma lista em pedaços de até `size` elementos."""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _pares(reader):
+    """Extrai (id_aula_bubble, [id_bubble_usuario, ...]) das linhas válidas de um DictReader."""
+    linhas = []
+    for row in reader:
+        row = {key.strip(): value.strip() for key, value in row.items() if key and value}
+        id_aula_bubble = row.get('id_aula_bubble')
+        usuarios = row.get('usuarios')
+        if not id_aula_bubble or not usuarios:
+            continue
+        # Usuários repetidos na mesma linha viram um único par
+        usuarios_list = list(dict.fromkeys(user.strip() for user in usuarios.split(',') if user.strip()))
+        if usuarios_list:
+            linhas.append((id_aula_bubble, usuarios_list))
+    return linhas
+
+def _pares_da_faixa(dados, cabecalho):
+    """Tarefa do pool de processos: extrai os pares de uma faixa de bytes do CSV."""
+    return _pares(csv.DictReader(dados.decode('utf-8').splitlines(), fieldnames=cabecalho, delimiter=';'))
+
+def ler_pares_csv(csv_file_path, processos=1):
+    """Lê o CSV e retorna a lista de (id_aula_bubble, [id_bubble_usuario, ...]).
+
+    Com `processos` maior que 1 o arquivo é dividido em faixas processadas em paralelo;
+    a ordem das linhas é a mesma da leitura sequencial.
+    """
+    if processos > 1:
+        return [par for pares in processar_em_paralelo(csv_file_path, _pares_da_faixa, processos) for par in pares]
+    with open(csv_file_path, mode='r', encoding='utf-8') as file:
+        return _pares(csv.DictReader(file, delimiter=';'))
+
+def resolver_ids(tabela, coluna_bubble, coluna_id, ids_bubble):
+    """Resolve um conjunto de IDs do Bubble pelo cache local (faltantes em lotes `in_()`).
+
+    Retorna o dicionário {id_bubble: id} e o número de requisições feitas.
+    """
+    requisicoes_antes = cache.requisicoes
+    mapa = cache.resolver_varios(tabela, coluna_bubble, coluna_id, ids_bubble)
+    return mapa, cache.requisicoes - requisicoes_antes
+
+def montar_registros(linhas, aulas_map, usuarios_map):
+    """Converte as linhas do CSV em registros (id_aula, id_usuario) já resolvidos."""
+    registros = []
+    for id_aula_bubble, usuarios_list in linhas:
+        id_aula = aulas_map.get(id_aula_bubble)
+        if id_aula is None:
+            continue
+        for id_bubble_usuario in usuarios_list:
+            id_usuario = usuarios_map.get(id_bubble_usuario)
+            if id_usuario is not None:
+                registros.append({'id_aula': id_aula, 'id_usuario': id_usuario})
+    return registros
+
+def processar_aulas_assistidas_copy(csv_file_path, chunk_size=INSERT_CHUNK_SIZE, conninfo=None):
+    """Carga inicial via Postgres COPY: resolve os IDs em lote e copia os pares direto no banco."""
+    metricas = Metricas('aulas_assistidas')
+    metricas.instrumentar_cliente(supabase)
+    try:
+        with metricas.fase('ler'):
+            linhas = ler_pares_csv(csv_file_path)
+        metricas.contar('lidas', len(linhas))
+        with metricas.fase('resolver'):
+            aulas_map, _ = resolver_ids('aulas', 'id_bubble_aula', 'id_aula', {aula for aula, _ in linhas})
+            usuarios_map, _ = resolver_ids(
+                'usuarios', 'id_bubble_usuario', 'id_usuario', {usuario for _, lista in linhas for usuario in lista}
+            )
+            registros = montar_registros(linhas, aulas_map, usuarios_map)
+        metricas.contar('resolvidas', len(registros))
+        with metricas.fase('gravar'):
+            copiadas, mescladas = carregar_via_copy('aulas_assistidas', _chunks(registros, chunk_size), conninfo)
+        metricas.contar('gravadas', mescladas)
+        print(f"\nProcessamento concluído! Copiadas: {copiadas} | Inseridas: {mescladas}")
+    except Exception as e:
+        metricas.erro(f"Erro durante a execução: {str(e)}")
+    finally:
+        metricas.finalizar(f"{csv_file_path}.metricas.json")
+    return metricas.ok
+
+def processar_aulas_assistidas_bulk(csv_file_path, chunk_size=INSERT_CHUNK_SIZE, concorrencia=1, resume=False,
+                                    processos=1):
+    """Versão em lote: resolve todos os IDs de uma vez e insere em lotes de `chunk_size` pares.
+
+    Com `concorrencia` maior que 1, os blocos são enviados em paralelo pelo async_writer.
+    Com `processos` maior que 1, o CSV é lido por um pool de processos (csv_paralelo).
+    Cada bloco de linhas do CSV gravado é confirmado em `<csv>.checkpoint.jsonl`; com
+    `resume=True` os blocos já confirmados em uma execução anterior não são reenviados.
+    No envio sequencial o bloco tem bloco_checkpoint(chunk_size) linhas e os upserts
+    dentro dele começam em `chunk_size` pares e crescem conforme o servidor responde.
+    Os dois caminhos gravam com upsert que ignora pares já existentes (requer a
+    migração 20240326).
+    """
+    inicio = time.perf_counter()
+    metricas = Metricas('aulas_assistidas')
+    metricas.instrumentar_cliente(supabase)
+    requisicoes = {'aulas': 0, 'usuarios': 0, 'aulas_assistidas': 0}
+    checkpoint = None
+
+    try:
+        with metricas.fase('ler'):
+            linhas = ler_pares_csv(csv_file_path, processos)
+        metricas.contar('lidas', len(linhas))
+        # Linhas do CSV por bloco do checkpoint; no envio sequencial o bloco é maior, para o lote
+        # adaptativo poder crescer
+        bloco = chunk_size if concorrencia > 1 else bloco_checkpoint(chunk_size)
+        checkpoint = DiarioCheckpoint(csv_file_path, bloco, resume)
+        ids_aulas = {id_aula_bubble for id_aula_bubble, _ in linhas}
+        ids_usuarios = {usuario for _, usuarios_list in linhas for usuario in usuarios_list}
+        print(f"Linhas válidas: {len(linhas)} | Aulas distintas: {len(ids_aulas)} | Usuários distintos: {len(ids_usuarios)}")
+
+        with metricas.fase('resolver'):
+            aulas_map, requisicoes['aulas'] = resolver_ids('aulas', 'id_bubble_aula', 'id_aula', ids_aulas)
+            usuarios_map, requisicoes['usuarios'] = resolver_ids('usuarios', 'id_bubble_usuario', 'id_usuario', ids_usuarios)
+
+        nao_encontradas = ids_aulas - aulas_map.keys()
+        nao_encontrados = ids_usuarios - usuarios_map.keys()
+        if nao_encontradas:
+            print(f"Aviso: {len(nao_encontradas)} aulas não encontradas no Supabase")
+            metricas.contar('aulas_nao_encontradas', len(nao_encontradas))
+        if nao_encontrados:
+            print(f"Aviso: {len(nao_encontrados)} usuários não encontrados no Supabase")
+            metricas.contar('usuarios_nao_encontrados', len(nao_encontrados))
+
+        # Blocos de `bloco` linhas válidas do CSV, numerados a partir de 1, antes da resolução: os
+        # limites não mudam se outra execução resolver mais aulas ou usuários. Os já confirmados ficam
+        # de fora; blocos sem nenhum par resolvido não são confirmados e voltam em um --resume
+        lotes = []
+        with metricas.fase('resolver'):
+            for numero, linhas_bloco in enumerate(_chunks(linhas, bloco), start=1):
+                if checkpoint.concluido(numero):
+                    continue
+                registros = montar_registros(linhas_bloco, aulas_map, usuarios_map)
+                metricas.contar('resolvidas', len(registros))
+                if registros:
+                    lotes.append((numero, registros))
+        if resume:
+            print(f"Retomando: {len(checkpoint.lotes)} blocos já confirmados, {len(lotes)} pendentes")
+
+        def confirmar(numero, lote):
+            checkpoint.registrar(numero, (numero - 1) * bloco, min(numero * bloco, len(linhas)),
+                                 [[registro['id_aula'], registro['id_usuario']] for registro in lote])
+
+        if concorrencia > 1:
+            # Cada bloco vai em operações de até chunk_size pares e é confirmado quando todas terminam bem
+            blocos = dict(lotes)
+            restantes = {numero: 0 for numero in blocos}
+            falhos = set()
+            operacoes = []
+            for numero, lote in lotes:
+                for parte in _chunks(lote, chunk_size):
+                    operacoes.append(Operacao('aulas_assistidas', 'upsert', parte, on_conflict=CONFLITO_AULAS_ASSISTIDAS,
+                                              contexto=numero, ignorar_duplicados=True))
+                    restantes[numero] += 1
+
+            def ao_concluir(op, erro):
+                metricas.ao_concluir(op, erro)
+                numero = op.contexto
+                restantes[numero] -= 1
+                if erro is not None:
+                    falhos.add(numero)
+                elif not restantes[numero] and numero not in falhos:
+                    confirmar(numero, blocos[numero])
+
+            with metricas.fase('gravar'):
+                resultado = escrever(operacoes, concorrencia, ao_concluir=ao_concluir)
+            metricas.registrar_escrita(resultado)
+            requisicoes['aulas_assistidas'] += resultado.tentativas
+            for op, erro in resultado.falhas:
+                print(f"Erro ao inserir lote de {len(op.dados)} linhas: {erro}")
+            print(resultado.resumo())
+            lotes = []
+
+        # Upserts em lotes de tamanho adaptativo (de chunk_size até o bloco) dentro de cada bloco do
+        # checkpoint; um lote recusado é dividido até isolar as linhas ruins e o bloco só é
+        # confirmado sem recusas. ignore_duplicates torna seguro reenviar um lote que deu timeout
+        controle = LoteAdaptativo('aulas_assistidas', chunk_size, maximo=bloco)
+
+        def inserir(registros):
+            supabase.table('aulas_assistidas')\
+                .upsert(registros, on_conflict=CONFLITO_AULAS_ASSISTIDAS, ignore_duplicates=True)\
+                .execute()
+
+        for numero, lote in lotes:
+            with metricas.fase('gravar'):
+                gravadas, recusados = gravar_adaptativo(lote, inserir, controle)
+            metricas.contar('gravadas', gravadas)
+            for registro, erro in recusados:
+                metricas.falha(f"Erro ao inserir aula {registro['id_aula']} do usuário {registro['id_usuario']}: {str(erro)}")
+            if not recusados:
+                confirmar(numero, lote)
+        requisicoes['aulas_assistidas'] += controle.requisicoes
+        if controle.requisicoes:
+            metricas.registrar_lote(controle)
+
+    except Exception as e:
+        metricas.erro(f"Erro durante a execução: {str(e)}")
+    finally:
+        if checkpoint:
+            checkpoint.fechar()
+        metricas.finalizar(f"{csv_file_path}.metricas.json")
+
+    duracao = time.perf_counter() - inicio
+    inseridas = metricas.contadores['gravadas']
+    erros = metricas.contadores['falhas']
+    total_requisicoes = sum(requisicoes.values())
+    print("\nProcessamento em lote concluído!")
+    print(f"Linhas inseridas: {inseridas} | Erros: {erros}")
+    print(f"Requisições: {total_requisicoes} (aulas: {requisicoes['aulas']}, usuarios: {requisicoes['usuarios']}, "
+          f"aulas_assistidas: {requisicoes['aulas_assistidas']})")
+    print(f"Tempo: {duracao:.2f}s | {inseridas / duracao if duracao else 0:.1f} linhas/s")
+    return metricas.ok
+
+# Linhas do CSV por bloco em explodir_pares (limita o pico de memória com os textos dos IDs)
+LINHAS_POR_BLOCO = 2000
+# Linhas de aulas_assistidas convertidas em códigos de cada vez em pares_existentes
+LINHAS_POR_CONVERSAO = 20_000
+
+# Pares do CSV com os IDs do Bubble codificados (ver bubble_ids): `aulas` e `usuarios` são as
+# chaves distintas, `aula` e `usuario` a posição nelas de cada par (um int64 por lado)
+ParesCodificados = namedtuple('ParesCodificados', 'aulas outros_aulas usuarios outros_usuarios aula usuario')
+
+def explodir_pares(csv_file_path, linhas_por_bloco=LINHAS_POR_BLOCO):
+    """Lê o CSV em blocos e devolve os pares (aula, usuário) distintos como ParesCodificados.
+
+    Só os textos de um bloco existem de cada vez: cada ID distinto do bloco é codificado
+    em dois int64 e cada par guarda apenas as posições das suas chaves (16 bytes por par
+    em vez de dois objetos str). No final as chaves dos blocos são unificadas e os pares
+    repetidos saem comparando um único int64 por par.
+    """
+    import numpy as np
+    import pandas as pd
+    from bubble_ids import DTYPE, codificar_unicos, unificar
+
+    lados = {'aula': ([], [], []), 'usuario': ([], [], [])}  # chaves, posições e IDs fora do formato
+    distintas = {'aula': 0, 'usuario': 0}
+    blocos = pd.read_csv(csv_file_path, sep=';', dtype=str, keep_default_na=False, encoding='utf-8',
+                         usecols=lambda coluna: coluna.strip() in ('id_aula_bubble', 'usuarios'),
+                         chunksize=linhas_por_bloco)
+    for df in blocos:
+        df.columns = [coluna.strip() for coluna in df.columns]
+        # Espaços saem antes do explode (na linha e em volta das vírgulas), não ID a ID; a
+        # expressão regular, mais lenta, só é usada nas linhas que têm espaços
+        usuarios = df['usuarios'].str.strip()
+        listas = usuarios.str.split(',')
+        espacos = usuarios.str.contains(r'\s', regex=True)
+        listas[espacos] = usuarios[espacos].str.split(r'\s*,\s*', regex=True)
+        pares = df.assign(id_aula_bubble=df['id_aula_bubble'].str.strip(), id_bubble_usuario=listas)\
+            .explode('id_bubble_usuario')
+        aulas = pares['id_aula_bubble'].to_numpy()
+        usuarios = pares['id_bubble_usuario'].fillna('').to_numpy()
+        validos = (aulas != '') & (usuarios != '')
+        for lado, ids in (('aula', aulas[validos]), ('usuario', usuarios[validos])):
+            chaves, posicoes, outros = lados[lado]
+            codigos, unicos = pd.factorize(ids)
+            chaves.append(codificar_unicos(unicos, outros))
+            posicoes.append(codigos + distintas[lado])
+            distintas[lado] += len(unicos)
+
+    resultado = {}
+    for lado, (chaves, posicoes, outros) in lados.items():
+        unicas, inverso = unificar(np.concatenate(chaves) if chaves else np.empty(0, dtype=DTYPE))
+        resultado[lado] = (unicas, outros, inverso[np.concatenate(posicoes)] if posicoes else inverso)
+    aulas, outros_aulas, aula = resultado['aula']
+    usuarios, outros_usuarios, usuario = resultado['usuario']
+    repetidos = pd.Series(aula * len(usuarios) + usuario).duplicated().to_numpy()
+    return ParesCodificados(aulas, outros_aulas, usuarios, outros_usuarios, aula[~repetidos], usuario[~repetidos])
+
+def _codigos_resolvidos(tabela, coluna_bubble, coluna_id, chaves, outros):
+    """Resolve as `chaves` distintas pelo cache e devolve (código de cada chave, índice dos valores).
+
+    O código é a posição do ID do Supabase no índice, ou -1 se o ID do Bubble não foi
+    resolvido; com ele os pares viram dois inteiros até o anti-join.
+    """
+    import numpy as np
+    import pandas as pd
+    from bubble_ids import MapaBubble, decodificar
+
+    mapa = MapaBubble(resolver_ids(tabela, coluna_bubble, coluna_id, set(decodificar(chaves, outros)))[0])
+    # Sempre texto, como os valores lidos em `pares_existentes`, qualquer que seja o tipo da coluna
+    codigos, valores = pd.factorize(np.array([str(valor) for valor in mapa.textos()], dtype=object))
+    # Posição -1 (não resolvido) cai no -1 acrescentado no fim
+    return np.append(codigos, -1)[mapa.posicoes(chaves, outros)], pd.Index(valores)
+
+def _codigo_par(aula, usuario, usuarios):
+    """Um int64 por par (código da aula, código do usuário): dedupe e anti-join comparam uma coluna só."""
+    return aula * usuarios + usuario
+
+def pares_existentes(valores_aulas, valores_usuarios):
+    """Pares já gravados como um int64 cada (ver `_codigo_par`), em uma única varredura paginada.
+
+    Cada página é convertida em inteiros na hora, então os textos não se acumulam. Pares
+    com aula ou usuário fora dos índices não podem coincidir com os do CSV e são descartados.
+    """
+    import numpy as np
+
+    linhas = escanear_tabela(supabase, 'aulas_assistidas', 'id_aula, id_usuario',
+                             chave=CHAVE_AULAS_ASSISTIDAS, prefetch=True)
+    codigos, bloco = [], []
+
+    def converter():
+        # O cache guarda os IDs como texto; o JSON traz id_aula SERIAL como número
+        aula = valores_aulas.get_indexer([str(linha['id_aula']) for linha in bloco])
+        usuario = valores_usuarios.get_indexer([str(linha['id_usuario']) for linha in bloco])
+        conhecidos = (aula >= 0) & (usuario >= 0)
+        codigos.append(_codigo_par(aula[conhecidos], usuario[conhecidos], len(valores_usuarios)))
+        bloco.clear()
+
+    for linha in linhas:
+        bloco.append(linha)
+        if len(bloco) == LINHAS_POR_CONVERSAO:
+            converter()
+    converter()
+    return np.concatenate(codigos)
+
+def processar_aulas_assistidas_incremental(csv_file_path, chunk_size=INSERT_CHUNK_SIZE, concorrencia=1):
+    """Carga idempotente: grava só os pares (aula, usuário) que ainda não existem no Supabase.
+
+    O CSV é explodido em pares distintos com os IDs do Bubble codificados em inteiros
+    (bubble_ids), os IDs distintos são resolvidos em lote e buscados com busca binária,
+    os pares já gravados são lidos em uma varredura paginada e a diferença é calculada
+    localmente (anti-join sobre códigos inteiros). Só os pares novos voltam a ser texto
+    e vão em upserts com on_conflict como rede de segurança; uma nova execução sem
+    mudanças no CSV não faz nenhuma escrita.
+    """
+    import numpy as np
+    import pandas as pd
+    metricas = Metricas('aulas_assistidas')
+    metricas.instrumentar_cliente(supabase)
+    try:
+        with metricas.fase('ler'):
+            pares = explodir_pares(csv_file_path)
+        metricas.contar('lidas', len(pares.aula))
+
+        with metricas.fase('resolver'):
+            codigos_aulas, valores_aulas = _codigos_resolvidos('aulas', 'id_bubble_aula', 'id_aula',
+                                                               pares.aulas, pares.outros_aulas)
+            codigos_usuarios, valores_usuarios = _codigos_resolvidos('usuarios', 'id_bubble_usuario', 'id_usuario',
+                                                                     pares.usuarios, pares.outros_usuarios)
+            aula, usuario = codigos_aulas[pares.aula], codigos_usuarios[pares.usuario]
+            conhecidos = (aula >= 0) & (usuario >= 0)
+            # Dois IDs do Bubble podem apontar para o mesmo ID do Supabase: np.unique junta os pares
+            resolvidos = np.unique(_codigo_par(aula[conhecidos], usuario[conhecidos], len(valores_usuarios)))
+        metricas.contar('resolvidas', len(resolvidos))
+        metricas.contar('ignoradas', len(pares.aula) - len(resolvidos))
+
+        with metricas.fase('existentes'):
+            existentes = pares_existentes(valores_aulas, valores_usuarios)
+        with metricas.fase('anti-join'):
+            novos_codigos = resolvidos[~np.isin(resolvidos, existentes)]
+            novos = pd.DataFrame({
+                'id_aula': valores_aulas[novos_codigos // len(valores_usuarios)],
+                'id_usuario': valores_usuarios[novos_codigos % len(valores_usuarios)],
+            })
+        metricas.contar('ja_existentes', len(resolvidos) - len(novos))
+        print(f"Pares no CSV: {len(pares.aula)} | Resolvidos: {len(resolvidos)} | Já gravados: {len(resolvidos) - len(novos)} "
+              f"| Novos: {len(novos)}")
+
+        if novos.empty:
+            print("\nNada a gravar: o Supabase já tem todas as aulas assistidas do CSV.")
+            return metricas.ok
+
+        registros = novos.to_dict('records')
+        if concorrencia > 1:
+            lotes = list(_chunks(registros, chunk_size))
+            # Só insere pares novos, como o caminho sequencial: um par gravado por outra execução é ignorado
+            operacoes = [Operacao('aulas_assistidas', 'upsert', lote, on_conflict=CONFLITO_AULAS_ASSISTIDAS,
+                                  ignorar_duplicados=True)
+                         for lote in lotes]
+            with metricas.fase('gravar'):
+                resultado = escrever(operacoes, concorrencia, ao_concluir=metricas.ao_concluir)
+            metricas.registrar_escrita(resultado)
+            for op, erro in resultado.falhas:
+                print(f"Erro ao gravar lote de {len(op.dados)} linhas: {erro}")
+        else:
+            # Sem checkpoint, o lote pode crescer além de chunk_size enquanto o servidor responder bem
+            controle = LoteAdaptativo('aulas_assistidas', chunk_size)
+
+            def gravar(lote):
+                supabase.table('aulas_assistidas')\
+                    .upsert(lote, on_conflict=CONFLITO_AULAS_ASSISTIDAS, ignore_duplicates=True)\
+                    .execute()
+
+            with metricas.fase('gravar'):
+                gravadas, recusados = gravar_adaptativo(registros, gravar, controle)
+            metricas.contar('gravadas', gravadas)
+            for registro, erro in recusados:
+                metricas.falha(f"Erro ao gravar aula {registro['id_aula']} do usuário {registro['id_usuario']}: {str(erro)}")
+            metricas.registrar_lote(controle)
+        print(f"\nCarga incremental concluída! Gravadas: {metricas.contadores['gravadas']} | "
+              f"Erros: {metricas.contadores['falhas']}")
+    except Exception as e:
+        metricas.erro(f"Erro durante a execução: {str(e)}")
+    finally:
+        metricas.finalizar(f"{csv_file_path}.metricas.json")
+    return metricas.ok
 
 if __name__ == "__main__":
     # Caminho para o arquivo CSV
     csv_file_path = 'C:/Users/55849/OneDrive/Documentos/cct2025/project/scripts/aulas_assistidas.csv'
-    processar_aulas_assistidas(csv_file_path)
+    args = sys.argv[1:]
+    concorrencia = CONCURRENCY if '--async' in args else 1
+    resume = '--resume' in args
+    profile = '--profile' in args
+    processos = (os.cpu_count() or 1) if '--processos' in args else 1
+    args = [arg for arg in args if arg not in ('--async', '--resume', '--profile', '--processos')]
+    with perfilar(profile, 'aulas_assistidas'):
+        if args and args[0] == '--pg-copy':
+            # Uso: python aulas_assistidas.py --pg-copy [arquivo.csv] (requer SUPABASE_DB_URL e a migração 20240326)
+            if len(args) > 1:
+                csv_file_path = args[1]
+            ok = processar_aulas_assistidas_copy(csv_file_path)
+        elif args and args[0] == '--incremental':
+            # Uso: python aulas_assistidas.py --incremental [--async] [arquivo.csv] (requer a migração 20240326)
+            if len(args) > 1:
+                csv_file_path = args[1]
+            ok = processar_aulas_assistidas_incremental(csv_file_path, concorrencia=concorrencia)
+        elif args and args[0] == '--bulk':
+            # Uso: python aulas_assistidas.py --bulk [--async] [--resume] [--processos] [arquivo.csv] [tamanho_do_lote] (requer a migração 20240326)
+            if len(args) > 1:
+                csv_file_path = args[1]
+            chunk_size = int(args[2]) if len(args) > 2 else INSERT_CHUNK_SIZE
+            ok = processar_aulas_assistidas_bulk(csv_file_path, chunk_size, concorrencia, resume, processos)
+        else:
+            if args:
+                csv_file_path = args[0]
+            ok = processar_aulas_assistidas(csv_file_path)
+    sys.exit(0 if ok else 1)
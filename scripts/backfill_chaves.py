@@ -0,0 +1,98 @@
+import sys
+import uuid
+from cliente_supabase import supabase
+from async_writer import CONCURRENCY, Operacao, escrever
+from backfill_rpc import BATCH_SIZE, executar_backfill_rpc
+from table_scan import escanear_tabela
+from metricas import Metricas, perfilar
+
+def preencher_chaves(supabase, tabela, coluna_chave, coluna_natural, concorrencia=1, metricas=None):
+    """Preenche `coluna_chave` com UUIDs gerados localmente onde ela ainda é nula.
+
+    Só `coluna_natural` das linhas sem chave é lida (varredura paginada por ela, que
+    precisa ser única) e cada chave vai em um update de uma coluna filtrado por
+    `coluna_natural = valor AND coluna_chave IS NULL`: as outras colunas não são
+    reenviadas, então uma edição feita durante o backfill não é desfeita, e uma chave
+    preenchida por outro processo não é sobrescrita. Com `concorrencia` maior que 1 os
+    updates vão em paralelo pelo async_writer. É o caminho do cliente; o padrão é
+    preencher_chaves_no_servidor. Retorna {valor natural: nova chave} das linhas
+    gravadas com sucesso.
+    """
+    metricas = metricas or Metricas(f"backfill_{tabela}_{coluna_chave}")
+    novos = {}
+
+    linhas = escanear_tabela(
+        supabase, tabela, coluna_natural, chave=coluna_natural, prefetch=True,
+        filtro=lambda q: q.is_(coluna_chave, 'null').not_.is_(coluna_natural, 'null'),
+    )
+    chaves = ((linha[coluna_natural], str(uuid.uuid4())) for linha in metricas.iterar('ler', linhas))
+
+    if concorrencia > 1:
+        def operacoes():
+            for natural, chave in chaves:
+                metricas.contar('lidas')
+                yield Operacao(tabela, 'update', {coluna_chave: chave},
+                               filtros={coluna_natural: natural, coluna_chave: None}, contexto=natural)
+
+        def ao_concluir(op, erro):
+            metricas.ao_concluir(op, erro)
+            if erro is None:
+                novos[op.contexto] = op.dados[coluna_chave]
+
+        resultado = escrever(operacoes(), concorrencia, ao_concluir=ao_concluir)
+        metricas.registrar_escrita(resultado)
+        for op, erro in resultado.falhas:
+            print(f"Erro ao gravar a linha {op.contexto} em {tabela}: {erro}")
+        return novos
+
+    for natural, chave in chaves:
+        metricas.contar('lidas')
+        try:
+            with metricas.fase('gravar'):
+                supabase.table(tabela).update({coluna_chave: chave})\
+                    .eq(coluna_natural, natural).is_(coluna_chave, 'null').execute()
+            metricas.contar('gravadas')
+            novos[natural] = chave
+        except Exception as e:
+            metricas.falha(f"Erro ao gravar a linha {natural} em {tabela}: {str(e)}")
+    return novos
+
+def preencher_chaves_no_servidor(supabase, tabela, coluna_chave, coluna_natural, batch_size=BATCH_SIZE):
+    """Mesmo backfill feito no Postgres: gen_random_uuid() em lotes pela função backfill_chave_uuid.
+
+    Não traz nenhuma linha para o cliente; requer a migração 20240327. Retorna o total de linhas preenchidas.
+    """
+    params = {'p_tabela': tabela, 'p_coluna_chave': coluna_chave, 'p_coluna_natural': coluna_natural}
+    return executar_backfill_rpc(supabase, 'backfill_chave_uuid', params, batch_size)
+
+if __name__ == "__main__":
+    # Uso: python backfill_chaves.py <tabela> <coluna_chave> <coluna_natural> [--cliente [--async]] [--profile]
+    # Ex.: python backfill_chaves.py modulos id_modulo id_bubble_modulo
+    # O padrão é o backfill no servidor (migração 20240327); --cliente gera os UUIDs aqui, um update por linha
+    args = sys.argv[1:]
+    cliente = '--cliente' in args
+    concorrencia = CONCURRENCY if '--async' in args else 1
+    profile = '--profile' in args
+    args = [arg for arg in args if arg not in ('--cliente', '--async', '--profile')]
+    if len(args) != 3:
+        print("Uso: python backfill_chaves.py <tabela> <coluna_chave> <coluna_natural> [--cliente [--async]] [--profile]")
+        sys.exit(1)
+
+    tabela, coluna_chave, coluna_natural = args
+    with perfilar(profile, 'backfill_chaves'):
+        metricas = Metricas(f"backfill_{tabela}_{coluna_chave}")
+        metricas.instrumentar_cliente(supabase)
+        try:
+            if cliente:
+                novos = preencher_chaves(supabase, tabela, coluna_chave, coluna_natural,
+                                         concorrencia=concorrencia, metricas=metricas)
+                print(f"\nBackfill concluído! Linhas preenchidas: {len(novos)}")
+            else:
+                total = preencher_chaves_no_servidor(supabase, tabela, coluna_chave, coluna_natural)
+                metricas.contar('gravadas', total)
+                print(f"\nBackfill concluído! Linhas preenchidas: {total}")
+        except Exception as e:
+            metricas.erro(f"Erro durante o backfill: {e}")
+        finally:
+            metricas.finalizar()
+    sys.exit(0 if metricas.ok else 1)
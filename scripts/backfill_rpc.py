@@ -0,0 +1,32 @@
+import time
+
+# Quantidade de chaves processadas por chamada da função de backfill
+BATCH_SIZE = 5000
+
+def executar_backfill_rpc(supabase, funcao, params=None, batch_size=BATCH_SIZE):
+    """Executa uma função de backfill "set-based" (ver database/migrations) em lotes de chaves.
+
+    Cada chamada RPC faz um único UPDATE ... FROM no Postgres para um intervalo de
+    chaves e devolve as linhas afetadas e a última chave do lote; o loop continua a
+    partir dessa chave até a tabela acabar. Retorna o total de linhas afetadas.
+    """
+    params = dict(params or {})
+    total = 0
+    lotes = 0
+    apos = None
+    inicio = time.perf_counter()
+
+    while True:
+        response = supabase.rpc(funcao, {**params, 'p_apos': apos, 'p_limite': batch_size}).execute()
+        resultado = response.data[0] if response.data else {}
+        ultima_chave = resultado.get('ultima_chave')
+        if ultima_chave is None:
+            break
+
+        lotes += 1
+        total += resultado.get('atualizadas') or 0
+        apos = ultima_chave
+        print(f"Lote {lotes}: {resultado.get('atualizadas')} linhas atualizadas (até {ultima_chave})")
+
+    print(f"{funcao}: {total} linhas atualizadas em {lotes} lotes ({time.perf_counter() - inicio:.2f}s)")
+    return total
@@ -0,0 +1,219 @@
+import argparse
+import contextlib
+import functools
+import importlib
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+# Tamanhos padrão dos conjuntos sintéticos (linhas de aulas / linhas dos CSVs)
+DEFAULT_TAMANHOS = [10_000, 100_000, 1_000_000]
+
+# Casos: nome -> (módulo, função, dados de entrada, argumentos extras)
+CASOS = {
+    'atualizar_aula': ('atualizar_aula', 'update_aulas_with_id_modulo', 'banco', {}),
+    'atualizar_aula_async': ('atualizar_aula', 'update_aulas_with_id_modulo_async', 'banco', {}),
+    'atualizar_aula_set_based': ('atualizar_aula', 'update_aulas_with_id_modulo_set_based', 'banco', {}),
+    'preenche_modulos': ('preenche_modulos', 'preencher_id_modulo', 'modulos_sem_id', {}),
+    'preenche_modulos_async': ('preenche_modulos', 'preencher_id_modulo_async', 'modulos_sem_id', {}),
+    'preenche_modulos_bulk': ('preenche_modulos', 'preencher_id_modulo_bulk', 'modulos_sem_id', {}),
+    'preenche_modulos_set_based': ('preenche_modulos', 'preencher_id_modulo_set_based', 'modulos_sem_id', {}),
+    'update_modulos_curso_id': ('update_modulos_curso_id', 'update_modulos_curso_id', 'banco', {}),
+    'update_modulos_curso_id_async': ('update_modulos_curso_id', 'update_modulos_curso_id_async', 'banco', {}),
+    'update_modulos_curso_id_set_based': ('update_modulos_curso_id', 'update_modulos_curso_id_set_based', 'banco', {}),
+    'update_modules': ('update_modules', 'update_modules', 'banco', {}),
+    'update_modules_set_based': ('update_modules', 'update_modules_set_based', 'banco', {}),
+    'aulas_assistidas': ('aulas_assistidas', 'processar_aulas_assistidas', 'aulas_assistidas', {}),
+    'aulas_assistidas_bulk': ('aulas_assistidas', 'processar_aulas_assistidas_bulk', 'aulas_assistidas', {}),
+    'aulas_assistidas_incremental': ('aulas_assistidas', 'processar_aulas_assistidas_incremental', 'aulas_assistidas', {}),
+    'import_membros': ('import_membros', 'import_membros', 'membros', {}),
+    'import_membros_chunked': ('import_membros', 'import_membros_chunked', 'membros', {}),
+    'import_users': ('import_users', 'import_users', 'users', {}),
+    'import_users_bulk': ('import_users', 'import_users_bulk', 'users', {}),
+}
+
+def _bubble_id(prefixo, i):
+    # Mesmo formato dos IDs reais (<ms>x<18 dígitos>); o código da letra separa as tabelas
+    return f"{1600000000000 + i}x{ord(prefixo):03d}{i:015d}"
+
+def semear_banco(fake, linhas, modulos_sem_id=False):
+    """Cursos (linhas/100), módulos (linhas/10), aulas (linhas) e usuários (linhas/10) ligados pelos IDs do Bubble."""
+    n_cursos, n_modulos, n_usuarios = max(linhas // 100, 1), max(linhas // 10, 1), max(linhas // 10, 1)
+    fake.semear('cursos', [
+        {'id': f"curso-{i}", 'id_curso': f"curso-{i}", 'id_bubble_curso': _bubble_id('c', i), 'titulo': f"Curso {i}"}
+        for i in range(n_cursos)
+    ])
+    fake.semear('modulos', [
+        {'id': f"modulo-{i}", 'id_bubble_modulo': _bubble_id('m', i), 'id_bubble_curso': _bubble_id('c', i % n_cursos),
+         'id_modulo': None if modulos_sem_id else f"modulo-{i}", 'id_curso': None, 'titulo': f"Módulo {i}", 'ordem': i}
+        for i in range(n_modulos)
+    ])
+    for inicio in range(0, linhas, 100_000):
+        fake.semear('aulas', [
+            {'id': f"aula-{i}", 'id_aula': f"aula-{i}", 'id_bubble_aula': _bubble_id('a', i),
+             'id_bubble_modulo': _bubble_id('m', i % n_modulos), 'id_modulo': None}
+            for i in range(inicio, min(inicio + 100_000, linhas))
+        ])
+    fake.semear('usuarios', [
+        {'id_usuario': f"usuario-{i}", 'id_bubble_usuario': _bubble_id('u', i), 'email': f"u{i}@exemplo.com", 'nome': f"U {i}"}
+        for i in range(n_usuarios)
+    ])
+
+def gerar_aulas_assistidas(path, linhas):
+    """CSV no formato do export do Bubble: id_aula_bubble;usuarios (até 5 por linha)."""
+    rnd = random.Random(42)
+    n_usuarios = max(linhas // 10, 1)
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write("id_aula_bubble;usuarios;;;;;;\n")
+        for i in range(linhas):
+            usuarios = ",".join(_bubble_id('u', rnd.randrange(n_usuarios)) for _ in range(rnd.randint(1, 5)))
+            file.write(f"{_bubble_id('a', i)};{usuarios};;;;;;\n")
+
+def gerar_membros(path, linhas):
+    rnd = random.Random(42)
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write("id_bubble_membro;data_expiracao;detalhe;origem;id_bubble_plano;teste_gratis;id_bubble_user\n")
+        for i in range(linhas):
+            file.write(
+                f"{_bubble_id('b', i)};{rnd.choice(['Dec 31, 2025 12:00 am', '2025-06-01', ''])};benchmark;"
+                f"bench_scripts;1600000000000x1;{rnd.choice(['sim', 'não', 'true', ''])};{_bubble_id('u', i)}\n"
+            )
+
+def preparar(dados, linhas, diretorio, fake):
+    """Prepara o banco falso e, para os imports, o CSV de entrada. Retorna o caminho do CSV ou None."""
+    if dados in ('banco', 'modulos_sem_id', 'aulas_assistidas'):
+        semear_banco(fake, linhas, modulos_sem_id=dados == 'modulos_sem_id')
+    if dados == 'aulas_assistidas':
+        path = os.path.join(diretorio, 'aulas_assistidas.csv')
+        gerar_aulas_assistidas(path, linhas)
+        return path
+    if dados == 'membros':
+        path = os.path.join(diretorio, 'membros.csv')
+        gerar_membros(path, linhas)
+        return path
+    if dados == 'users':
+        from bench_usuarios import gerar_csv
+        path = os.path.join(diretorio, 'users.csv')
+        gerar_csv(path, linhas)
+        return path
+    return None
+
+def rodar_caso(nome, linhas, latencia):
+    """Executa um caso neste processo contra o FakePostgrest e devolve as métricas."""
+    # O async_writer lê URL e chave da configuração; valores fictícios bastam, as requisições vão para o fake
+    os.environ.setdefault('VITE_SUPABASE_URL', 'http://localhost:1')
+    os.environ.setdefault('VITE_SUPABASE_ANON_KEY', 'eyJhbGciOiJIUzI1NiJ9.e30.x')
+    os.environ['BUBBLE_CACHE_DIR'] = tempfile.mkdtemp(prefix='bench_cache_')
+
+    import async_writer
+    from bubble_cache import BubbleIdCache
+    from fake_postgrest import FakePostgrest
+
+    modulo, funcao, dados, kwargs = CASOS[nome]
+    with tempfile.TemporaryDirectory() as diretorio:
+        # Os resumos <script>.metricas.json ficam no diretório temporário
+        os.chdir(diretorio)
+        fake = FakePostgrest()
+        csv_path = preparar(dados, linhas, diretorio, fake)
+        fake.latencia = latencia
+
+        script = importlib.import_module(modulo)
+        script.supabase = fake
+        if hasattr(script, 'cache'):
+            script.cache = BubbleIdCache(fake, cache_dir=os.environ['BUBBLE_CACHE_DIR'])
+        if hasattr(script, 'escrever'):
+            script.escrever = functools.partial(
+                async_writer.escrever, base_url='http://fake/rest/v1', transport=fake.transport()
+            )
+
+        inicio = time.perf_counter()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            getattr(script, funcao)(*([csv_path] if csv_path else []), **kwargs)
+        duracao = time.perf_counter() - inicio
+
+        return {
+            'caso': nome,
+            'linhas': linhas,
+            'segundos': round(duracao, 3),
+            'requisicoes': fake.requisicoes,
+            'pico_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            'por_operacao': dict(fake.por_operacao.most_common(5)),
+        }
+
+def conferir_reenvio():
+    """Confere no FakePostgrest que o async_writer só repete escritas idempotentes.
+
+    A primeira resposta de cada escrita se perde (503 depois de gravar): o upsert que
+    ignora duplicados é repetido sem duplicar o par, e o insert falha sem ser reenviado.
+    """
+    os.environ.setdefault('VITE_SUPABASE_URL', 'http://localhost:1')
+    os.environ.setdefault('VITE_SUPABASE_ANON_KEY', 'eyJhbGciOiJIUzI1NiJ9.e30.x')
+    from async_writer import Operacao, escrever
+    from fake_postgrest import FakePostgrest
+
+    fake = FakePostgrest()
+    destino = {'base_url': 'http://fake/rest/v1', 'transport': fake.transport()}
+    fake.respostas_perdidas = 1
+    upsert = escrever([Operacao('aulas_assistidas', 'upsert', [{'id_aula': 1, 'id_usuario': 1}],
+                                on_conflict='id_aula,id_usuario', ignorar_duplicados=True)], 1, **destino)
+    fake.respostas_perdidas = 1
+    insert = escrever([Operacao('aulas_assistidas', 'insert', [{'id_aula': 2, 'id_usuario': 1}])], 1, **destino)
+
+    if (upsert.sucesso, upsert.tentativas, insert.sucesso, insert.tentativas, fake.contar('aulas_assistidas')) != (1, 2, 0, 1, 2):
+        sys.exit(f"Reenvio incorreto: upsert {upsert.resumo()} | insert {insert.resumo()} | "
+                 f"{fake.contar('aulas_assistidas')} pares gravados")
+    print("Reenvio conferido: upsert repetido sem duplicar, insert não repetido")
+
+def medir(nome, linhas, latencia):
+    """Roda o caso em um subprocesso para isolar o pico de memória de cada medição."""
+    comando = [sys.executable, os.path.abspath(__file__), '--_caso', nome, '--_linhas', str(linhas),
+               '--latencia', str(latencia)]
+    processo = subprocess.run(comando, capture_output=True, text=True)
+    if processo.returncode != 0:
+        return {'caso': nome, 'linhas': linhas, 'erro': processo.stderr.strip().splitlines()[-1:]}
+    return json.loads(processo.stdout.strip().splitlines()[-1])
+
+if __name__ == "__main__":
+    # Uso: python bench_scripts.py [--casos a,b] [--tamanhos 10000,100000] [--latencia 0.005] [--json saida.json]
+    #      python bench_scripts.py --conferir-reenvio   (só confere os reenvios do async_writer)
+    # Nada é enviado ao Supabase: todos os casos rodam contra o fake_postgrest em memória.
+    parser = argparse.ArgumentParser(description="Benchmark dos scripts de migração contra um PostgREST falso")
+    parser.add_argument('--casos', help="Casos separados por vírgula (padrão: todos)")
+    parser.add_argument('--tamanhos', help="Quantidades de linhas separadas por vírgula (padrão: 10k,100k,1M)")
+    parser.add_argument('--latencia', type=float, default=0.0, help="Latência simulada por requisição, em segundos")
+    parser.add_argument('--json', help="Grava os resultados neste arquivo")
+    parser.add_argument('--conferir-reenvio', action='store_true', help="Só confere os reenvios do async_writer")
+    parser.add_argument('--_caso', help=argparse.SUPPRESS)
+    parser.add_argument('--_linhas', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.conferir_reenvio:
+        conferir_reenvio()
+        sys.exit(0)
+
+    if args._caso:
+        print(json.dumps(rodar_caso(args._caso, args._linhas, args.latencia)))
+        sys.exit(0)
+
+    casos = args.casos.split(',') if args.casos else list(CASOS)
+    tamanhos = [int(t) for t in args.tamanhos.split(',')] if args.tamanhos else DEFAULT_TAMANHOS
+    resultados = []
+    print(f"{'caso':<36} {'linhas':>9} {'tempo':>9} {'requisições':>12} {'pico RSS':>10}")
+    for linhas in tamanhos:
+        for nome in casos:
+            resultado = medir(nome, linhas, args.latencia)
+            resultados.append(resultado)
+            if 'erro' in resultado:
+                print(f"{nome:<36} {linhas:>9} erro: {' '.join(resultado['erro'])}")
+            else:
+                print(f"{nome:<36} {linhas:>9} {resultado['segundos']:8.2f}s {resultado['requisicoes']:>12} "
+                      f"{resultado['pico_rss_mb']:>8.1f}MB")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(resultados, file, indent=2, ensure_ascii=False)
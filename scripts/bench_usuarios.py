@@ -0,0 +1,75 @@
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+from import_users import lotes_usuarios, montar_usuario
+
+# Quantidade padrão de usuários no arquivo sintético
+LINHAS_PADRAO = 1_000_000
+
+COLUNAS = [
+    'id_bubble_user', 'nome', 'first_name', 'last_name', 'email', 'assinatura_ativa',
+    'ativo', 'cpf', 'dt_expiracao', 'end_cep', 'end_cidade', 'end_estado',
+    'end_logradouro', 'end_numero', 'foto', 'id_bubble_plano_atual', 'senha_provisoria',
+    'suporte', 'telefone', 'teste_gratis', 'whatsapp', 'whatsapp_validacao',
+]
+
+def gerar_csv(path, linhas):
+    """Gera um CSV de usuários no formato exportado pelo Bubble."""
+    rnd = random.Random(42)
+    booleano = lambda: rnd.choice(['true', 'false', ''])
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file, delimiter=';')
+        writer.writerow(COLUNAS)
+        for i in range(linhas):
+            writer.writerow([
+                f"{1600000000000 + i}x{rnd.randrange(10**17, 10**18)}",
+                f"Usuário {i}", "Nome", "Sobrenome", f" Usuario{i}@Exemplo.com ",
+                booleano(), booleano(),
+                f"{rnd.randrange(100, 1000)}.{rnd.randrange(100, 1000)}.{rnd.randrange(100, 1000)}-{rnd.randrange(10, 100)}",
+                rnd.choice(['2024-12-31', '2025-06-01', '', 'inválida']),
+                '59000-000', 'Natal', 'RN', 'Rua Exemplo', str(i % 1000), '',
+                '1600000000000x1', '', booleano(),
+                f"(84) 9{rnd.randrange(10**7, 10**8)}", booleano(),
+                f"+55 84 9{rnd.randrange(10**7, 10**8)}", booleano(),
+            ])
+
+def por_linha(path):
+    """Caminho atual: DictReader + limpeza linha a linha."""
+    total = 0
+    with open(path, 'r', encoding='utf-8') as file:
+        reader = csv.DictReader(file, delimiter=';')
+        reader.fieldnames = [key.strip() for key in reader.fieldnames]
+        for row in reader:
+            clean_row = {k: v.strip() if v else v for k, v in row.items()}
+            montar_usuario(clean_row)
+            total += 1
+    return total
+
+def por_coluna(path, tamanho_lote=50_000):
+    """Motor colunar: normaliza blocos inteiros e gera os lotes prontos para envio."""
+    total = 0
+    for lote in lotes_usuarios(path, tamanho_lote):
+        total += len(lote)
+    return total
+
+def medir(nome, funcao, path):
+    inicio = time.perf_counter()
+    total = funcao(path)
+    duracao = time.perf_counter() - inicio
+    print(f"{nome:<10} {total:>10} linhas  {duracao:8.2f}s  {total / duracao:12.0f} linhas/s")
+    return duracao
+
+if __name__ == "__main__":
+    # Uso: python bench_usuarios.py [quantidade_de_linhas]
+    linhas = int(sys.argv[1]) if len(sys.argv) > 1 else LINHAS_PADRAO
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'usuarios.csv')
+        print(f"Gerando {linhas} usuários sintéticos...")
+        gerar_csv(path, linhas)
+        t_linha = medir('por linha', por_linha, path)
+        t_coluna = medir('colunar', por_coluna, path)
+        print(f"Ganho: {t_linha / t_coluna:.1f}x")
@@ -0,0 +1,229 @@
+import functools
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from table_scan import escanear_tabela
+
+# Diretório padrão do cache local (pode ser sobrescrito com BUBBLE_CACHE_DIR)
+CACHE_DIR = os.environ.get('BUBBLE_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache'))
+# Quantidade de linhas por página ao aquecer um mapeamento
+PAGE_SIZE = 1000
+# Quantidade máxima de entradas mantidas em memória (LRU)
+MAX_MEMORIA = 200_000
+# Quantidade de IDs por consulta `in_()` ao resolver faltantes
+LOOKUP_CHUNK_SIZE = 200
+# Segundos em que um mapeamento aquecido vale como completo; depois disso `aquecer` lê a
+# tabela de novo e, até lá, os IDs que faltarem voltam a ser buscados no Supabase
+MAX_IDADE_AQUECIDO = 3600
+
+def _sincronizado(metodo):
+    """Serializa o acesso ao SQLite e à LRU quando o cache é usado por várias threads."""
+    @functools.wraps(metodo)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return metodo(self, *args, **kwargs)
+    return wrapper
+
+def _chave(tabela, coluna_bubble, coluna_id):
+    return f"{tabela}.{coluna_bubble}->{coluna_id}"
+
+class BubbleIdCache:
+    """Resolve IDs do Bubble para IDs do Supabase usando um cache SQLite local.
+
+    Cada mapeamento (tabela, coluna_bubble, coluna_id) é aquecido com uma única
+    leitura paginada e depois respondido da memória (LRU) ou do SQLite. Por
+    MAX_IDADE_AQUECIDO segundos o mapeamento aquecido é tido como completo; depois,
+    IDs ausentes voltam a ser buscados no Supabase, então linhas criadas depois do
+    aquecimento acabam resolvidas sem `limpar`. Os scripts que gravam novos IDs devem
+    chamar `registrar` ou `invalidar` para manter o cache coerente. Uma mesma
+    instância pode ser compartilhada entre threads.
+    """
+
+    def __init__(self, supabase, cache_dir=CACHE_DIR, max_memoria=MAX_MEMORIA, max_idade=MAX_IDADE_AQUECIDO):
+        self.supabase = supabase
+        self.max_memoria = max_memoria
+        self.max_idade = max_idade
+        self.memoria = OrderedDict()
+        # Mapeamento aquecido -> momento do aquecimento (time.time())
+        self.aquecidos = {}
+        self.requisicoes = 0
+        self.lock = threading.RLock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(cache_dir, 'bubble_ids.sqlite'), check_same_thread=False)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS mapeamentos (
+                mapa TEXT NOT NULL,
+                id_bubble TEXT NOT NULL,
+                id TEXT NOT NULL,
+                PRIMARY KEY (mapa, id_bubble)
+            ) WITHOUT ROWID
+        """)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS mapas_aquecidos (
+                mapa TEXT PRIMARY KEY,
+                aquecido_em REAL NOT NULL,
+                total INTEGER NOT NULL
+            )
+        """)
+        self.db.commit()
+
+    def _lembrar(self, chave, id_bubble, valor):
+        item = (chave, id_bubble)
+        self.memoria[item] = valor
+        self.memoria.move_to_end(item)
+        while len(self.memoria) > self.max_memoria:
+            self.memoria.popitem(last=False)
+
+    @_sincronizado
+    def aquecer(self, tabela, coluna_bubble, coluna_id, forcar=False, max_idade=None, page_size=PAGE_SIZE):
+        """Carrega o mapeamento inteiro com uma leitura paginada, se não houver um aquecimento recente.
+
+        `max_idade` (padrão: o do cache) é a idade máxima, em segundos, de um aquecimento
+        reaproveitado; passe float('inf') para reaproveitar qualquer um.
+        """
+        chave = _chave(tabela, coluna_bubble, coluna_id)
+        max_idade = self.max_idade if max_idade is None else max_idade
+        aquecido = self.db.execute(
+            "SELECT aquecido_em, total FROM mapas_aquecidos WHERE mapa = ?", (chave,)
+        ).fetchone()
+        if aquecido and not forcar and time.time() - aquecido[0] < max_idade:
+            self.aquecidos[chave] = aquecido[0]
+            return aquecido[1]
+
+        self.db.execute("DELETE FROM mapeamentos WHERE mapa = ?", (chave,))
+        # Paginação por chave sobre o ID do Bubble (só linhas que têm os dois IDs)
+        linhas = (
+            (chave, item[coluna_bubble], str(item[coluna_id]))
+            for item in escanear_tabela(
+                self.supabase, tabela, f'{coluna_bubble}, {coluna_id}', chave=coluna_bubble,
+                page_size=page_size, filtro=lambda q: q.not_.is_(coluna_bubble, 'null').not_.is_(coluna_id, 'null'),
+            )
+        )
+        cursor = self.db.executemany("INSERT OR REPLACE INTO mapeamentos VALUES (?, ?, ?)", linhas)
+        total = cursor.rowcount
+        self.requisicoes += total // page_size + 1
+
+        aquecido_em = time.time()
+        self.db.execute(
+            "INSERT OR REPLACE INTO mapas_aquecidos VALUES (?, ?, ?)", (chave, aquecido_em, total)
+        )
+        self.db.commit()
+        self.aquecidos[chave] = aquecido_em
+        return total
+
+    @_sincronizado
+    def resolver_varios(self, tabela, coluna_bubble, coluna_id, ids_bubble):
+        """Resolve um conjunto de IDs; os que faltarem no cache são buscados em lotes `in_()`."""
+        chave = _chave(tabela, coluna_bubble, coluna_id)
+        resultado = {}
+        faltantes = []
+        for id_bubble in set(ids_bubble):
+            item = (chave, id_bubble)
+            if item in self.memoria:
+                self.memoria.move_to_end(item)
+                resultado[id_bubble] = self.memoria[item]
+            else:
+                faltantes.append(id_bubble)
+
+        # Consulta o SQLite em blocos para respeitar o limite de parâmetros
+        ainda_faltantes = []
+        for i in range(0, len(faltantes), 500):
+            lote = faltantes[i:i + 500]
+            marcadores = ','.join('?' * len(lote))
+            encontrados = dict(self.db.execute(
+                f"SELECT id_bubble, id FROM mapeamentos WHERE mapa = ? AND id_bubble IN ({marcadores})",
+                [chave, *lote],
+            ).fetchall())
+            for id_bubble in lote:
+                if id_bubble in encontrados:
+                    resultado[id_bubble] = encontrados[id_bubble]
+                    self._lembrar(chave, id_bubble, encontrados[id_bubble])
+                else:
+                    ainda_faltantes.append(id_bubble)
+
+        # Mapeamento aquecido há pouco é completo: o que não está no cache não existe no Supabase
+        if time.time() - self.aquecidos.get(chave, float('-inf')) < self.max_idade:
+            return resultado
+
+        # Busca no Supabase apenas o que não está em lugar nenhum do cache
+        novos = {}
+        for i in range(0, len(ainda_faltantes), LOOKUP_CHUNK_SIZE):
+            lote = ainda_faltantes[i:i + LOOKUP_CHUNK_SIZE]
+            response = self.supabase.table(tabela)\
+                .select(f'{coluna_bubble}, {coluna_id}')\
+                .in_(coluna_bubble, lote)\
+                .execute()
+            self.requisicoes += 1
+            for item in response.data or []:
+                if item.get(coluna_id) is not None:
+                    novos[item[coluna_bubble]] = str(item[coluna_id])
+        if novos:
+            self.registrar(tabela, coluna_bubble, coluna_id, novos)
+            resultado.update(novos)
+
+        return resultado
+
+    def resolver(self, tabela, coluna_bubble, coluna_id, id_bubble):
+        """Resolve um único ID do Bubble. Retorna None se não existir."""
+        return self.resolver_varios(tabela, coluna_bubble, coluna_id, [id_bubble]).get(id_bubble)
+
+    @_sincronizado
+    def registrar(self, tabela, coluna_bubble, coluna_id, mapa):
+        """Grava no cache IDs recém-criados por um script ({id_bubble: id})."""
+        chave = _chave(tabela, coluna_bubble, coluna_id)
+        self.db.executemany(
+            "INSERT OR REPLACE INTO mapeamentos VALUES (?, ?, ?)",
+            [(chave, id_bubble, str(valor)) for id_bubble, valor in mapa.items()],
+        )
+        self.db.commit()
+        for id_bubble, valor in mapa.items():
+            self._lembrar(chave, id_bubble, str(valor))
+
+    @_sincronizado
+    def invalidar(self, tabela, coluna_bubble, coluna_id, ids_bubble=None):
+        """Remove entradas do cache. Sem `ids_bubble`, descarta o mapeamento inteiro."""
+        chave = _chave(tabela, coluna_bubble, coluna_id)
+        if ids_bubble is None:
+            self.db.execute("DELETE FROM mapeamentos WHERE mapa = ?", (chave,))
+            self.db.execute("DELETE FROM mapas_aquecidos WHERE mapa = ?", (chave,))
+            self.aquecidos.pop(chave, None)
+            for item in [item for item in self.memoria if item[0] == chave]:
+                del self.memoria[item]
+        else:
+            ids_bubble = list(ids_bubble)
+            self.db.executemany(
+                "DELETE FROM mapeamentos WHERE mapa = ? AND id_bubble = ?",
+                [(chave, id_bubble) for id_bubble in ids_bubble],
+            )
+            for id_bubble in ids_bubble:
+                self.memoria.pop((chave, id_bubble), None)
+            # Sem o mapeamento completo, as entradas removidas voltam a ser buscadas no Supabase
+            self.db.execute("DELETE FROM mapas_aquecidos WHERE mapa = ?", (chave,))
+            self.aquecidos.pop(chave, None)
+        self.db.commit()
+
+    @_sincronizado
+    def limpar(self):
+        """Apaga todo o cache local."""
+        self.db.execute("DELETE FROM mapeamentos")
+        self.db.execute("DELETE FROM mapas_aquecidos")
+        self.db.commit()
+        self.memoria.clear()
+        self.aquecidos.clear()
+
+    @_sincronizado
+    def fechar(self):
+        self.db.close()
+
+if __name__ == "__main__":
+    if len(sys.argv) == 2 and sys.argv[1] == "limpar":
+        cache_path = os.path.join(CACHE_DIR, 'bubble_ids.sqlite')
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+        print(f"Cache removido: {cache_path}")
+    else:
+        print("Uso: python bubble_cache.py limpar")
@@ -0,0 +1,231 @@
+import re
+import uuid
+
+import numpy as np
+
+# ID do Bubble: <timestamp em ms>x<número aleatório>, ex.: 1645565827741x807915417606553600
+# Só dígitos ASCII: `\d` aceitaria '１' e o ID não voltaria igual em `decodificar_id`
+_FORMATO = re.compile(r'([0-9]{1,15})x([0-9]{1,18})')
+# Um ID codificado: `alto` = timestamp << 10 | dígitos do timestamp << 5 | dígitos do aleatório, `baixo` = aleatório
+DTYPE = np.dtype([('alto', '<i8'), ('baixo', '<i8')])
+# `alto` dos IDs fora do formato: `baixo` é então a posição do texto na lista `outros`
+FORA_DO_FORMATO = -1
+
+def codificar_id(id_bubble):
+    """(alto, baixo) do ID, ou None se ele não estiver no formato <ms>x<aleatório>.
+
+    Os números de dígitos entram em `alto`, então zeros à esquerda sobrevivem e
+    `decodificar_id` devolve exatamente o texto original.
+    """
+    formato = _FORMATO.fullmatch(id_bubble) if isinstance(id_bubble, str) else None
+    if formato is None:
+        return None
+    tempo, aleatorio = formato.groups()
+    return (int(tempo) << 10) | (len(tempo) << 5) | len(aleatorio), int(aleatorio)
+
+def decodificar_id(alto, baixo):
+    alto, baixo = int(alto), int(baixo)
+    return f"{alto >> 10:0{(alto >> 5) & 31}d}x{baixo:0{alto & 31}d}"
+
+# Maior texto no formato: 15 dígitos, o "x" e 18 dígitos
+_LARGURA = 15 + 1 + 18
+
+def codificar_unicos(ids, outros=None):
+    """Codifica IDs do Bubble distintos em um array DTYPE (16 bytes por ID), sem laço por ID.
+
+    Os textos viram uma matriz de códigos Unicode e os dois números são montados dígito a
+    dígito, coluna por coluna, para todos os IDs de uma vez. Os que não passam na versão
+    vetorizada (fora do formato, dígitos não ASCII) vão para `codificar_id`; os que estão
+    mesmo fora do formato entram em `outros` (reaproveitada entre chamadas, ver `codificar`).
+    """
+    outros = [] if outros is None else outros
+    ids = list(ids)
+    chaves = np.empty(len(ids), dtype=DTYPE)
+    comprimentos = np.array([len(id_bubble) if isinstance(id_bubble, str) else 0 for id_bubble in ids], dtype=np.int64)
+    candidatos = np.flatnonzero((comprimentos >= 3) & (comprimentos <= _LARGURA))
+    validos = np.zeros(len(ids), dtype=bool)
+    if len(candidatos):
+        texto = np.array([ids[i] for i in candidatos], dtype=f'U{_LARGURA}')
+        # Uma linha por coluna do texto: cada passo do laço lê memória contígua
+        letras = np.ascontiguousarray(texto.view(np.uint32).reshape(len(candidatos), _LARGURA).T)
+        n = comprimentos[candidatos]
+        x = letras == ord('x')
+        pos = x.argmax(axis=0)
+        digitos = n - pos - 1
+        fora = np.arange(_LARGURA)[:, None] >= n
+        ok = ((x.sum(axis=0) == 1) & (pos >= 1) & (pos <= 15) & (digitos >= 1) & (digitos <= 18)
+              & ((letras >= ord('0')) & (letras <= ord('9')) | x | fora).all(axis=0))
+        tempo = np.zeros(len(candidatos), dtype=np.int64)
+        aleatorio = np.zeros(len(candidatos), dtype=np.int64)
+        for coluna in range(_LARGURA):
+            digito = letras[coluna].astype(np.int64) - ord('0')
+            tempo = np.where(coluna < pos, tempo * 10 + digito, tempo)
+            aleatorio = np.where((coluna > pos) & (coluna < n), aleatorio * 10 + digito, aleatorio)
+        chaves['alto'][candidatos[ok]] = ((tempo << 10) | (pos << 5) | digitos)[ok]
+        chaves['baixo'][candidatos[ok]] = aleatorio[ok]
+        validos[candidatos[ok]] = True
+    posicao_outros = None
+    for i in np.flatnonzero(~validos):
+        id_bubble = ids[i]
+        par = codificar_id(id_bubble)
+        if par is None:
+            if posicao_outros is None:
+                posicao_outros = {texto: j for j, texto in enumerate(outros)}
+            if id_bubble not in posicao_outros:
+                posicao_outros[id_bubble] = len(outros)
+                outros.append(id_bubble)
+            par = (FORA_DO_FORMATO, posicao_outros[id_bubble])
+        chaves[i] = par
+    return chaves
+
+def codificar(ids, outros=None):
+    """Codifica uma sequência de IDs do Bubble em um array DTYPE (16 bytes por ID).
+
+    Devolve (chaves, outros). IDs fora do formato (testes, dados corrompidos) ficam em
+    `outros`, uma vez cada, e a chave aponta para eles, então nada se perde. Passe a
+    lista `outros` de uma chamada anterior para codificar um arquivo em blocos com as
+    mesmas chaves. Cada texto distinto é analisado uma única vez (pd.factorize).
+    """
+    import pandas as pd
+
+    outros = [] if outros is None else outros
+    codigos, distintos = pd.factorize(np.asarray(ids, dtype=object), use_na_sentinel=False)
+    return codificar_unicos(distintos, outros)[codigos], outros
+
+def unificar(chaves):
+    """(chaves distintas em ordem, posição de cada chave de entrada entre elas), como np.unique."""
+    ordem = np.lexsort((chaves['baixo'], chaves['alto']))
+    ordenadas = chaves[ordem]
+    novas = np.ones(len(ordenadas), dtype=bool)
+    novas[1:] = (ordenadas['alto'][1:] != ordenadas['alto'][:-1]) | (ordenadas['baixo'][1:] != ordenadas['baixo'][:-1])
+    inverso = np.empty(len(chaves), dtype=np.int64)
+    inverso[ordem] = np.cumsum(novas) - 1
+    return ordenadas[novas], inverso
+
+def decodificar(chaves, outros=()):
+    """Texto de cada chave (inverso de `codificar`)."""
+    return [outros[baixo] if alto == FORA_DO_FORMATO else decodificar_id(alto, baixo)
+            for alto, baixo in zip(chaves['alto'].tolist(), chaves['baixo'].tolist())]
+
+def _uuids(valores):
+    """Valores como pares de uint64 quando todos são UUIDs (16 bytes em vez de um str de ~85)."""
+    pares = np.empty(len(valores), dtype=[('alto', '<u8'), ('baixo', '<u8')])
+    for i, valor in enumerate(valores):
+        try:
+            numero = uuid.UUID(str(valor)).int
+        except ValueError:
+            return None
+        pares[i] = (numero >> 64, numero & 0xFFFF_FFFF_FFFF_FFFF)
+    return pares
+
+class MapaBubble:
+    """Tabela IDs do Bubble -> IDs do Supabase em arrays NumPy ordenados (busca binária).
+
+    Substitui os dicionários {id_bubble: id} dos scripts: as chaves ficam codificadas
+    em dois int64 e, quando todos os valores são UUIDs, os valores também, em vez de
+    um objeto str por chave e por valor. As buscas em lote (`posicoes`, `buscar`) são
+    vetorizadas com np.searchsorted; `in`, `[]` e `get` servem para uso linha a linha.
+    """
+
+    def __init__(self, mapa):
+        itens = [(id_bubble, valor) for id_bubble, valor in dict(mapa).items() if valor is not None]
+        chaves, outros = codificar([id_bubble for id_bubble, _ in itens])
+        valores = [valor for _, valor in itens]
+        no_formato = chaves['alto'] != FORA_DO_FORMATO
+        indices = np.flatnonzero(no_formato)
+        ordem = indices[np.lexsort((chaves['baixo'][indices], chaves['alto'][indices]))]
+        # Dois arrays int64 contíguos: searchsorted em int64 é bem mais rápido que em um dtype estruturado
+        self.altos = np.ascontiguousarray(chaves['alto'][ordem])
+        self.baixos = np.ascontiguousarray(chaves['baixo'][ordem])
+        # IDs fora do formato são poucos (ou nenhum): ficam em um dicionário à parte
+        fora = np.flatnonzero(~no_formato)
+        self.outros = {outros[chaves['baixo'][i]]: len(ordem) + j for j, i in enumerate(fora)}
+        ordenados = [valores[i] for i in ordem] + [valores[i] for i in fora]
+        self.uuids = _uuids(ordenados)
+        self.valores = None if self.uuids is not None else np.array(ordenados, dtype=object)
+        self._textos = None
+
+    def __len__(self):
+        return len(self.altos) + len(self.outros)
+
+    def _posicao(self, id_bubble):
+        par = codificar_id(id_bubble)
+        if par is None:
+            return self.outros.get(id_bubble, -1)
+        alto, baixo = par
+        i = int(np.searchsorted(self.altos, alto))
+        # Vários IDs no mesmo milissegundo dividem o `alto`: o trecho é curto e ordenado por `baixo`
+        while i < len(self.altos) and self.altos[i] == alto:
+            if self.baixos[i] == baixo:
+                return i
+            i += 1
+        return -1
+
+    def posicoes(self, chaves, outros=()):
+        """Posição de cada chave codificada na tabela (-1 se ausente), com busca binária vetorizada.
+
+        `alto` é localizado com np.searchsorted; quando vários IDs dividem o mesmo `alto`
+        a busca continua em `baixo`, dentro do trecho, para todas as chaves de uma vez.
+        """
+        posicoes = np.full(len(chaves), -1, dtype=np.int64)
+        no_formato = np.flatnonzero(chaves['alto'] != FORA_DO_FORMATO)
+        if len(self.altos) and len(no_formato):
+            altos = np.ascontiguousarray(chaves['alto'][no_formato])
+            baixos = np.ascontiguousarray(chaves['baixo'][no_formato])
+            inicio = np.searchsorted(self.altos, altos, side='left')
+            fim = np.searchsorted(self.altos, altos, side='right')
+            lo, hi = inicio.copy(), fim.copy()
+            ativos = np.flatnonzero(lo < hi)
+            while len(ativos):
+                meio = (lo[ativos] + hi[ativos]) // 2
+                menor = self.baixos[meio] < baixos[ativos]
+                lo[ativos[menor]] = meio[menor] + 1
+                hi[ativos[~menor]] = meio[~menor]
+                ativos = ativos[lo[ativos] < hi[ativos]]
+            achou = lo < fim
+            achou[achou] = self.baixos[lo[achou]] == baixos[achou]
+            posicoes[no_formato[achou]] = lo[achou]
+        for i in np.flatnonzero(chaves['alto'] == FORA_DO_FORMATO):
+            posicoes[i] = self.outros.get(outros[chaves['baixo'][i]], -1)
+        return posicoes
+
+    def valor(self, posicao):
+        if self.uuids is None:
+            return self.valores[posicao]
+        alto, baixo = self.uuids[posicao]
+        return str(uuid.UUID(int=(int(alto) << 64) | int(baixo)))
+
+    def textos(self):
+        """Todos os valores como texto, na ordem das posições (criado uma vez, sob demanda)."""
+        if self._textos is None:
+            self._textos = np.array([self.valor(i) for i in range(len(self))], dtype=object)
+        return self._textos
+
+    def valores_em(self, posicoes):
+        """Valores nas `posicoes` (None onde a posição é -1)."""
+        if self.uuids is None:
+            resultado = np.empty(len(posicoes), dtype=object)
+            resultado[posicoes >= 0] = self.valores[posicoes[posicoes >= 0]]
+            return resultado
+        # Só os valores distintos viram texto
+        unicas, inverso = np.unique(posicoes, return_inverse=True)
+        textos = np.array([self.valor(p) if p >= 0 else None for p in unicas.tolist()], dtype=object)
+        return textos[inverso]
+
+    def buscar(self, ids):
+        """Resolve uma sequência de IDs do Bubble de uma vez; devolve um array de valores (None se ausente)."""
+        chaves, outros = codificar(ids)
+        return self.valores_em(self.posicoes(chaves, outros))
+
+    def __contains__(self, id_bubble):
+        return self._posicao(id_bubble) >= 0
+
+    def __getitem__(self, id_bubble):
+        posicao = self._posicao(id_bubble)
+        if posicao < 0:
+            raise KeyError(id_bubble)
+        return self.valor(posicao)
+
+    def get(self, id_bubble, padrao=None):
+        posicao = self._posicao(id_bubble)
+        return self.valor(posicao) if posicao >= 0 else padrao
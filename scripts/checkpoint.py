@@ -0,0 +1,70 @@
+import json
+import os
+import time
+
+class DiarioCheckpoint:
+    """Diário de lotes já gravados, salvo ao lado do CSV de entrada (`<csv>.checkpoint.jsonl`).
+
+    Cada lote confirmado vira uma linha JSON com seu número, o intervalo de registros
+    da entrada e os IDs que ele gravou. Com `retomar=True` o diário existente é carregado e os
+    lotes já confirmados são pulados; sem ele, o diário é recomeçado do zero.
+    """
+
+    def __init__(self, csv_path, tamanho_lote, retomar=False):
+        self.caminho = f"{os.path.splitext(csv_path)[0]}.checkpoint.jsonl"
+        self.tamanho_lote = tamanho_lote
+        self.lotes = {}
+
+        if retomar and os.path.exists(self.caminho):
+            with open(self.caminho, 'r', encoding='utf-8') as arquivo:
+                for linha in arquivo:
+                    try:
+                        registro = json.loads(linha)
+                    except json.JSONDecodeError:
+                        # Última linha incompleta de uma execução interrompida
+                        continue
+                    # Cabeçalho do diário ('batch_size' nos diários gravados antes do nome em português)
+                    gravado = registro.get('tamanho_lote', registro.get('batch_size'))
+                    if gravado is not None:
+                        if gravado != tamanho_lote:
+                            raise ValueError(
+                                f"O checkpoint {self.caminho} foi gravado com lotes de {gravado} "
+                                f"linhas; use o mesmo tamanho para retomar"
+                            )
+                        continue
+                    self.lotes[registro['lote']] = registro
+            self.arquivo = open(self.caminho, 'a', encoding='utf-8')
+        else:
+            self.arquivo = open(self.caminho, 'w', encoding='utf-8')
+            self._escrever({'tamanho_lote': tamanho_lote, 'inicio': time.time()})
+
+    def _escrever(self, registro):
+        self.arquivo.write(json.dumps(registro) + '\n')
+        self.arquivo.flush()
+        os.fsync(self.arquivo.fileno())
+
+    def concluido(self, lote):
+        """Indica se o lote já foi gravado em uma execução anterior."""
+        return lote in self.lotes
+
+    def registrar(self, lote, inicio, fim, ids):
+        """Confirma um lote gravado com sucesso (registros [inicio, fim) da entrada)."""
+        registro = {'lote': lote, 'inicio': inicio, 'fim': fim, 'ids': list(ids)}
+        self.lotes[lote] = registro
+        self._escrever(registro)
+
+    @property
+    def primeiro_pendente(self):
+        """Número do primeiro lote ainda não confirmado (lotes começam em 1)."""
+        lote = 1
+        while lote in self.lotes:
+            lote += 1
+        return lote
+
+    @property
+    def linhas_confirmadas(self):
+        """Quantidade de linhas de dados do CSV cobertas pelos lotes confirmados em sequência."""
+        return (self.primeiro_pendente - 1) * self.tamanho_lote
+
+    def fechar(self):
+        self.arquivo.close()
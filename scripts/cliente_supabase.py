@@ -0,0 +1,80 @@
+import os
+import threading
+
+# Conexões mantidas abertas (keep-alive) na sessão HTTP compartilhada
+MAX_CONEXOES = 20
+# Segundos que uma conexão ociosa fica no pool antes de ser fechada
+KEEPALIVE_EXPIRY = 60
+# Timeout das requisições ao PostgREST, em segundos
+TIMEOUT = 120
+
+_lock = threading.Lock()
+_cliente = None
+
+def configuracao():
+    """Lê VITE_SUPABASE_URL e a chave do ambiente (carregando o .env) só quando pedido.
+
+    SUPABASE_SERVICE_ROLE_KEY, quando definida, tem precedência sobre VITE_SUPABASE_ANON_KEY:
+    tabelas com RLS sem política de escrita (progresso_usuarios) só aceitam o service role.
+    """
+    from dotenv import load_dotenv
+    load_dotenv()
+    url = os.environ.get("VITE_SUPABASE_URL")
+    key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY") or os.environ.get("VITE_SUPABASE_ANON_KEY")
+    if not url or not key:
+        raise RuntimeError("Defina VITE_SUPABASE_URL e VITE_SUPABASE_ANON_KEY (ambiente ou .env)")
+    return url, key
+
+def http2_disponivel():
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def criar_sessao():
+    """Sessão httpx com pool de conexões keep-alive e HTTP/2 quando o pacote h2 está instalado."""
+    import httpx
+    limites = httpx.Limits(max_connections=MAX_CONEXOES, max_keepalive_connections=MAX_CONEXOES,
+                           keepalive_expiry=KEEPALIVE_EXPIRY)
+    return httpx.Client(http2=http2_disponivel(), limits=limites, timeout=TIMEOUT, follow_redirects=True)
+
+def obter_cliente():
+    """Cliente supabase-py compartilhado pelo processo, criado no primeiro uso.
+
+    Todas as requisições do PostgREST passam pela mesma sessão httpx, então as etapas
+    de um mesmo processo (ver migrar.py) reaproveitam as conexões TLS já abertas.
+    """
+    global _cliente
+    if _cliente is None:
+        with _lock:
+            if _cliente is None:
+                from supabase import create_client
+                from supabase.lib.client_options import SyncClientOptions
+                url, key = configuracao()
+                _cliente = create_client(url, key, options=SyncClientOptions(httpx_client=criar_sessao()))
+    return _cliente
+
+def fechar():
+    """Fecha a sessão HTTP do cliente compartilhado (se ele chegou a ser criado)."""
+    global _cliente
+    with _lock:
+        if _cliente is not None:
+            _cliente.postgrest.session.close()
+            _cliente = None
+
+class ClientePreguicoso:
+    """Representa o cliente compartilhado sem criá-lo: a criação acontece no primeiro atributo usado.
+
+    Os scripts expõem `supabase = ClientePreguicoso()` no nível do módulo, então importá-los
+    não lê o .env nem abre conexões, e quem reutiliza o script ainda pode trocar
+    `script.supabase` por outro cliente (migrar.py, bench_scripts.py).
+    """
+
+    def __getattr__(self, nome):
+        return getattr(obter_cliente(), nome)
+
+    def __repr__(self):
+        return f"<ClientePreguicoso {'criado' if _cliente is not None else 'não criado'}>"
+
+supabase = ClientePreguicoso()
@@ -0,0 +1,86 @@
+import csv
+import io
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# Bytes de CSV por tarefa enviada ao pool (grande o bastante para amortizar o pickle do resultado)
+TAMANHO_FAIXA = 8 * 1024 * 1024
+
+def ler_cabecalho(csv_path, delimiter=';', encoding='utf-8'):
+    """Lê a primeira linha do CSV e devolve os nomes das colunas (sem espaços extras)."""
+    with open(csv_path, 'r', encoding=encoding, newline='') as file:
+        return [coluna.strip() for coluna in next(csv.reader(file, delimiter=delimiter), [])]
+
+def dividir_em_faixas(csv_path, tamanho_faixa=TAMANHO_FAIXA):
+    """Divide o arquivo (sem o cabeçalho) em faixas de bytes [inicio, fim) que terminam em fim de linha.
+
+    Supõe que nenhum campo tenha quebra de linha dentro de aspas, o que vale para os
+    exports do Bubble usados aqui.
+    """
+    tamanho = os.path.getsize(csv_path)
+    faixas = []
+    with open(csv_path, 'rb') as file:
+        file.readline()
+        inicio = file.tell()
+        while inicio < tamanho:
+            file.seek(min(inicio + tamanho_faixa, tamanho) - 1)
+            # Avança até o fim da linha corrente para não cortar um registro ao meio
+            file.readline()
+            fim = file.tell()
+            faixas.append((inicio, fim))
+            inicio = fim
+    return faixas
+
+def ler_faixa(csv_path, inicio, fim):
+    with open(csv_path, 'rb') as file:
+        file.seek(inicio)
+        return file.read(fim - inicio)
+
+def ler_dataframe(dados, cabecalho, delimiter=';', **kwargs):
+    """Lê os bytes de uma faixa como DataFrame, com as colunas do cabeçalho do arquivo."""
+    import pandas as pd
+    return pd.read_csv(io.BytesIO(dados), sep=delimiter, header=None, names=cabecalho, encoding='utf-8', **kwargs)
+
+def _executar_faixa(funcao, csv_path, inicio, fim, cabecalho):
+    return funcao(ler_faixa(csv_path, inicio, fim), cabecalho)
+
+def processar_em_paralelo(csv_path, funcao, processos=None, tamanho_faixa=TAMANHO_FAIXA):
+    """Aplica `funcao(bytes_da_faixa, cabecalho)` a cada faixa do CSV em um pool de processos.
+
+    Os resultados são devolvidos na ordem do arquivo, à medida que ficam prontos, para
+    um único consumidor (o writer). No máximo 2 * `processos` faixas ficam em voo, então
+    a memória não cresce se o writer for mais lento que o parsing. `funcao` precisa ser
+    uma função de módulo (picklable).
+    """
+    processos = processos or os.cpu_count() or 1
+    cabecalho = ler_cabecalho(csv_path)
+    faixas = dividir_em_faixas(csv_path, tamanho_faixa)
+    with ProcessPoolExecutor(max_workers=processos) as executor:
+        pendentes = deque()
+        for inicio, fim in faixas:
+            pendentes.append(executor.submit(_executar_faixa, funcao, csv_path, inicio, fim, cabecalho))
+            if len(pendentes) >= 2 * processos:
+                yield pendentes.popleft().result()
+        while pendentes:
+            yield pendentes.popleft().result()
+
+def reagrupar(blocos, tamanho, concatenar=lambda partes: [item for parte in partes for item in parte]):
+    """Refaz uma sequência de blocos de tamanhos variados em blocos de exatamente `tamanho` itens.
+
+    Mantém a numeração dos lotes igual à do modo sequencial (o checkpoint depende dela).
+    `concatenar` junta as partes (listas por padrão; use `pd.concat` para DataFrames).
+    """
+    partes, acumulado = [], 0
+    for bloco in blocos:
+        posicao = 0
+        while posicao < len(bloco):
+            fatia = bloco[posicao:posicao + tamanho - acumulado]
+            posicao += len(fatia)
+            partes.append(fatia)
+            acumulado += len(fatia)
+            if acumulado == tamanho:
+                yield concatenar(partes)
+                partes, acumulado = [], 0
+    if partes:
+        yield concatenar(partes)
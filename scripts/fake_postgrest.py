@@ -0,0 +1,380 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from urllib.parse import unquote
+
+from pg_copy import tabelas_da_migracao
+
+class _Resposta:
+    def __init__(self, data):
+        self.data = data
+
+    def __iter__(self):
+        # Como o APIResponse do postgrest-py, que também é desempacotável em pares
+        yield 'data', self.data
+        yield 'count', None
+
+class _Query:
+    """Subconjunto do builder do postgrest-py usado pelos scripts."""
+
+    def __init__(self, fake, tabela):
+        self.fake = fake
+        self.tabela = tabela
+        self.operacao = 'select'
+        self.colunas = '*'
+        self.dados = None
+        self.on_conflict = None
+        self.ignorar_duplicados = False
+        self.filtros = []
+        self.ordem = None
+        self.limite = None
+        self.offset = 0
+        self.negar = False
+
+    # Operações
+    def select(self, colunas='*', **kwargs):
+        self.colunas = colunas
+        return self
+
+    def insert(self, dados, **kwargs):
+        self.operacao, self.dados = 'insert', dados
+        return self
+
+    def upsert(self, dados, on_conflict=None, ignore_duplicates=False, **kwargs):
+        self.operacao, self.dados, self.on_conflict = 'upsert', dados, on_conflict
+        self.ignorar_duplicados = ignore_duplicates
+        return self
+
+    def update(self, dados, **kwargs):
+        self.operacao, self.dados = 'update', dados
+        return self
+
+    def delete(self, **kwargs):
+        self.operacao = 'delete'
+        return self
+
+    # Filtros
+    def _filtro(self, sql, *valores):
+        if self.negar:
+            sql = f"NOT ({sql})"
+            self.negar = False
+        self.filtros.append((sql, valores))
+        return self
+
+    @property
+    def not_(self):
+        self.negar = True
+        return self
+
+    def eq(self, coluna, valor):
+        return self._filtro(f'"{coluna}" = ?', valor)
+
+    def gt(self, coluna, valor):
+        return self._filtro(f'"{coluna}" > ?', valor)
+
+    def gte(self, coluna, valor):
+        return self._filtro(f'"{coluna}" >= ?', valor)
+
+    def lt(self, coluna, valor):
+        return self._filtro(f'"{coluna}" < ?', valor)
+
+    def in_(self, coluna, valores):
+        valores = list(valores)
+        return self._filtro(f'"{coluna}" IN ({",".join("?" * len(valores))})', *valores)
+
+    def is_(self, coluna, valor):
+        if valor in (None, 'null'):
+            return self._filtro(f'"{coluna}" IS NULL')
+        return self._filtro(f'"{coluna}" IS ?', valor)
+
+    def order(self, coluna, desc=False, **kwargs):
+        self.ordem = f'"{coluna}" {"DESC" if desc else "ASC"}'
+        return self
+
+    def limit(self, quantidade, **kwargs):
+        self.limite = quantidade
+        return self
+
+    def range(self, inicio, fim, **kwargs):
+        self.offset, self.limite = inicio, fim - inicio + 1
+        return self
+
+    def execute(self):
+        return _Resposta(self.fake._executar(self))
+
+class _Rpc:
+    def __init__(self, fake, nome, params):
+        self.fake, self.nome, self.params = fake, nome, params
+
+    def execute(self):
+        return _Resposta(self.fake._executar_rpc(self.nome, self.params))
+
+class FakePostgrest:
+    """Imitação em processo do PostgREST/supabase-py, com tabelas SQLite em memória.
+
+    As tabelas são criadas a partir dos CREATE TABLE de database/migrations e ganham
+    colunas novas conforme os dados semeados ou inseridos. Cada `execute()` conta como
+    uma requisição HTTP e espera `latencia` segundos. `transport()` devolve um
+    transporte httpx para o async_writer falar com as mesmas tabelas; as próximas
+    `respostas_perdidas` escritas por ele são gravadas mas respondidas com 503, como
+    um gateway que perdeu a resposta.
+    """
+
+    def __init__(self, latencia=0.0):
+        self.latencia = latencia
+        self.respostas_perdidas = 0
+        self.requisicoes = 0
+        self.por_operacao = Counter()
+        self.lock = threading.RLock()
+        self.db = sqlite3.connect(':memory:', check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.colunas = {}
+        self.rpcs = {
+            'backfill_aulas_id_modulo': self._backfill_aulas_id_modulo,
+            'backfill_modulos_id_curso': self._backfill_modulos_id_curso,
+            'backfill_chave_uuid': self._backfill_chave_uuid,
+        }
+        for tabela, colunas in tabelas_da_migracao().items():
+            self._garantir_tabela(tabela, colunas)
+
+    # API compatível com supabase.Client
+    def table(self, tabela):
+        return _Query(self, tabela)
+
+    def rpc(self, nome, params=None):
+        return _Rpc(self, nome, params or {})
+
+    # Carga e inspeção
+    def semear(self, tabela, linhas):
+        """Insere linhas direto no SQLite, sem contar requisições."""
+        with self.lock:
+            self._inserir(tabela, linhas)
+
+    def contar(self, tabela):
+        with self.lock:
+            self._garantir_tabela(tabela, [])
+            return self.db.execute(f'SELECT COUNT(*) FROM "{tabela}"').fetchone()[0]
+
+    def _garantir_tabela(self, tabela, colunas):
+        existentes = self.colunas.get(tabela)
+        if existentes is None:
+            existentes = self.colunas[tabela] = []
+            self.db.execute(f'CREATE TABLE "{tabela}" (_rowid INTEGER PRIMARY KEY)')
+        for coluna in colunas:
+            if coluna not in existentes:
+                self.db.execute(f'ALTER TABLE "{tabela}" ADD COLUMN "{coluna}"')
+                existentes.append(coluna)
+                # Colunas de ID são as usadas em filtros; sem índice cada eq() varreria a tabela
+                if coluna == 'id' or coluna.startswith('id_'):
+                    self.db.execute(f'CREATE INDEX "idx_{tabela}_{coluna}" ON "{tabela}" ("{coluna}")')
+
+    def _contar_requisicao(self, operacao):
+        self.requisicoes += 1
+        self.por_operacao[operacao] += 1
+
+    def _inserir(self, tabela, linhas):
+        linhas = [linhas] if isinstance(linhas, dict) else list(linhas)
+        colunas = sorted({coluna for linha in linhas for coluna in linha} | {'id'})
+        self._garantir_tabela(tabela, colunas)
+        valores = [
+            tuple(linha.get(c, str(uuid.uuid4()) if c == 'id' else None) for c in colunas)
+            for linha in linhas
+        ]
+        cursor = self.db.execute(f'SELECT COALESCE(MAX(_rowid), 0) FROM "{tabela}"')
+        primeiro = cursor.fetchone()[0] + 1
+        lista = ", ".join(f'"{c}"' for c in colunas)
+        self.db.executemany(
+            f'INSERT INTO "{tabela}" ({lista}) VALUES ({", ".join("?" * len(colunas))})',
+            valores,
+        )
+        return self._linhas(tabela, '*', [('_rowid >= ?', (primeiro,))])
+
+    def _linhas(self, tabela, colunas, filtros, ordem=None, limite=None, offset=0):
+        if colunas.strip() == '*':
+            projecao = ", ".join(f'"{c}"' for c in self.colunas[tabela])
+        else:
+            nomes = [c.strip() for c in colunas.split(',') if c.strip()]
+            self._garantir_tabela(tabela, nomes)
+            projecao = ", ".join(f'"{c}"' for c in nomes)
+        sql = f'SELECT {projecao} FROM "{tabela}"'
+        params = []
+        if filtros:
+            sql += " WHERE " + " AND ".join(f[0] for f in filtros)
+            params = [v for f in filtros for v in f[1]]
+        if ordem:
+            sql += f" ORDER BY {ordem}"
+        if limite is not None:
+            sql += f" LIMIT {int(limite)} OFFSET {int(offset)}"
+        return [dict(linha) for linha in self.db.execute(sql, params)]
+
+    def _executar(self, query, esperar=True):
+        if esperar and self.latencia:
+            time.sleep(self.latencia)
+        with self.lock:
+            self._contar_requisicao(f"{query.operacao} {query.tabela}")
+            self._garantir_tabela(query.tabela, [])
+            filtros = [(sql, vals) for sql, vals in query.filtros]
+            for sql, _ in filtros:
+                coluna = sql.split('"')[1]
+                self._garantir_tabela(query.tabela, [coluna])
+
+            if query.operacao == 'select':
+                return self._linhas(query.tabela, query.colunas, filtros, query.ordem, query.limite, query.offset)
+            if query.operacao == 'insert':
+                return self._inserir(query.tabela, query.dados)
+            if query.operacao == 'upsert':
+                return self._upsert(query.tabela, query.dados, query.on_conflict, query.ignorar_duplicados)
+            if query.operacao == 'update':
+                return self._update(query.tabela, query.dados, filtros)
+            if query.operacao == 'delete':
+                return self._delete(query.tabela, filtros)
+        raise ValueError(f"Operação não suportada: {query.operacao}")
+
+    def _update(self, tabela, dados, filtros):
+        self._garantir_tabela(tabela, list(dados))
+        onde = " AND ".join(f[0] for f in filtros) or "1 = 1"
+        params = [v for f in filtros for v in f[1]]
+        ids = [r[0] for r in self.db.execute(f'SELECT _rowid FROM "{tabela}" WHERE {onde}', params)]
+        if not ids:
+            return []
+        sets = ", ".join(f'"{c}" = ?' for c in dados)
+        self.db.execute(
+            f'UPDATE "{tabela}" SET {sets} WHERE {onde}', [*dados.values(), *params]
+        )
+        marcadores = ",".join("?" * len(ids))
+        return self._linhas(tabela, '*', [(f'_rowid IN ({marcadores})', ids)])
+
+    def _delete(self, tabela, filtros):
+        removidas = self._linhas(tabela, '*', filtros)
+        onde = " AND ".join(f[0] for f in filtros) or "1 = 1"
+        self.db.execute(f'DELETE FROM "{tabela}" WHERE {onde}', [v for f in filtros for v in f[1]])
+        return removidas
+
+    def _upsert(self, tabela, linhas, on_conflict, ignorar_duplicados=False):
+        linhas = [linhas] if isinstance(linhas, dict) else list(linhas)
+        chaves = [c.strip() for c in (on_conflict or 'id').split(',')]
+        resultado = []
+        novas = []
+        for linha in linhas:
+            filtros = [(f'"{c}" = ?', (linha.get(c),)) for c in chaves]
+            self._garantir_tabela(tabela, list(linha))
+            if ignorar_duplicados:
+                if not self._linhas(tabela, '*', filtros, limite=1):
+                    novas.append(linha)
+                continue
+            atualizadas = self._update(tabela, linha, filtros)
+            if atualizadas:
+                resultado.extend(atualizadas)
+            else:
+                novas.append(linha)
+        if novas:
+            resultado.extend(self._inserir(tabela, novas))
+        return resultado
+
+    # Funções RPC de database/migrations/20240325_create_backfill_functions.sql
+    def _executar_rpc(self, nome, params):
+        if self.latencia:
+            time.sleep(self.latencia)
+        with self.lock:
+            self._contar_requisicao(f"rpc {nome}")
+            if nome not in self.rpcs:
+                raise ValueError(f"Função RPC desconhecida: {nome}")
+            return self.rpcs[nome](**params)
+
+    def _backfill(self, tabela, chave, atualizar_sql, p_apos, p_limite):
+        self._garantir_tabela(tabela, [chave])
+        lote = [r[0] for r in self.db.execute(
+            f'SELECT DISTINCT "{chave}" FROM "{tabela}" WHERE "{chave}" IS NOT NULL '
+            f'AND (? IS NULL OR "{chave}" > ?) ORDER BY "{chave}" LIMIT ?',
+            (p_apos, p_apos, p_limite),
+        )]
+        if not lote:
+            return [{'atualizadas': 0, 'ultima_chave': None}]
+        marcadores = ",".join("?" * len(lote))
+        cursor = self.db.execute(atualizar_sql.format(lote=marcadores), lote)
+        return [{'atualizadas': cursor.rowcount, 'ultima_chave': lote[-1]}]
+
+    def _backfill_aulas_id_modulo(self, p_apos=None, p_limite=5000):
+        self._garantir_tabela('aulas', ['id', 'id_bubble_modulo', 'id_modulo'])
+        self._garantir_tabela('modulos', ['id_bubble_modulo', 'id_modulo'])
+        return self._backfill('aulas', 'id', """
+            UPDATE aulas SET id_modulo = m.id_modulo FROM modulos m
+            WHERE aulas.id IN ({lote})
+            AND m.id_bubble_modulo = aulas.id_bubble_modulo
+            AND aulas.id_modulo IS NOT m.id_modulo
+        """, p_apos, p_limite)
+
+    def _backfill_modulos_id_curso(self, p_apos=None, p_limite=5000, p_coluna_curso='id_curso', p_somente_nulos=False):
+        if p_coluna_curso not in ('id', 'id_curso'):
+            raise ValueError(f"Coluna de curso inválida: {p_coluna_curso}")
+        self._garantir_tabela('modulos', ['id', 'id_bubble_curso', 'id_curso'])
+        self._garantir_tabela('cursos', ['id_bubble_curso', p_coluna_curso])
+        somente_nulos = "AND modulos.id_curso IS NULL" if p_somente_nulos else ""
+        return self._backfill('modulos', 'id', f"""
+            UPDATE modulos SET id_curso = c.{p_coluna_curso} FROM cursos c
+            WHERE modulos.id IN ({{lote}})
+            AND c.id_bubble_curso = modulos.id_bubble_curso
+            {somente_nulos}
+            AND modulos.id_curso IS NOT c.{p_coluna_curso}
+        """, p_apos, p_limite)
+
+    def _backfill_chave_uuid(self, p_tabela, p_coluna_chave, p_coluna_natural, p_apos=None, p_limite=5000):
+        self._garantir_tabela(p_tabela, [p_coluna_chave, p_coluna_natural])
+        lote = [r[0] for r in self.db.execute(
+            f'SELECT DISTINCT CAST("{p_coluna_natural}" AS TEXT) FROM "{p_tabela}" '
+            f'WHERE "{p_coluna_chave}" IS NULL AND "{p_coluna_natural}" IS NOT NULL '
+            f'AND (? IS NULL OR CAST("{p_coluna_natural}" AS TEXT) > ?) ORDER BY 1 LIMIT ?',
+            (p_apos, p_apos, p_limite),
+        )]
+        if not lote:
+            return [{'atualizadas': 0, 'ultima_chave': None}]
+        atualizadas = 0
+        for natural in lote:
+            ids = [r[0] for r in self.db.execute(
+                f'SELECT _rowid FROM "{p_tabela}" WHERE CAST("{p_coluna_natural}" AS TEXT) = ? AND "{p_coluna_chave}" IS NULL',
+                (natural,),
+            )]
+            for rowid in ids:
+                self.db.execute(f'UPDATE "{p_tabela}" SET "{p_coluna_chave}" = ? WHERE _rowid = ?', (str(uuid.uuid4()), rowid))
+            atualizadas += len(ids)
+        return [{'atualizadas': atualizadas, 'ultima_chave': lote[-1]}]
+
+    # Transporte httpx para o async_writer
+    def transport(self):
+        """Transporte httpx que atende as requisições REST do async_writer com estas tabelas."""
+        import httpx
+
+        async def atender(request):
+            if self.latencia:
+                await asyncio.sleep(self.latencia)
+            tabela = request.url.path.rstrip('/').rsplit('/', 1)[-1]
+            params = dict(request.url.params)
+            on_conflict = params.pop('on_conflict', None)
+            filtros = {coluna: unquote(valor)[3:] for coluna, valor in params.items() if valor.startswith('eq.')}
+            dados = json.loads(request.content) if request.content else None
+            query = self.table(tabela)
+            if request.method == 'PATCH':
+                query.update(dados)
+            elif 'resolution=' in request.headers.get('Prefer', ''):
+                query.upsert(dados, on_conflict=on_conflict,
+                             ignore_duplicates='ignore-duplicates' in request.headers['Prefer'])
+            else:
+                query.insert(dados)
+            for coluna, valor in filtros.items():
+                query.eq(coluna, valor)
+            for coluna, valor in params.items():
+                if valor == 'is.null':
+                    query.is_(coluna, 'null')
+            self._executar(query, esperar=False)
+            with self.lock:
+                perdida = self.respostas_perdidas > 0
+                self.respostas_perdidas -= perdida
+            if perdida:
+                return httpx.Response(503)
+            return httpx.Response(201 if request.method == 'POST' else 204)
+
+        return httpx.MockTransport(atender)
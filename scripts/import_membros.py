@@ -1,19 +1,23 @@
-import pandas as pd
-from supabase import create_client
 import os
-from dotenv import load_dotenv
+import csv
+import time
+import logging
 from datetime import datetime
 import sys
+from bubble_cache import BubbleIdCache
+from cliente_supabase import supabase
+from async_writer import CONCURRENCY, Operacao, escrever
+from lote_adaptativo import LoteAdaptativo, bloco_checkpoint, gravar_adaptativo
+from checkpoint import DiarioCheckpoint
+from pg_copy import carregar_via_copy
+from table_scan import escanear_tabela
+from metricas import Metricas, perfilar
+from csv_paralelo import ler_dataframe, processar_em_paralelo, reagrupar
 
-# Carrega as variáveis de ambiente do arquivo .env
-load_dotenv()
-
-# Configuração do cliente Supabase
-supabase_url = os.getenv('VITE_SUPABASE_URL')
-supabase_key = os.getenv('VITE_SUPABASE_ANON_KEY')
-supabase = create_client(supabase_url, supabase_key)
+cache = BubbleIdCache(supabase)
 
 def convert_date(date_str):
+    import pandas as pd
     if pd.isna(date_str):
         return None
     try:
@@ -23,6 +27,9 @@ def convert_date(date_str):
         return None
 
 def import_membros(csv_path):
+    import pandas as pd
+    metricas = Metricas('import_membros')
+    metricas.instrumentar_cliente(supabase)
     try:
         # Lê o arquivo CSV especificando o tipo da coluna id_bubble_membro como string
         df = pd.read_csv(csv_path, sep=';', dtype={'id_bubble_membro': str})
@@ -40,8 +47,7 @@ def import_membros(csv_path):
         
         # Contador para acompanhar o progresso
         total = len(membros)
-        success = 0
-        errors = 0
+        metricas.contar('lidas', total)
         
         print(f"Iniciando importação de {total} membros...")
         
@@ -56,58 +62,337 @@ def import_membros(csv_path):
                     membro['teste_gratis'] = bool(membro['teste_gratis'])
                 
                 # Insere no Supabase
-                result = supabase.table('membros').insert(membro).execute()
-                success += 1
-                print(f"Progresso: {success}/{total} registros processados", end='\r')
+                with metricas.fase('gravar'):
+                    result = supabase.table('membros').insert(membro).execute()
+                metricas.contar('gravadas')
                 
             except Exception as e:
-                errors += 1
-                print(f"\nErro ao inserir membro {membro.get('id_bubble_membro', 'unknown')}: {str(e)}")
+                metricas.falha(f"Erro ao inserir membro {membro.get('id_bubble_membro', 'unknown')}: {str(e)}")
         
         print(f"\nImportação concluída!")
         print(f"Total processado: {total}")
-        print(f"Sucessos: {success}")
-        print(f"Erros: {errors}")
+        print(f"Sucessos: {metricas.contadores['gravadas']}")
+        print(f"Erros: {metricas.contadores['falhas']}")
         
     except Exception as e:
-        print(f"Erro ao processar o arquivo CSV: {str(e)}")
+        metricas.erro(f"Erro ao processar o arquivo CSV: {str(e)}")
+    finally:
+        metricas.finalizar(f"{csv_path}.metricas.json")
+    return metricas.ok
+
+# Quantidade de linhas lidas do CSV (e enviadas em um único upsert) por vez
+CHUNK_SIZE = 1000
+# Motivo gravado nos rejeitados para as linhas substituídas por outra do mesmo membro no bloco
+ERRO_DUPLICADO = 'id_bubble_membro repetido no bloco (vale a última linha)'
+
+# Tabela de conversão de textos do Bubble para booleanos
+BOOLEANOS = {
+    'true': True, 'sim': True, 'yes': True, '1': True,
+    'false': False, 'não': False, 'nao': False, 'no': False, '0': False,
+}
+
+def converter_datas(serie):
+    """Converte uma coluna inteira de datas para ISO 8601 (inválidas viram None)."""
+    import pandas as pd
+    if int(pd.__version__.split('.')[0]) >= 2:
+        # A partir do pandas 2 o formato é inferido pela primeira linha; 'mixed' mantém o comportamento antigo
+        datas = pd.to_datetime(serie, errors='coerce', format='mixed')
+    else:
+        datas = pd.to_datetime(serie, errors='coerce')
+    return datas.dt.strftime('%Y-%m-%dT%H:%M:%S').where(datas.notna(), None)
+
+def converter_booleanos(serie, padrao=False):
+    """Converte uma coluna inteira de textos/booleanos para bool usando a tabela BOOLEANOS."""
+    return serie.astype(str).str.strip().str.lower().map(BOOLEANOS).fillna(padrao).astype(bool)
+
+def converter_chunk(df):
+    """Converte datas e booleanos de um bloco (a parte cara da preparação, linha a linha)."""
+    if 'data_expiracao' in df.columns:
+        df['data_expiracao'] = converter_datas(df['data_expiracao'])
+    if 'teste_gratis' in df.columns:
+        df['teste_gratis'] = converter_booleanos(df['teste_gratis'])
+    return df
+
+def _converter_faixa(dados, cabecalho):
+    """Tarefa do pool de processos: lê e converte uma faixa de bytes do CSV."""
+    return converter_chunk(ler_dataframe(dados, cabecalho, dtype={'id_bubble_membro': str}))
+
+def separar_chunk(df):
+    """Separa um bloco já convertido em (registros válidos, DataFrame de linhas rejeitadas).
+
+    Um id_bubble_membro repetido no bloco só é enviado uma vez (a última linha vence,
+    como nos upserts); as linhas anteriores vão para os rejeitados com ERRO_DUPLICADO.
+    """
+    import pandas as pd
+    if 'id_bubble_membro' in df.columns:
+        sem_id = df['id_bubble_membro'].isna()
+        duplicado = ~sem_id & df.duplicated('id_bubble_membro', keep='last')
+    else:
+        sem_id = pd.Series(True, index=df.index)
+        duplicado = ~sem_id
+    rejeitados = pd.concat([df[sem_id].assign(erro='id_bubble_membro ausente'),
+                            df[duplicado].assign(erro=ERRO_DUPLICADO)]).sort_index()
+    validos = df[~sem_id & ~duplicado]
+
+    # NaN vira None para o JSON enviado ao PostgREST
+    registros = validos.astype(object).where(validos.notna(), None).to_dict('records')
+    return registros, rejeitados
+
+def preparar_chunk(df):
+    """Normaliza um bloco do CSV de forma vetorizada.
+
+    Retorna (registros válidos prontos para envio, DataFrame de linhas rejeitadas).
+    """
+    return separar_chunk(converter_chunk(df))
+
+def _gravar_rejeitados(reject_path, df, escrever_cabecalho):
+    df.to_csv(reject_path, sep=';', index=False, mode='a', header=escrever_cabecalho, quoting=csv.QUOTE_MINIMAL)
+
+def import_membros_chunked(csv_path, chunk_size=CHUNK_SIZE, concorrencia=1, resume=False, processos=1):
+    """Importa membros em blocos: leitura com chunksize, conversão vetorizada e um upsert por bloco.
+
+    O tempo de cada bloco vai para `<csv>.import.log` e as linhas com erro para
+    `<csv>.rejeitados.csv`; a memória usada depende apenas do tamanho do bloco
+    (`chunk_size`, ou bloco_checkpoint(chunk_size) no envio sequencial, em que os
+    upserts começam em `chunk_size` linhas e crescem conforme o servidor responde).
+    Com `concorrencia` maior que 1, os upserts são enviados em paralelo pelo async_writer.
+    Cada bloco gravado é confirmado em `<csv>.checkpoint.jsonl`; com `resume=True` a
+    leitura começa no primeiro bloco não confirmado. Com `processos` maior que 1, a
+    leitura e a conversão rodam em um pool de processos e os blocos chegam em ordem.
+    """
+    import pandas as pd
+    base = os.path.splitext(csv_path)[0]
+    log_path = f"{base}.import.log"
+    reject_path = f"{base}.rejeitados.csv"
+    if os.path.exists(reject_path) and not resume:
+        os.remove(reject_path)
+    # No envio sequencial o bloco lido (a unidade do checkpoint) é maior que o lote, para o
+    # lote adaptativo poder crescer; com o async_writer cada bloco é um upsert
+    bloco = chunk_size if concorrencia > 1 else bloco_checkpoint(chunk_size)
+    checkpoint = DiarioCheckpoint(csv_path, bloco, resume)
+
+    logger = logging.getLogger('import_membros')
+    logger.setLevel(logging.INFO)
+    handler = logging.FileHandler(log_path, encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+    logger.addHandler(handler)
+
+    metricas = Metricas('import_membros')
+    metricas.instrumentar_cliente(supabase)
+    total = 0
+    success = 0
+    errors = 0
+    rejeitados_gravados = os.path.exists(reject_path)
+    inicio = time.perf_counter()
+
+    def confirmar(numero, linhas, registros):
+        inicio_linha = (numero - 1) * bloco
+        checkpoint.registrar(numero, inicio_linha, inicio_linha + linhas,
+                             [registro['id_bubble_membro'] for registro in registros])
+
+    # O lote enviado começa em chunk_size e pode crescer até o bloco lido
+    lote = LoteAdaptativo('membros', chunk_size, maximo=bloco)
+
+    def enviar(registros):
+        supabase.table('membros').upsert(registros, on_conflict='id_bubble_membro').execute()
+
+    try:
+        # Pula direto as linhas dos blocos já confirmados (a linha 0 é o cabeçalho)
+        pular = checkpoint.linhas_confirmadas
+        if pular:
+            logger.info(f"retomando a partir do bloco {checkpoint.primeiro_pendente} (linha {pular})")
+        if processos > 1:
+            # Blocos convertidos nos processos, refeitos com `bloco` linhas para manter a numeração
+            convertidos = processar_em_paralelo(csv_path, _converter_faixa, processos)
+            chunks = metricas.iterar('ler', reagrupar(
+                convertidos, bloco, concatenar=lambda partes: pd.concat(partes, ignore_index=True)))
+            primeiro = 1
+            preparar = separar_chunk
+        else:
+            chunks = metricas.iterar('ler', pd.read_csv(csv_path, sep=';', dtype={'id_bubble_membro': str},
+                                                       chunksize=bloco, skiprows=range(1, pular + 1)))
+            primeiro = checkpoint.primeiro_pendente
+            preparar = preparar_chunk
+
+        if concorrencia > 1:
+            def operacoes():
+                nonlocal total, errors, rejeitados_gravados
+                for numero, df in enumerate(chunks, start=primeiro):
+                    if checkpoint.concluido(numero):
+                        continue
+                    total += len(df)
+                    metricas.contar('lidas', len(df))
+                    with metricas.fase('preparar'):
+                        registros, rejeitados = preparar(df)
+                    if len(rejeitados):
+                        _gravar_rejeitados(reject_path, rejeitados, not rejeitados_gravados)
+                        rejeitados_gravados = True
+                        errors += len(rejeitados)
+                        metricas.contar('ignoradas', len(rejeitados))
+                    if registros:
+                        yield Operacao('membros', 'upsert', registros, on_conflict='id_bubble_membro',
+                                       contexto=(numero, len(df)))
+                    else:
+                        confirmar(numero, len(df), registros)
+
+            def ao_concluir(op, erro):
+                metricas.ao_concluir(op, erro)
+                if erro is None:
+                    confirmar(*op.contexto, op.dados)
+
+            resultado = escrever(operacoes(), concorrencia, ao_concluir=ao_concluir)
+            metricas.registrar_escrita(resultado)
+            for op, erro in resultado.falhas:
+                _gravar_rejeitados(reject_path, pd.DataFrame(op.dados).assign(erro=str(erro)), not rejeitados_gravados)
+                rejeitados_gravados = True
+                errors += len(op.dados)
+                logger.info(f"chunk={op.contexto[0]} falhou: {erro}")
+            success = total - errors
+            logger.info(resultado.resumo())
+            chunks = []
+
+        for numero, df in enumerate(chunks, start=primeiro):
+            if checkpoint.concluido(numero):
+                continue
+            inicio_chunk = time.perf_counter()
+            total += len(df)
+            metricas.contar('lidas', len(df))
+            with metricas.fase('preparar'):
+                registros, rejeitados = preparar(df)
+            metricas.contar('ignoradas', len(rejeitados))
+
+            enviados = 0
+            if not registros:
+                confirmar(numero, len(df), registros)
+            else:
+                # Upserts em lotes de tamanho adaptativo; um lote recusado é dividido até isolar as linhas ruins
+                with metricas.fase('gravar'):
+                    enviados, recusados = gravar_adaptativo(registros, enviar, lote)
+                metricas.contar('gravadas', enviados)
+                if recusados:
+                    metricas.contar('falhas', len(recusados), exemplo=str(recusados[0][1]))
+                    falhos = pd.DataFrame([registro for registro, _ in recusados])\
+                        .assign(erro=[str(erro) for _, erro in recusados])
+                    rejeitados = pd.concat([rejeitados, falhos], ignore_index=True)
+                else:
+                    confirmar(numero, len(df), registros)
+
+            if len(rejeitados):
+                _gravar_rejeitados(reject_path, rejeitados, not rejeitados_gravados)
+                rejeitados_gravados = True
+
+            success += enviados
+            errors += len(rejeitados)
+            logger.info(
+                f"chunk={numero} linhas={len(df)} enviados={enviados} "
+                f"rejeitados={len(rejeitados)} tempo={time.perf_counter() - inicio_chunk:.3f}s"
+            )
+
+        if lote.requisicoes:
+            metricas.registrar_lote(lote)
+            logger.info(f"lote estabilizado em {lote.tamanho} linhas ({lote.resumo()})")
+        duracao = time.perf_counter() - inicio
+        logger.info(f"total={total} sucessos={success} erros={errors} tempo={duracao:.3f}s")
+        print(f"Importação concluída em {duracao:.2f}s!")
+        print(f"Total processado: {total}")
+        print(f"Sucessos: {success}")
+        print(f"Erros: {errors}" + (f" (ver {reject_path})" if errors else ""))
+
+    except Exception as e:
+        metricas.erro(f"Erro ao processar o arquivo CSV: {str(e)}")
+    finally:
+        checkpoint.fechar()
+        logger.removeHandler(handler)
+        handler.close()
+        metricas.finalizar(f"{csv_path}.metricas.json")
+    return metricas.ok
+
+def import_membros_copy(csv_path, chunk_size=CHUNK_SIZE, conninfo=None):
+    """Carga inicial via Postgres COPY: mesma preparação por blocos, sem passar pela API REST."""
+    import pandas as pd
+    reject_path = f"{os.path.splitext(csv_path)[0]}.rejeitados.csv"
+    if os.path.exists(reject_path):
+        os.remove(reject_path)
+    rejeitados_total = 0
+    metricas = Metricas('import_membros')
+
+    def lotes():
+        nonlocal rejeitados_total
+        for df in pd.read_csv(csv_path, sep=';', dtype={'id_bubble_membro': str}, chunksize=chunk_size):
+            metricas.contar('lidas', len(df))
+            with metricas.fase('preparar'):
+                registros, rejeitados = preparar_chunk(df)
+            if len(rejeitados):
+                _gravar_rejeitados(reject_path, rejeitados, rejeitados_total == 0)
+                rejeitados_total += len(rejeitados)
+                metricas.contar('ignoradas', len(rejeitados))
+            yield registros
+
+    try:
+        with metricas.fase('gravar'):
+            copiadas, mescladas = carregar_via_copy('membros', lotes(), conninfo)
+        metricas.contar('gravadas', mescladas)
+        print(f"Importação concluída! Copiados: {copiadas} | Gravados: {mescladas} | Rejeitados: {rejeitados_total}")
+    except Exception as e:
+        metricas.erro(f"Erro ao importar via COPY: {str(e)}")
+    finally:
+        metricas.finalizar(f"{csv_path}.metricas.json")
+    return metricas.ok
 
 def update_modulos_curso_id():
+    metricas = Metricas('update_modulos')
+    metricas.instrumentar_cliente(supabase)
     try:
-        # Buscar todos os módulos
-        modulos_response = supabase.table('modulos').select('*').execute()
-        modulos = modulos_response.data
-
-        # Buscar todos os cursos
-        cursos_response = supabase.table('cursos').select('*').execute()
-        cursos = cursos_response.data
-
-        # Criar um dicionário de cursos com id_bubble_curso como chave
-        cursos_dict = {curso['id_bubble_curso']: curso['id_curso'] for curso in cursos}
-
-        # Atualizar cada módulo
-        for modulo in modulos:
-            if modulo['id_bubble_curso'] in cursos_dict:
-                curso_id = cursos_dict[modulo['id_bubble_curso']]
-                supabase.table('modulos').update({'id_curso': curso_id}).eq('id_bubble_modulo', modulo['id_bubble_modulo']).execute()
-                print(f"Módulo {modulo['id_bubble_modulo']} atualizado com curso_id {curso_id}")
+        # Carregar o mapeamento de cursos no cache local
+        with metricas.fase('resolver'):
+            cache.aquecer('cursos', 'id_bubble_curso', 'id_curso')
+
+        # Percorrer os módulos página a página e atualizar cada um
+        modulos = escanear_tabela(supabase, 'modulos', 'id_bubble_modulo, id_bubble_curso', prefetch=True)
+        for modulo in metricas.iterar('ler', modulos):
+            metricas.contar('lidas')
+            curso_id = cache.resolver('cursos', 'id_bubble_curso', 'id_curso', modulo['id_bubble_curso']) \
+                if modulo.get('id_bubble_curso') else None
+            if curso_id:
+                with metricas.fase('gravar'):
+                    supabase.table('modulos').update({'id_curso': curso_id}).eq('id_bubble_modulo', modulo['id_bubble_modulo']).execute()
+                metricas.contar('gravadas')
             else:
-                print(f"Aviso: Curso não encontrado para o módulo {modulo['id_bubble_modulo']} (id_bubble_curso: {modulo['id_bubble_curso']})")
+                metricas.contar('ignoradas', exemplo=f"Curso não encontrado para o módulo {modulo['id_bubble_modulo']} "
+                                                     f"(id_bubble_curso: {modulo['id_bubble_curso']})")
 
         print("Atualização concluída!")
     except Exception as e:
-        print(f"Erro ao atualizar módulos: {str(e)}")
+        metricas.erro(f"Erro ao atualizar módulos: {str(e)}")
+    finally:
+        metricas.finalizar()
+    return metricas.ok
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print('Uso: python import_membros.py "C:/Users/55849/Downloads/membros.csv"')
+    args = sys.argv[1:]
+    chunked = '--chunked' in args
+    concorrencia = CONCURRENCY if '--async' in args else 1
+    resume = '--resume' in args
+    pg_copy = '--pg-copy' in args
+    profile = '--profile' in args
+    processos = (os.cpu_count() or 1) if '--processos' in args else 1
+    args = [arg for arg in args if arg not in ('--chunked', '--async', '--resume', '--pg-copy', '--profile', '--processos')]
+    if len(args) != 1:
+        print('Uso: python import_membros.py [--chunked [--async] [--resume] [--processos] | --pg-copy] [--profile] "C:/Users/55849/Downloads/membros.csv"')
         print('Ou execute python import_membros.py update_modulos para atualizar os IDs dos cursos')
-    else:
-        if sys.argv[1] == "update_modulos":
-            update_modulos_curso_id()
+        sys.exit(1)
+    with perfilar(profile, 'import_membros'):
+        if args[0] == "update_modulos":
+            ok = update_modulos_curso_id()
         else:
-            csv_path = sys.argv[1]
+            csv_path = args[0]
             if not os.path.exists(csv_path):
                 print(f"Arquivo não encontrado: {csv_path}")
+                ok = False
+            elif pg_copy:
+                ok = import_membros_copy(csv_path)
+            elif chunked:
+                ok = import_membros_chunked(csv_path, concorrencia=concorrencia, resume=resume, processos=processos)
             else:
-                import_membros(csv_path)
+                ok = import_membros(csv_path)
+    sys.exit(0 if ok else 1)
@@ -1,12 +1,41 @@
 import csv
+import itertools
 import os
+import sys
 from datetime import datetime
-from supabase import create_client, Client
+from typing import TYPE_CHECKING
+from cliente_supabase import supabase
+from async_writer import CONCURRENCY, Operacao, escrever
+from lote_adaptativo import LoteAdaptativo, bloco_checkpoint, gravar_adaptativo
+from checkpoint import DiarioCheckpoint
+from pg_copy import carregar_via_copy
+from metricas import Metricas, perfilar
+from csv_paralelo import ler_dataframe, processar_em_paralelo, reagrupar
 
-# Configuração do Supabase (recomendo usar variáveis de ambiente para as chaves)
-url = "https://jhhjeilyrgydnmamklbf.supabase.co"
+if TYPE_CHECKING:
+    import pandas as pd
 
-supabase: Client = create_client(url, key)
+# Colunas do CSV copiadas sem transformação além do strip
+COLUNAS_TEXTO = [
+    'id_bubble_user', 'nome', 'first_name', 'last_name', 'end_cep', 'end_cidade',
+    'end_estado', 'end_logradouro', 'end_numero', 'foto', 'id_bubble_plano_atual',
+    'senha_provisoria',
+]
+# Colunas booleanas ('true' vira True, qualquer outro valor vira False)
+COLUNAS_BOOLEANAS = [
+    'assinatura_ativa', 'ativo', 'suporte', 'teste_gratis', 'whatsapp_validacao',
+]
+# Colunas das quais só os dígitos são mantidos
+COLUNAS_DIGITOS = ['cpf', 'telefone', 'whatsapp']
+# Tabela de conversão dos booleanos
+BOOLEANOS = {'true': True}
+# Quantidade de usuários por insert em lote
+BATCH_SIZE = 500
+# Restrição única de users usada nos upserts (email é UNIQUE NOT NULL)
+CONFLITO_USERS = 'email'
+# Colunas que normalizar_usuarios preenche com um padrão fixo: valem só na inserção, um
+# update com elas sobrescreveria o que foi definido no Supabase (ex.: professor vira aluno)
+COLUNAS_SO_INSERCAO = ['tipo']
 
 def parse_date(date_str: str) -> str:
     """Converte string de data para formato ISO."""
@@ -35,8 +64,242 @@ def clean_key(key: str) -> str:
     """Remove espaços extras das chaves."""
     return key.strip()
 
+def montar_usuario(clean_row: dict) -> dict:
+    """Monta o registro de um usuário a partir de uma linha já limpa do CSV."""
+    return {
+        'id_bubble_user': clean_row.get('id_bubble_user'),
+        'nome': clean_row.get('nome'),
+        'first_name': clean_row.get('first_name'),
+        'last_name': clean_row.get('last_name'),
+        'email': clean_row.get('email', '').lower(),
+        'assinatura_ativa': clean_row.get('assinatura_ativa', '').lower() == 'true',
+        'ativo': clean_row.get('ativo', '').lower() == 'true',
+        'cpf': clean_cpf(clean_row.get('cpf')),
+        'dt_expiracao': parse_date(clean_row.get('dt_expiracao')),
+        'end_cep': clean_row.get('end_cep'),
+        'end_cidade': clean_row.get('end_cidade'),
+        'end_estado': clean_row.get('end_estado'),
+        'end_logradouro': clean_row.get('end_logradouro'),
+        'end_numero': clean_row.get('end_numero'),
+        'foto': clean_row.get('foto'),
+        'id_bubble_plano_atual': clean_row.get('id_bubble_plano_atual'),
+        'senha_provisoria': clean_row.get('senha_provisoria'),
+        'suporte': clean_row.get('suporte', '').lower() == 'true',
+        'telefone': clean_phone(clean_row.get('telefone')),
+        'teste_gratis': clean_row.get('teste_gratis', '').lower() == 'true',
+        'tipo': 'aluno',  # valor padrão
+        'whatsapp': clean_phone(clean_row.get('whatsapp')),
+        'whatsapp_validacao': clean_row.get('whatsapp_validacao', '').lower() == 'true'
+    }
+
+def ler_csv_usuarios(csv_path: str, tamanho_bloco: int = None, pular_linhas: int = 0):
+    """Lê o CSV como texto puro (vazios continuam ''), opcionalmente em blocos."""
+    import pandas as pd
+    return pd.read_csv(
+        csv_path, sep=';', dtype=str, keep_default_na=False, na_filter=False,
+        encoding='utf-8', chunksize=tamanho_bloco, skiprows=range(1, pular_linhas + 1),
+    )
+
+def normalizar_usuarios(df: 'pd.DataFrame') -> 'pd.DataFrame':
+    """Normaliza um DataFrame de usuários coluna a coluna (equivalente a `montar_usuario`)."""
+    import pandas as pd
+    df = df.rename(columns=clean_key)
+    vazio = pd.Series('', index=df.index)
+    coluna = lambda nome: df[nome].str.strip() if nome in df.columns else vazio
+    saida = pd.DataFrame(index=df.index)
+
+    for nome in COLUNAS_TEXTO:
+        saida[nome] = coluna(nome) if nome in df.columns else None
+
+    saida['email'] = coluna('email').str.lower()
+
+    for nome in COLUNAS_BOOLEANAS:
+        saida[nome] = coluna(nome).str.lower().map(BOOLEANOS).fillna(False).astype(bool)
+
+    for nome in COLUNAS_DIGITOS:
+        bruto = coluna(nome)
+        digitos = bruto.str.replace(r'\D', '', regex=True)
+        # Vazio vira None, como em clean_cpf/clean_phone
+        saida[nome] = digitos.where(bruto != '', None)
+
+    datas = pd.to_datetime(coluna('dt_expiracao'), format='%Y-%m-%d', errors='coerce')
+    saida['dt_expiracao'] = datas.dt.strftime('%Y-%m-%dT%H:%M:%S').where(datas.notna(), None)
+
+    saida['tipo'] = 'aluno'  # valor padrão
+    return saida
+
+def para_registros(df: 'pd.DataFrame') -> list:
+    """Converte o DataFrame normalizado em dicts para o JSON (NaN vira None)."""
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+def separar_usuarios(lote: list) -> tuple:
+    """Separa um lote normalizado em (registros para o upsert por email, linhas sem email, linhas repetidas).
+
+    Sem email a linha não tem chave no upsert (e os '' colidiriam entre si). Um email
+    repetido no lote só vai uma vez, pela última linha: o merge não pode atualizar a
+    mesma linha duas vezes no mesmo comando. Os registros saem sem COLUNAS_SO_INSERCAO,
+    então um usuário novo recebe o padrão da tabela e um existente mantém o do Supabase.
+    """
+    usuarios, sem_email, repetidos = {}, [], []
+    for usuario in reversed(lote):
+        if not usuario.get('email'):
+            sem_email.append(usuario)
+        elif usuario['email'] in usuarios:
+            repetidos.append(usuario)
+        else:
+            usuarios[usuario['email']] = {k: v for k, v in usuario.items() if k not in COLUNAS_SO_INSERCAO}
+    return list(reversed(usuarios.values())), sem_email[::-1], repetidos[::-1]
+
+def _contar_descartados(metricas: 'Metricas', sem_email: list, repetidos: list):
+    """Conta as linhas que separar_usuarios deixou fora do envio."""
+    if sem_email:
+        ids = ', '.join(usuario.get('id_bubble_user') or '?' for usuario in sem_email[:5])
+        metricas.falha(f"{len(sem_email)} usuários sem email não importados (ex.: {ids})", len(sem_email))
+    # Repetidas não são falha: o usuário foi gravado pela última linha dele
+    metricas.contar('ignoradas', len(repetidos))
+
+def _normalizar_faixa(dados: bytes, cabecalho: list) -> list:
+    """Tarefa do pool de processos: lê e normaliza uma faixa de bytes do CSV."""
+    df = ler_dataframe(dados, cabecalho, dtype=str, keep_default_na=False, na_filter=False)
+    return para_registros(normalizar_usuarios(df))
+
+def lotes_usuarios(csv_path: str, batch_size: int = BATCH_SIZE, pular_linhas: int = 0, processos: int = 1):
+    """Gera lotes de registros prontos para insert em massa, com memória limitada a um bloco.
+
+    Com `processos` maior que 1 o CSV é lido e normalizado por um pool de processos e
+    os lotes saem na mesma ordem e com os mesmos tamanhos da leitura sequencial.
+    """
+    if processos > 1:
+        # pular_linhas vem do checkpoint e cobre lotes inteiros (só o último pode ser parcial)
+        lotes = reagrupar(processar_em_paralelo(csv_path, _normalizar_faixa, processos), batch_size)
+        yield from itertools.islice(lotes, -(-pular_linhas // batch_size), None)
+        return
+    for bloco in ler_csv_usuarios(csv_path, tamanho_bloco=batch_size, pular_linhas=pular_linhas):
+        yield para_registros(normalizar_usuarios(bloco))
+
+def import_users_bulk(csv_path: str, batch_size: int = BATCH_SIZE, concorrencia: int = 1, resume: bool = False,
+                      processos: int = 1):
+    """Importa usuários normalizando o CSV por colunas e inserindo em lotes.
+
+    Com `concorrencia` maior que 1, os lotes são enviados em paralelo pelo async_writer.
+    Com `processos` maior que 1, a leitura e a normalização usam um pool de processos.
+    Cada lote gravado é confirmado em `<csv>.checkpoint.jsonl`; com `resume=True` a
+    importação continua do primeiro lote não confirmado. No envio sequencial o bloco
+    confirmado tem bloco_checkpoint(batch_size) linhas e os upserts dentro dele começam
+    em `batch_size` e crescem conforme o servidor responde. Os usuários vão em upsert por
+    email com merge, sem as colunas de COLUNAS_SO_INSERCAO (ver separar_usuarios).
+    """
+    metricas = Metricas('import_users')
+    metricas.instrumentar_cliente(supabase)
+    checkpoint = None
+    try:
+        if not os.path.exists(csv_path):
+            raise FileNotFoundError(csv_path)
+        # No envio sequencial o bloco do checkpoint é maior que o lote, para o lote adaptativo poder crescer
+        tamanho_bloco = batch_size if concorrencia > 1 else bloco_checkpoint(batch_size)
+        checkpoint = DiarioCheckpoint(csv_path, tamanho_bloco, resume)
+        primeiro = checkpoint.primeiro_pendente
+        lotes = enumerate(metricas.iterar('ler', lotes_usuarios(csv_path, tamanho_bloco, checkpoint.linhas_confirmadas, processos)),
+                          start=primeiro)
+        if primeiro > 1:
+            print(f"Retomando a partir do lote {primeiro}")
+
+        def confirmar(numero, lote):
+            inicio = (numero - 1) * tamanho_bloco
+            checkpoint.registrar(numero, inicio, inicio + len(lote), [usuario['id_bubble_user'] for usuario in lote])
+
+        if concorrencia > 1:
+            # Lotes do CSV ainda em envio, pelo número: o checkpoint registra as linhas lidas, não só as enviadas
+            em_envio = {}
+
+            def operacoes():
+                for numero, lote in lotes:
+                    if checkpoint.concluido(numero):
+                        continue
+                    metricas.contar('lidas', len(lote))
+                    usuarios, sem_email, repetidos = separar_usuarios(lote)
+                    _contar_descartados(metricas, sem_email, repetidos)
+                    if not usuarios:
+                        confirmar(numero, lote)
+                        continue
+                    em_envio[numero] = lote
+                    yield Operacao('users', 'upsert', usuarios, on_conflict=CONFLITO_USERS, contexto=numero)
+
+            def ao_concluir(op, erro):
+                metricas.ao_concluir(op, erro)
+                lote = em_envio.pop(op.contexto)
+                if erro is None:
+                    confirmar(op.contexto, lote)
+
+            resultado = escrever(operacoes(), concorrencia, ao_concluir=ao_concluir)
+            metricas.registrar_escrita(resultado)
+            for op, erro in resultado.falhas:
+                print(f"Erro ao importar lote de {len(op.dados)} usuários: {erro}")
+            print(f"\nImportação concluída! {resultado.resumo()}")
+            return metricas.ok
+
+        # Lotes de tamanho adaptativo (de batch_size até o bloco); um lote recusado é dividido até
+        # isolar as linhas ruins. Upsert com merge no email (UNIQUE): reenviar um lote que deu
+        # timeout mas foi gravado não duplica nem gera 409, e um usuário existente é atualizado
+        controle = LoteAdaptativo('users', batch_size, maximo=tamanho_bloco)
+
+        def enviar(usuarios):
+            supabase.table('users').upsert(usuarios, on_conflict=CONFLITO_USERS).execute()
+
+        for numero, lote in lotes:
+            if checkpoint.concluido(numero):
+                continue
+            metricas.contar('lidas', len(lote))
+            usuarios, sem_email, repetidos = separar_usuarios(lote)
+            _contar_descartados(metricas, sem_email, repetidos)
+            with metricas.fase('gravar'):
+                gravadas, recusados = gravar_adaptativo(usuarios, enviar, controle)
+            metricas.contar('gravadas', gravadas)
+            for usuario, e in recusados:
+                metricas.falha(f"Erro ao importar usuário {usuario.get('email') or usuario.get('id_bubble_user')}: {e}")
+            if not recusados:
+                confirmar(numero, lote)
+        if controle.requisicoes:
+            metricas.registrar_lote(controle)
+        print(f"\nImportação concluída! Sucessos: {metricas.contadores['gravadas']} | Erros: {metricas.contadores['falhas']}")
+    except FileNotFoundError:
+        metricas.erro(f"Arquivo não encontrado: {csv_path}")
+    except Exception as e:
+        metricas.erro(f"Erro inesperado ao abrir o arquivo: {e}")
+    finally:
+        if checkpoint:
+            checkpoint.fechar()
+        metricas.finalizar(f"{csv_path}.metricas.json")
+    return metricas.ok
+
+def import_users_copy(csv_path: str, batch_size: int = BATCH_SIZE, conninfo: str = None):
+    """Carga inicial via Postgres COPY, usando a mesma normalização colunar e o mesmo merge do modo --bulk."""
+    metricas = Metricas('import_users')
+
+    def lotes():
+        for lote in metricas.iterar('ler', lotes_usuarios(csv_path, batch_size)):
+            metricas.contar('lidas', len(lote))
+            usuarios, sem_email, repetidos = separar_usuarios(lote)
+            _contar_descartados(metricas, sem_email, repetidos)
+            yield usuarios
+
+    try:
+        with metricas.fase('gravar'):
+            copiados, mesclados = carregar_via_copy('users', lotes(), conninfo)
+        metricas.contar('gravadas', mesclados)
+        print(f"Importação concluída! Copiados: {copiados} | Gravados: {mesclados}")
+    except FileNotFoundError:
+        metricas.erro(f"Arquivo não encontrado: {csv_path}")
+    except Exception as e:
+        metricas.erro(f"Erro ao importar via COPY: {e}")
+    finally:
+        metricas.finalizar(f"{csv_path}.metricas.json")
+    return metricas.ok
+
 def import_users(csv_path: str):
     """Importa usuários do CSV para o Supabase."""
+    metricas = Metricas('import_users')
+    metricas.instrumentar_cliente(supabase)
     try:
         with open(csv_path, 'r', encoding='utf-8') as file:
             reader = csv.DictReader(file, delimiter=';')
@@ -44,49 +307,45 @@ def import_users(csv_path: str):
             if reader.fieldnames:
                 reader.fieldnames = [clean_key(key) for key in reader.fieldnames]
             
-            for row in reader:
+            for row in metricas.iterar('ler', reader):
+                metricas.contar('lidas')
                 # Limpa os valores
                 clean_row = {k: v.strip() if v else v for k, v in row.items()}
                 
-                user_data = {
-                    'id_bubble_user': clean_row.get('id_bubble_user'),
-                    'nome': clean_row.get('nome'),
-                    'first_name': clean_row.get('first_name'),
-                    'last_name': clean_row.get('last_name'),
-                    'email': clean_row.get('email', '').lower(),
-                    'assinatura_ativa': clean_row.get('assinatura_ativa', '').lower() == 'true',
-                    'ativo': clean_row.get('ativo', '').lower() == 'true',
-                    'cpf': clean_cpf(clean_row.get('cpf')),
-                    'dt_expiracao': parse_date(clean_row.get('dt_expiracao')),
-                    'end_cep': clean_row.get('end_cep'),
-                    'end_cidade': clean_row.get('end_cidade'),
-                    'end_estado': clean_row.get('end_estado'),
-                    'end_logradouro': clean_row.get('end_logradouro'),
-                    'end_numero': clean_row.get('end_numero'),
-                    'foto': clean_row.get('foto'),
-                    'id_bubble_plano_atual': clean_row.get('id_bubble_plano_atual'),
-                    'senha_provisoria': clean_row.get('senha_provisoria'),
-                    'suporte': clean_row.get('suporte', '').lower() == 'true',
-                    'telefone': clean_phone(clean_row.get('telefone')),
-                    'teste_gratis': clean_row.get('teste_gratis', '').lower() == 'true',
-                    'tipo': 'aluno',  # valor padrão
-                    'whatsapp': clean_phone(clean_row.get('whatsapp')),
-                    'whatsapp_validacao': clean_row.get('whatsapp_validacao', '').lower() == 'true'
-                }
+                user_data = montar_usuario(clean_row)
                 
                 try:
-                    data, error = supabase.table('users').insert(user_data).execute()
-                    if error:
-                        print(f"Erro ao importar usuário {clean_row.get('email', 'desconhecido')}: {error}")
-                    else:
-                        print(f"Usuário {clean_row.get('email', 'desconhecido')} importado com sucesso!")
+                    # Erros da API chegam como exceção (APIError) no postgrest-py
+                    with metricas.fase('gravar'):
+                        supabase.table('users').insert(user_data).execute()
+                    metricas.contar('gravadas')
                 except Exception as e:
-                    print(f"Erro inesperado ao importar usuário {clean_row.get('email', 'desconhecido')}: {e}")
+                    metricas.falha(f"Erro inesperado ao importar usuário {clean_row.get('email', 'desconhecido')}: {e}")
     except FileNotFoundError:
-        print(f"Arquivo não encontrado: {csv_path}")
+        metricas.erro(f"Arquivo não encontrado: {csv_path}")
     except Exception as e:
-        print(f"Erro inesperado ao abrir o arquivo: {e}")
+        metricas.erro(f"Erro inesperado ao abrir o arquivo: {e}")
+    finally:
+        metricas.finalizar(f"{csv_path}.metricas.json")
+    return metricas.ok
 
 if __name__ == "__main__":
     csv_path = r"C:\Users\55849\Downloads\importar.csv"  # Corrigido para usar string raw
-    import_users(csv_path)
+    args = sys.argv[1:]
+    bulk = '--bulk' in args
+    concorrencia = CONCURRENCY if '--async' in args else 1
+    resume = '--resume' in args
+    pg_copy = '--pg-copy' in args
+    profile = '--profile' in args
+    processos = (os.cpu_count() or 1) if '--processos' in args else 1
+    args = [arg for arg in args if arg not in ('--bulk', '--async', '--resume', '--pg-copy', '--profile', '--processos')]
+    if args:
+        csv_path = args[0]
+    with perfilar(profile, 'import_users'):
+        if pg_copy:
+            ok = import_users_copy(csv_path)
+        elif bulk:
+            ok = import_users_bulk(csv_path, concorrencia=concorrencia, resume=resume, processos=processos)
+        else:
+            ok = import_users(csv_path)
+    sys.exit(0 if ok else 1)
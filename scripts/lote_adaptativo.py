@@ -0,0 +1,147 @@
+import random
+import time
+
+import httpx
+
+from async_writer import BACKOFF_BASE, BACKOFF_MAX
+
+# Maior lote que o controle chega a usar (linhas)
+LOTE_MAXIMO = 5000
+# Linhas acrescentadas ao lote depois de cada gravação rápida (aumento aditivo)
+INCREMENTO_LOTE = 100
+# Fator aplicado ao lote quando o servidor dá sinal de sobrecarga (redução multiplicativa)
+FATOR_REDUCAO = 0.5
+# Lotes gravados acima desta latência (segundos) não fazem o tamanho crescer
+LATENCIA_ALVO = 2.0
+# Status HTTP de sobrecarga: payload grande demais, limite de taxa e erros do servidor/gateway
+STATUS_SOBRECARGA = {413, 429} | set(range(500, 600))
+# Códigos do Postgres/PostgREST de sobrecarga: statement timeout, conexões esgotadas, pool sem conexão livre
+CODIGOS_SOBRECARGA = {'57014', '53300', '53400', 'PGRST003'}
+# Códigos de erro que nenhuma linha isolada resolve: sem restrição para o on_conflict,
+# coluna ou tabela inexistente (e as versões do PostgREST do schema cache); propagam na hora
+CODIGOS_ESTRUTURAIS = {'42P10', '42703', '42P01', 'PGRST204', 'PGRST205'}
+# Sobrecargas seguidas (sem nenhuma gravação aceita no meio) antes de desistir da escrita
+MAX_SOBRECARGAS = 10
+
+def _status(erro):
+    """Status HTTP do erro: ErroPostgrest (async_writer) ou APIError sem JSON (postgrest-py põe o status em `code`)."""
+    for atributo in ('status', 'code'):
+        valor = getattr(erro, atributo, None)
+        if isinstance(valor, int) or (isinstance(valor, str) and len(valor) == 3 and valor.isdigit()):
+            return int(valor)
+    return None
+
+def sobrecarga(erro):
+    """True se o erro indica que o lote (ou o ritmo) é demais para o servidor, e não uma linha inválida."""
+    if isinstance(erro, httpx.TransportError):
+        return True
+    return _status(erro) in STATUS_SOBRECARGA or str(getattr(erro, 'code', '')) in CODIGOS_SOBRECARGA
+
+def bloco_checkpoint(lote, maximo=LOTE_MAXIMO):
+    """Linhas por bloco do checkpoint quando os envios dentro do bloco são adaptativos.
+
+    O bloco confirmado é maior que o lote inicial, para que o lote tenha espaço para
+    crescer até `maximo`; o tamanho do envio é decidido pelo LoteAdaptativo.
+    """
+    return max(lote, maximo)
+
+class LoteAdaptativo:
+    """Tamanho de lote das escritas em uma tabela, ajustado por AIMD a partir do que o servidor responde.
+
+    O lote cresce INCREMENTO_LOTE linhas a cada gravação abaixo de LATENCIA_ALVO e é
+    multiplicado por FATOR_REDUCAO em timeouts, 413 e 5xx. Gravações lentas mas aceitas
+    mantêm o tamanho, e erros de dados (uma linha inválida) não mexem nele: quem isola
+    essas linhas é `gravar_adaptativo`, dividindo o lote.
+
+    `maximo` acima do lote inicial é o que deixa o tamanho crescer: nos caminhos com
+    checkpoint o bloco confirmado deve ter pelo menos `maximo` linhas (`bloco_checkpoint`).
+    """
+
+    def __init__(self, tabela, inicial, maximo=LOTE_MAXIMO, incremento=INCREMENTO_LOTE,
+                 latencia_alvo=LATENCIA_ALVO):
+        self.tabela = tabela
+        self.maximo = max(1, maximo)
+        self.tamanho = max(1, min(inicial, self.maximo))
+        self.inicial = self.tamanho
+        self.incremento = incremento
+        self.latencia_alvo = latencia_alvo
+        self.menor = self.maior = self.tamanho
+        self.requisicoes = 0
+        self.aumentos = 0
+        self.reducoes = 0
+
+    def registrar(self, linhas, duracao, erro=None):
+        """Ajusta o tamanho depois de uma escrita de `linhas` linhas que levou `duracao` segundos."""
+        self.requisicoes += 1
+        if erro is not None:
+            if sobrecarga(erro):
+                # Reduz a partir do lote que falhou (pode ser menor que o tamanho atual)
+                self.tamanho = max(1, int(min(self.tamanho, linhas) * FATOR_REDUCAO))
+                self.reducoes += 1
+        elif duracao <= self.latencia_alvo and linhas >= self.tamanho and self.tamanho < self.maximo:
+            self.tamanho = min(self.maximo, self.tamanho + self.incremento)
+            self.aumentos += 1
+        self.menor = min(self.menor, self.tamanho)
+        self.maior = max(self.maior, self.tamanho)
+
+    def resumo(self):
+        return {
+            'lote_final': self.tamanho,
+            'lote_inicial': self.inicial,
+            'menor': self.menor,
+            'maior': self.maior,
+            'aumentos': self.aumentos,
+            'reducoes': self.reducoes,
+            'requisicoes': self.requisicoes,
+        }
+
+def _espera(tentativa):
+    """Backoff exponencial com jitter completo, nas mesmas bases do async_writer."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** tentativa))
+
+def gravar_adaptativo(registros, enviar, controle, max_sobrecargas=MAX_SOBRECARGAS):
+    """Envia `registros` com `enviar(lote)` em lotes do tamanho atual de `controle`.
+
+    Em sobrecarga (timeout, 413, 429, 5xx) o lote não é culpado: o controle reduz o
+    tamanho, a escrita espera com backoff e as mesmas linhas são reenviadas (cortadas
+    no tamanho novo). Depois de `max_sobrecargas` seguidas o último erro é propagado,
+    sem recusar nenhuma linha. Erros de estrutura (CODIGOS_ESTRUTURAIS) propagam na
+    hora. Só um erro de dados divide o lote ao meio, até isolar
+    as linhas que o servidor recusa. Como um lote que deu timeout pode ter sido
+    gravado, `enviar` deve ser idempotente (upsert). `enviar` pode devolver quantas
+    linhas gravou (senão conta o lote).
+    Devolve (linhas gravadas, [(registro, erro), ...] das linhas recusadas), na ordem.
+    """
+    gravadas, recusados = 0, []
+    sobrecargas = 0
+    pendentes = [registros]  # pilha: o fim é enviado primeiro, então a ordem se mantém
+    while pendentes:
+        lote = pendentes.pop()
+        if not len(lote):
+            continue
+        if len(lote) > controle.tamanho:
+            pendentes.append(lote[controle.tamanho:])
+            lote = lote[:controle.tamanho]
+        inicio = time.perf_counter()
+        try:
+            enviadas = enviar(lote)
+        except Exception as e:
+            controle.registrar(len(lote), time.perf_counter() - inicio, e)
+            if str(getattr(e, 'code', '')) in CODIGOS_ESTRUTURAIS:
+                raise
+            if sobrecarga(e):
+                if sobrecargas >= max_sobrecargas:
+                    raise
+                time.sleep(_espera(sobrecargas))
+                sobrecargas += 1
+                pendentes.append(lote)
+            elif len(lote) == 1:
+                recusados.append((lote[0], e))
+            else:
+                meio = len(lote) // 2
+                pendentes += [lote[meio:], lote[:meio]]
+            continue
+        sobrecargas = 0
+        controle.registrar(len(lote), time.perf_counter() - inicio)
+        gravadas += len(lote) if enviadas is None else enviadas
+    return gravadas, recusados
@@ -0,0 +1,247 @@
+import bisect
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+# Limites superiores (ms) das faixas do histograma de latência HTTP
+FAIXAS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+# Segundos mínimos entre duas linhas de progresso
+INTERVALO_PROGRESSO = 2.0
+# Mensagens de exemplo guardadas por contador no resumo
+MAX_EXEMPLOS = 20
+
+class Histograma:
+    """Histograma de latências em faixas fixas (memória constante, qualquer volume)."""
+
+    def __init__(self):
+        self.contagens = [0] * (len(FAIXAS_MS) + 1)
+        self.total = 0
+        self.soma = 0.0
+        self.maximo = 0.0
+
+    def registrar(self, segundos):
+        ms = segundos * 1000
+        self.contagens[bisect.bisect_left(FAIXAS_MS, ms)] += 1
+        self.total += 1
+        self.soma += ms
+        self.maximo = max(self.maximo, ms)
+
+    def percentil(self, p):
+        """Limite superior da faixa que contém o percentil `p` (ms)."""
+        if not self.total:
+            return 0.0
+        alvo = p / 100 * self.total
+        acumulado = 0
+        for indice, contagem in enumerate(self.contagens):
+            acumulado += contagem
+            if acumulado >= alvo:
+                return float(FAIXAS_MS[indice]) if indice < len(FAIXAS_MS) else self.maximo
+        return self.maximo
+
+    def resumo(self):
+        rotulos = [f"<={limite}ms" for limite in FAIXAS_MS] + [f">{FAIXAS_MS[-1]}ms"]
+        return {
+            'requisicoes': self.total,
+            'media_ms': round(self.soma / self.total, 2) if self.total else 0.0,
+            'max_ms': round(self.maximo, 2),
+            'p50_ms': self.percentil(50),
+            'p90_ms': self.percentil(90),
+            'p99_ms': self.percentil(99),
+            'faixas': {rotulo: n for rotulo, n in zip(rotulos, self.contagens) if n},
+        }
+
+class Metricas:
+    """Contadores, tempo por fase, latência HTTP e progresso de uma execução de script.
+
+    Substitui o print por linha: `contar('gravadas')` no caminho quente, uma linha de
+    progresso no máximo a cada `intervalo` segundos (em stderr) e um resumo JSON no
+    final com `finalizar()`. Os contadores usuais são lidas, resolvidas, gravadas,
+    ignoradas e falhas; `exemplo` guarda algumas mensagens para diagnóstico.
+    """
+
+    def __init__(self, nome, intervalo=INTERVALO_PROGRESSO, saida=sys.stderr):
+        self.nome = nome
+        self.intervalo = intervalo
+        self.saida = saida
+        self.contadores = Counter()
+        self.exemplos = defaultdict(list)
+        self.fases = Counter()
+        self.http = defaultdict(Histograma)
+        self.inicio = time.perf_counter()
+        self.ultimo_progresso = self.inicio
+        self.lock = threading.Lock()
+        self.hooks = []
+        self.lotes = {}
+
+    # Contadores
+    def contar(self, chave, n=1, exemplo=None):
+        with self.lock:
+            self.contadores[chave] += n
+            if exemplo is not None and len(self.exemplos[chave]) < MAX_EXEMPLOS:
+                self.exemplos[chave].append(exemplo)
+        self.progresso()
+
+    def falha(self, mensagem, n=1):
+        """Conta uma falha e mostra a mensagem (falhas continuam visíveis no terminal)."""
+        self.contar('falhas', n, exemplo=mensagem)
+        print(mensagem, file=self.saida)
+
+    def erro(self, mensagem):
+        """Registra um erro que interrompeu a execução (o `except` geral dos scripts) e mostra a mensagem."""
+        self.contar('erros', exemplo=mensagem)
+        print(mensagem, file=self.saida)
+
+    @property
+    def ok(self):
+        """False se a execução foi interrompida por um erro ou se alguma escrita falhou."""
+        return not self.contadores['erros'] and not self.contadores['falhas']
+
+    # Tempo por fase
+    @contextlib.contextmanager
+    def fase(self, nome):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            duracao = time.perf_counter() - inicio
+            with self.lock:
+                self.fases[nome] += duracao
+
+    def iterar(self, fase, iteravel):
+        """Percorre `iteravel` somando o tempo gasto em cada `next()` na fase `fase`."""
+        iterador = iter(iteravel)
+        while True:
+            inicio = time.perf_counter()
+            try:
+                item = next(iterador)
+            except StopIteration:
+                return
+            finally:
+                duracao = time.perf_counter() - inicio
+                with self.lock:
+                    self.fases[fase] += duracao
+            yield item
+
+    # Latência HTTP
+    def registrar_http(self, operacao, segundos):
+        with self.lock:
+            self.http[operacao].registrar(segundos)
+
+    def registrar_escrita(self, resultado, operacao='escrita async'):
+        """Incorpora as latências de um ResultadoEscrita do async_writer no histograma."""
+        with self.lock:
+            for latencia in resultado.latencias:
+                self.http[operacao].registrar(latencia)
+
+    def ao_concluir(self, op, erro, linhas=None):
+        """Callback `ao_concluir` do async_writer: conta a operação como gravada ou falha."""
+        n = linhas if linhas is not None else (len(op.dados) if isinstance(op.dados, list) else 1)
+        if erro is None:
+            self.contar('gravadas', n)
+        else:
+            self.contar('falhas', n, exemplo=str(erro))
+
+    def registrar_lote(self, controle):
+        """Guarda no resumo (e mostra) o tamanho de lote em que um lote_adaptativo.LoteAdaptativo estabilizou."""
+        resumo = controle.resumo()
+        with self.lock:
+            self.lotes[controle.tabela] = resumo
+        print(f"[{self.nome}] {controle.tabela}: lote estabilizado em {resumo['lote_final']} linhas "
+              f"(inicial {resumo['lote_inicial']}, faixa {resumo['menor']}-{resumo['maior']}, "
+              f"{resumo['reducoes']} reduções, {resumo['requisicoes']} requisições)", file=self.saida)
+
+    def instrumentar_cliente(self, supabase):
+        """Mede cada requisição do cliente supabase-py (hooks da sessão httpx do PostgREST)."""
+        sessao = getattr(getattr(supabase, 'postgrest', None), 'session', None)
+        if sessao is None or not hasattr(sessao, 'event_hooks'):
+            return supabase
+
+        def ao_enviar(request):
+            request.extensions['metricas_inicio'] = time.perf_counter()
+
+        def ao_receber(response):
+            inicio = response.request.extensions.get('metricas_inicio')
+            if inicio is not None:
+                tabela = response.request.url.path.rstrip('/').rsplit('/', 1)[-1]
+                self.registrar_http(f"{response.request.method} {tabela}", time.perf_counter() - inicio)
+
+        sessao.event_hooks['request'].append(ao_enviar)
+        sessao.event_hooks['response'].append(ao_receber)
+        self.hooks.append((sessao, ao_enviar, ao_receber))
+        return supabase
+
+    def _remover_hooks(self):
+        for sessao, ao_enviar, ao_receber in self.hooks:
+            sessao.event_hooks['request'].remove(ao_enviar)
+            sessao.event_hooks['response'].remove(ao_receber)
+        self.hooks = []
+
+    # Saída
+    def progresso(self, forcar=False):
+        agora = time.perf_counter()
+        if not forcar and agora - self.ultimo_progresso < self.intervalo:
+            return
+        self.ultimo_progresso = agora
+        decorrido = agora - self.inicio
+        with self.lock:
+            contadores = " ".join(f"{chave}={valor}" for chave, valor in sorted(self.contadores.items()))
+            lidas = self.contadores.get('lidas', 0)
+        taxa = f" {lidas / decorrido:.0f} linhas/s" if lidas and decorrido else ""
+        print(f"[{self.nome}] {decorrido:7.1f}s {contadores}{taxa}", file=self.saida, flush=True)
+
+    def resumo(self):
+        duracao = time.perf_counter() - self.inicio
+        with self.lock:
+            return {
+                'script': self.nome,
+                'duracao_s': round(duracao, 3),
+                'contadores': dict(self.contadores),
+                'fases_s': {fase: round(segundos, 3) for fase, segundos in self.fases.items()},
+                'http': {operacao: hist.resumo() for operacao, hist in sorted(self.http.items())},
+                'lotes': dict(self.lotes),
+                'exemplos': dict(self.exemplos),
+            }
+
+    def finalizar(self, caminho=None):
+        """Mostra a última linha de progresso e grava o resumo JSON em `caminho` (padrão: <nome>.metricas.json)."""
+        self._remover_hooks()
+        self.progresso(forcar=True)
+        resumo = self.resumo()
+        caminho = caminho or f"{self.nome}.metricas.json"
+        # Roda em `finally`: uma falha ao gravar o resumo não pode esconder o erro original
+        try:
+            diretorio = os.path.dirname(caminho)
+            if diretorio:
+                os.makedirs(diretorio, exist_ok=True)
+            with open(caminho, 'w', encoding='utf-8') as file:
+                json.dump(resumo, file, indent=2, ensure_ascii=False)
+        except OSError as e:
+            print(f"[{self.nome}] resumo não gravado em {caminho}: {e}", file=self.saida)
+        else:
+            print(f"[{self.nome}] resumo gravado em {caminho}", file=self.saida)
+        return resumo
+
+@contextlib.contextmanager
+def perfilar(ativo, nome, linhas=25):
+    """Executa o bloco sob cProfile quando `ativo`; grava <nome>.prof e mostra as funções mais caras."""
+    if not ativo:
+        yield
+        return
+    perfil = cProfile.Profile()
+    perfil.enable()
+    try:
+        yield
+    finally:
+        perfil.disable()
+        perfil.dump_stats(f"{nome}.prof")
+        texto = io.StringIO()
+        pstats.Stats(perfil, stream=texto).sort_stats('cumulative').print_stats(linhas)
+        print(texto.getvalue(), file=sys.stderr)
+        print(f"Perfil gravado em {nome}.prof", file=sys.stderr)
@@ -0,0 +1,104 @@
+import argparse
+import importlib
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import cliente_supabase
+from bubble_cache import BubbleIdCache
+from metricas import perfilar
+
+# Etapas da migração do Bubble: (nome, módulo, função, dependências, argumento CSV).
+# A função de cada etapa devolve True quando terminou sem erros (Metricas.ok).
+ETAPAS = [
+    ('preenche_modulos', 'preenche_modulos', 'preencher_id_modulo_async', [], None),
+    ('update_modulos_curso_id', 'update_modulos_curso_id', 'update_modulos_curso_id_async', ['preenche_modulos'], None),
+    ('atualizar_aula', 'atualizar_aula', 'update_aulas_with_id_modulo_async', ['preenche_modulos'], None),
+    ('aulas_assistidas', 'aulas_assistidas', 'processar_aulas_assistidas_bulk', ['atualizar_aula'], 'aulas_assistidas'),
+    ('import_membros', 'import_membros', 'import_membros_chunked', [], 'membros'),
+    ('import_users', 'import_users', 'import_users_bulk', [], 'users'),
+]
+
+def carregar_etapa(modulo, funcao, supabase, cache):
+    """Importa o script e troca o cliente e o cache dele pelos compartilhados."""
+    script = importlib.import_module(modulo)
+    script.supabase = supabase
+    if hasattr(script, 'cache'):
+        script.cache = cache
+    return getattr(script, funcao)
+
+def executar(etapas, csvs, max_paralelo=3):
+    """Executa as etapas respeitando as dependências; ramos independentes rodam em paralelo."""
+    # Um único cliente (e pool de conexões keep-alive) para todas as etapas
+    supabase = cliente_supabase.obter_cliente()
+    cache = BubbleIdCache(supabase)
+
+    # Importa todos os scripts antes de abrir as threads
+    pendentes = {nome: (carregar_etapa(modulo, funcao, supabase, cache), [d for d in deps if d in etapas], csv)
+                 for nome, modulo, funcao, deps, csv in ETAPAS if nome in etapas}
+    concluidas, falhas, tempos = set(), set(), {}
+    lock_saida = threading.Lock()
+
+    def rodar(nome, executar_etapa, csv):
+        """Executa a etapa; os scripts tratam os próprios erros e devolvem False quando algo falhou."""
+        inicio = time.perf_counter()
+        with lock_saida:
+            print(f"\n=== Iniciando {nome} ===")
+        ok = executar_etapa(csvs[csv]) if csv else executar_etapa()
+        if not ok:
+            raise RuntimeError("a etapa terminou com erros (ver o resumo <script>.metricas.json)")
+        return time.perf_counter() - inicio
+
+    with ThreadPoolExecutor(max_workers=max_paralelo) as executor:
+        em_andamento = {}
+        while pendentes or em_andamento:
+            for nome, (executar_etapa, deps, csv) in list(pendentes.items()):
+                if any(dep in falhas for dep in deps):
+                    print(f"Etapa {nome} ignorada: dependência falhou")
+                    falhas.add(nome)
+                    del pendentes[nome]
+                elif all(dep in concluidas for dep in deps):
+                    em_andamento[executor.submit(rodar, nome, executar_etapa, csv)] = nome
+                    del pendentes[nome]
+
+            if not em_andamento:
+                break
+            prontas, _ = wait(em_andamento, return_when=FIRST_COMPLETED)
+            for futuro in prontas:
+                nome = em_andamento.pop(futuro)
+                try:
+                    tempos[nome] = futuro.result()
+                    concluidas.add(nome)
+                except Exception as e:
+                    print(f"Erro na etapa {nome}: {e}")
+                    falhas.add(nome)
+
+    print("\nResumo da migração:")
+    for nome, *_ in ETAPAS:
+        if nome in tempos:
+            print(f"  {nome:<26} {tempos[nome]:8.2f}s")
+        elif nome in falhas:
+            print(f"  {nome:<26} {'falhou':>9}")
+    cache.fechar()
+    cliente_supabase.fechar()
+    return not falhas
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Executa a migração do Bubble como um grafo de etapas")
+    parser.add_argument('--membros', help="CSV de membros (habilita import_membros)")
+    parser.add_argument('--users', help="CSV de usuários (habilita import_users)")
+    parser.add_argument('--aulas-assistidas', help="CSV de aulas assistidas (habilita aulas_assistidas)")
+    parser.add_argument('--apenas', help="Lista de etapas separadas por vírgula")
+    parser.add_argument('--paralelo', type=int, default=3, help="Etapas simultâneas (padrão: 3)")
+    parser.add_argument('--profile', action='store_true', help="Executa sob cProfile e grava migrar.prof")
+    args = parser.parse_args()
+
+    csvs = {'membros': args.membros, 'users': args.users, 'aulas_assistidas': args.aulas_assistidas}
+    etapas = [nome for nome, _, _, _, csv in ETAPAS if csv is None or csvs[csv]]
+    if args.apenas:
+        etapas = [nome for nome in etapas if nome in args.apenas.split(',')]
+
+    with perfilar(args.profile, 'migrar'):
+        ok = executar(etapas, csvs, args.paralelo)
+    sys.exit(0 if ok else 1)
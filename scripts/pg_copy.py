@@ -0,0 +1,141 @@
+import glob
+import itertools
+import os
+import re
+import time
+
+# Diretório das migrações usadas para conhecer as colunas das tabelas
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'database', 'migrations')
+
+# Chave de conflito usada no merge de cada tabela; precisa de um índice único com
+# exatamente essas colunas (aulas_assistidas: migração 20240326)
+CONFLITOS = {
+    'membros': ('id_bubble_membro',),
+    'users': ('email',),
+    'aulas_assistidas': ('id_aula', 'id_usuario'),
+}
+# Tabelas em que o merge só insere pares novos (ON CONFLICT ... DO NOTHING)
+SOMENTE_INSERIR = {'aulas_assistidas'}
+
+_CREATE_TABLE = re.compile(
+    r'CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(?:public\.)?(\w+)\s*\((.*?)\n\);',
+    re.IGNORECASE | re.DOTALL,
+)
+_RESTRICOES = ('PRIMARY', 'UNIQUE', 'CONSTRAINT', 'FOREIGN', 'CHECK')
+
+def tabelas_da_migracao(migrations_dir=MIGRATIONS_DIR):
+    """Lê {tabela: [colunas]} dos CREATE TABLE em database/migrations/*.sql (a primeira definição vence)."""
+    tabelas = {}
+    for path in sorted(glob.glob(os.path.join(migrations_dir, '*.sql'))):
+        with open(path, 'r', encoding='utf-8') as file:
+            for nome, corpo in _CREATE_TABLE.findall(file.read()):
+                if nome in tabelas:
+                    continue
+                colunas = []
+                for linha in corpo.splitlines():
+                    linha = linha.strip()
+                    nome_coluna = re.split(r'[\s(]', linha, maxsplit=1)[0] if linha else ''
+                    if not nome_coluna or linha.startswith('--') or nome_coluna.upper() in _RESTRICOES:
+                        continue
+                    colunas.append(nome_coluna)
+                tabelas[nome] = colunas
+    return tabelas
+
+def colunas_da_migracao(tabela, migrations_dir=MIGRATIONS_DIR):
+    """Lê as colunas de `tabela` a partir dos CREATE TABLE em database/migrations/*.sql."""
+    return tabelas_da_migracao(migrations_dir).get(tabela)
+
+def conectar(conninfo=None):
+    """Abre uma conexão direta com o Postgres (psycopg), por padrão em SUPABASE_DB_URL."""
+    try:
+        import psycopg
+    except ImportError:
+        raise RuntimeError("A conexão direta com o Postgres precisa do pacote psycopg (pip install 'psycopg[binary]')")
+    if not conninfo:
+        from dotenv import load_dotenv
+        load_dotenv()
+        conninfo = os.environ.get('SUPABASE_DB_URL')
+    if not conninfo:
+        raise RuntimeError("Defina SUPABASE_DB_URL com a connection string do Postgres")
+    return psycopg.connect(conninfo)
+
+def tem_indice_unico(conn, tabela, colunas):
+    """Existe índice único válido, sem predicado, com exatamente `colunas` (alvo de ON CONFLICT)?"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT EXISTS (
+                SELECT 1
+                FROM pg_index i
+                WHERE i.indrelid = to_regclass(%s)
+                AND i.indisunique AND i.indisvalid AND i.indpred IS NULL
+                AND (
+                    SELECT array_agg(a.attname::TEXT ORDER BY a.attname)
+                    FROM pg_attribute a
+                    WHERE a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+                ) = %s
+                AND i.indnatts = %s
+            )
+        """, (f"public.{tabela}", sorted(colunas), len(colunas)))
+        return cur.fetchone()[0]
+
+def carregar_via_copy(tabela, lotes, conninfo=None, conflito=None, atualizar=None):
+    """Carrega `lotes` (iterável de listas de dicts) em `tabela` via COPY + merge.
+
+    As linhas são enviadas com `COPY ... FROM STDIN` para uma tabela temporária com a
+    mesma estrutura da tabela alvo e depois mescladas com `INSERT ... ON CONFLICT`,
+    tudo em uma única transação. `conflito` sobrescreve a chave de CONFLITOS e
+    `atualizar` (padrão: tabela fora de SOMENTE_INSERIR) escolhe entre DO UPDATE e
+    DO NOTHING. Sem o índice único da chave a carga é recusada antes do COPY. Quando
+    a mesma chave aparece mais de uma vez, vale a última linha enviada.
+    Retorna (linhas copiadas, linhas mescladas).
+    """
+    conflito = conflito or CONFLITOS.get(tabela)
+    if atualizar is None:
+        atualizar = tabela not in SOMENTE_INSERIR
+    colunas_validas = colunas_da_migracao(tabela)
+    staging = f"stg_{tabela}"
+    inicio = time.perf_counter()
+
+    # O primeiro lote não vazio define as colunas enviadas no COPY
+    lotes = (lote for lote in lotes if lote)
+    primeiro = next(lotes, None)
+    if primeiro is None:
+        return 0, 0
+    colunas = [c for c in primeiro[0] if colunas_validas is None or c in colunas_validas]
+
+    with conectar(conninfo) as conn:
+        if conflito and not tem_indice_unico(conn, tabela, conflito):
+            raise RuntimeError(f"{tabela} não tem índice único em ({', '.join(conflito)}); "
+                               "aplique as migrações pendentes (python aplicar_migracoes.py) antes do COPY")
+        with conn.cursor() as cur:
+            cur.execute(f'CREATE TEMP TABLE {staging} (LIKE public.{tabela} INCLUDING DEFAULTS) ON COMMIT DROP')
+            # Ordem de chegada das linhas no COPY, para o DISTINCT ON manter a última
+            cur.execute(f'ALTER TABLE {staging} ADD COLUMN _ordem BIGINT GENERATED ALWAYS AS IDENTITY')
+
+            lista = ", ".join(colunas)
+            copiadas = 0
+            with cur.copy(f"COPY {staging} ({lista}) FROM STDIN") as copy:
+                for lote in itertools.chain([primeiro], lotes):
+                    for registro in lote:
+                        copy.write_row(tuple(registro.get(c) for c in colunas))
+                    copiadas += len(lote)
+
+            if conflito:
+                chave = ", ".join(conflito)
+                # DISTINCT ON evita que o mesmo lote atualize a mesma linha duas vezes; a
+                # última linha enviada de cada chave vence, como nos upserts em sequência
+                origem = f"SELECT DISTINCT ON ({chave}) {lista} FROM {staging} ORDER BY {chave}, _ordem DESC"
+                if atualizar:
+                    sets = ", ".join(f"{c} = EXCLUDED.{c}" for c in colunas if c not in conflito)
+                    acao = f"DO UPDATE SET {sets}" if sets else "DO NOTHING"
+                else:
+                    acao = "DO NOTHING"
+                merge = f"INSERT INTO public.{tabela} ({lista}) {origem} ON CONFLICT ({chave}) {acao}"
+            else:
+                merge = f"INSERT INTO public.{tabela} ({lista}) SELECT {lista} FROM {staging} ORDER BY _ordem"
+            cur.execute(merge)
+            mescladas = cur.rowcount
+        conn.commit()
+
+    print(f"COPY {tabela}: {copiadas} linhas copiadas, {mescladas} mescladas em {time.perf_counter() - inicio:.2f}s")
+    return copiadas, mescladas
@@ -1,55 +1,136 @@
-import os
+import sys
 import uuid
-from dotenv import load_dotenv
-from supabase import create_client, Client
+from cliente_supabase import supabase
+from bubble_cache import BubbleIdCache
+from async_writer import CONCURRENCY, Operacao, escrever
+from table_scan import escanear_tabela
+from backfill_chaves import preencher_chaves, preencher_chaves_no_servidor
+from metricas import Metricas, perfilar
 
-# Carrega as variáveis de ambiente
-load_dotenv()
-
-# Configuração do cliente Supabase
-url: str = os.environ.get("VITE_SUPABASE_URL")
-key: str = os.environ.get("VITE_SUPABASE_ANON_KEY")
-supabase: Client = create_client(url, key)
+cache = BubbleIdCache(supabase)
 
 def preencher_id_modulo():
+    metricas = Metricas('preenche_modulos')
+    metricas.instrumentar_cliente(supabase)
     try:
-        # Busca todos os módulos sem id_modulo preenchido
-        response_modulos = supabase.table('modulos').select('id_bubble_modulo, id_modulo').execute()
-
-        if not response_modulos.data:
-            print("Nenhum módulo encontrado na tabela 'modulos'.")
-            return
-
-        modulos = response_modulos.data
-        print(f"Total de módulos encontrados: {len(modulos)}")
-
-        for modulo in modulos:
+        # Percorre os módulos página a página (memória constante)
+        modulos = escanear_tabela(supabase, 'modulos', 'id_bubble_modulo, id_modulo', prefetch=True)
+        for modulo in metricas.iterar('ler', modulos):
+            metricas.contar('lidas')
             id_bubble_modulo = modulo.get('id_bubble_modulo')
             id_modulo = modulo.get('id_modulo')
 
             # Verifica se o id_modulo já está preenchido
             if id_modulo:
-                print(f"Módulo com id_bubble_modulo {id_bubble_modulo} já possui id_modulo: {id_modulo}. Ignorando...")
+                metricas.contar('ignoradas')
                 continue
 
             # Gera um novo UUID para o id_modulo
             novo_id_modulo = str(uuid.uuid4())
 
             # Atualiza o módulo com o novo id_modulo
-            update_response = supabase.table('modulos')\
-                .update({'id_modulo': novo_id_modulo})\
-                .eq('id_bubble_modulo', id_bubble_modulo)\
-                .execute()
+            with metricas.fase('gravar'):
+                update_response = supabase.table('modulos')\
+                    .update({'id_modulo': novo_id_modulo})\
+                    .eq('id_bubble_modulo', id_bubble_modulo)\
+                    .execute()
 
             if not update_response.data:
-                print(f"Erro ao atualizar módulo com id_bubble_modulo {id_bubble_modulo}.")
+                metricas.falha(f"Erro ao atualizar módulo com id_bubble_modulo {id_bubble_modulo}.")
             else:
-                print(f"Módulo com id_bubble_modulo {id_bubble_modulo} atualizado com sucesso. Novo id_modulo: {novo_id_modulo}")
+                # Mantém o cache de módulos coerente com o novo id_modulo
+                cache.registrar('modulos', 'id_bubble_modulo', 'id_modulo', {id_bubble_modulo: novo_id_modulo})
+                metricas.contar('gravadas')
+
+        if not metricas.contadores['lidas']:
+            print("Nenhum módulo encontrado na tabela 'modulos'.")
+            return metricas.ok
+        print(f"\nAtualização concluída! Total de módulos encontrados: {metricas.contadores['lidas']}")
+
+    except Exception as e:
+        metricas.erro(f"Erro durante a execução: {str(e)}")
+    finally:
+        metricas.finalizar()
+    return metricas.ok
+
+def preencher_id_modulo_async(concorrencia=CONCURRENCY):
+    """Gera os UUIDs localmente e envia os updates com `concorrencia` requisições simultâneas."""
+    metricas = Metricas('preenche_modulos')
+    metricas.instrumentar_cliente(supabase)
+    try:
+        # Só os módulos ainda sem id_modulo
+        modulos = escanear_tabela(supabase, 'modulos', 'id_bubble_modulo',
+                                  filtro=lambda q: q.is_('id_modulo', 'null'), prefetch=True)
+        novos = {
+            modulo['id_bubble_modulo']: str(uuid.uuid4())
+            for modulo in metricas.iterar('ler', modulos)
+            if modulo.get('id_bubble_modulo')
+        }
+        metricas.contar('lidas', len(novos))
+        print(f"Módulos sem id_modulo: {len(novos)}")
+        operacoes = [
+            Operacao('modulos', 'update', {'id_modulo': novo_id_modulo},
+                     filtros={'id_bubble_modulo': id_bubble_modulo}, contexto=id_bubble_modulo)
+            for id_bubble_modulo, novo_id_modulo in novos.items()
+        ]
+        with metricas.fase('gravar'):
+            resultado = escrever(operacoes, concorrencia, ao_concluir=metricas.ao_concluir)
+        metricas.registrar_escrita(resultado)
+
+        for op, erro in resultado.falhas:
+            print(f"Erro ao atualizar módulo com id_bubble_modulo {op.contexto}: {erro}")
+            novos.pop(op.contexto, None)
+        # Mantém o cache de módulos coerente com os novos id_modulo
+        cache.registrar('modulos', 'id_bubble_modulo', 'id_modulo', novos)
+        print(f"\nAtualização concluída! {resultado.resumo()}")
+    except Exception as e:
+        metricas.erro(f"Erro durante a execução: {str(e)}")
+    finally:
+        metricas.finalizar()
+    return metricas.ok
 
-        print("\nAtualização concluída!")
+def preencher_id_modulo_bulk(concorrencia=1):
+    """Gera os UUIDs localmente com backfill_chaves.preencher_chaves (só id_modulo é gravado, módulo a módulo)."""
+    metricas = Metricas('preenche_modulos')
+    metricas.instrumentar_cliente(supabase)
+    try:
+        novos = preencher_chaves(supabase, 'modulos', 'id_modulo', 'id_bubble_modulo',
+                                 concorrencia=concorrencia, metricas=metricas)
+        # Mantém o cache de módulos coerente com os novos id_modulo
+        cache.registrar('modulos', 'id_bubble_modulo', 'id_modulo', novos)
+        print(f"\nAtualização concluída! Módulos preenchidos: {len(novos)}")
+    except Exception as e:
+        metricas.erro(f"Erro durante a execução: {str(e)}")
+    finally:
+        metricas.finalizar()
+    return metricas.ok
 
+def preencher_id_modulo_set_based():
+    """Preenche id_modulo com gen_random_uuid() no Postgres, em lotes (função backfill_chave_uuid)."""
+    metricas = Metricas('preenche_modulos')
+    metricas.instrumentar_cliente(supabase)
+    try:
+        with metricas.fase('gravar'):
+            total = preencher_chaves_no_servidor(supabase, 'modulos', 'id_modulo', 'id_bubble_modulo')
+        metricas.contar('gravadas', total)
+        # Os UUIDs foram gerados no servidor: o mapa em cache precisa ser recarregado
+        cache.invalidar('modulos', 'id_bubble_modulo', 'id_modulo')
+        print(f"\nAtualização concluída! Módulos preenchidos: {total}")
     except Exception as e:
-        print(f"Erro durante a execução: {str(e)}")
+        metricas.erro(f"Erro durante a execução: {str(e)}")
+    finally:
+        metricas.finalizar()
+    return metricas.ok
 
 if __name__ == "__main__":
-    preencher_id_modulo()
+    args = sys.argv[1:]
+    with perfilar('--profile' in args, 'preenche_modulos'):
+        if '--set-based' in args:
+            ok = preencher_id_modulo_set_based()
+        elif '--bulk' in args:
+            ok = preencher_id_modulo_bulk(CONCURRENCY if '--async' in args else 1)
+        elif '--async' in args:
+            ok = preencher_id_modulo_async()
+        else:
+            ok = preencher_id_modulo()
+    sys.exit(0 if ok else 1)
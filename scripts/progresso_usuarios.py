@@ -0,0 +1,207 @@
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import sys
+
+from cliente_supabase import supabase
+from async_writer import CONCURRENCY, Operacao, escrever
+from bubble_cache import CACHE_DIR
+from table_scan import escanear_tabela
+from metricas import Metricas, perfilar
+
+# Tabela materializada (migração 20240330) e sua chave de upsert
+TABELA_PROGRESSO = 'progresso_usuarios'
+CONFLITO_PROGRESSO = 'id_usuario,escopo,id_bubble'
+# Chave de aulas_assistidas usada como marca d'água (precisa ser inteira e crescente)
+CHAVE_AULAS_ASSISTIDAS = 'id'
+# Chaves relidas abaixo da marca d'água: um id serial é reservado no INSERT mas fica
+# visível no COMMIT, então transações concorrentes aparecem fora de ordem. Os usuários
+# dessas linhas são recalculados de novo e o upsert absorve a sobreposição.
+MARGEM_MARCA = 1000
+# Linhas por upsert em lote
+CHUNK_SIZE = 1000
+# Usuários por consulta `in_()` ao reler as aulas assistidas dos usuários alterados
+USUARIOS_POR_CONSULTA = 200
+# Estado da última execução: marca d'água e assinatura do catálogo de aulas
+ESTADO_PATH = os.path.join(CACHE_DIR, 'progresso_usuarios.json')
+
+def carregar_estado(caminho=ESTADO_PATH):
+    if not os.path.exists(caminho):
+        return {}
+    with open(caminho, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+def _gravar_estado(estado, caminho):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    with open(f"{caminho}.tmp", 'w', encoding='utf-8') as file:
+        json.dump(estado, file, indent=2)
+    os.replace(f"{caminho}.tmp", caminho)
+
+def carregar_catalogo():
+    """Aulas ativas com o módulo e o curso de cada uma: id_aula, id_bubble_modulo, id_bubble_curso.
+
+    A junção é feita pelos IDs do Bubble, que estão preenchidos mesmo antes dos backfills
+    de id_modulo/id_curso; aulas de módulos ou cursos inexistentes ficam de fora.
+    """
+    import pandas as pd
+
+    # Mesmo critério do frontend (useLessons): só aulas com ativo = true contam
+    aulas = pd.DataFrame.from_records(list(escanear_tabela(
+        supabase, 'aulas', 'id, id_aula, id_bubble_modulo', prefetch=True, filtro=lambda q: q.eq('ativo', True),
+    )), columns=['id', 'id_aula', 'id_bubble_modulo'])
+    modulos = pd.DataFrame.from_records(list(escanear_tabela(
+        supabase, 'modulos', 'id, id_bubble_modulo, id_bubble_curso', prefetch=True,
+    )), columns=['id', 'id_bubble_modulo', 'id_bubble_curso'])
+    cursos = pd.DataFrame.from_records(list(escanear_tabela(
+        supabase, 'cursos', 'id, id_bubble_curso', prefetch=True,
+    )), columns=['id', 'id_bubble_curso'])
+
+    catalogo = aulas[['id_aula', 'id_bubble_modulo']].dropna()\
+        .merge(modulos[['id_bubble_modulo', 'id_bubble_curso']].dropna().drop_duplicates('id_bubble_modulo'),
+               on='id_bubble_modulo')\
+        .merge(cursos[['id_bubble_curso']].drop_duplicates(), on='id_bubble_curso')
+    return catalogo.drop_duplicates('id_aula').sort_values('id_aula', ignore_index=True)
+
+def assinatura(catalogo):
+    """Hash do catálogo: muda quando uma aula entra, sai ou troca de módulo/curso (e os totais mudam)."""
+    return hashlib.sha256(catalogo.to_csv(index=False).encode('utf-8')).hexdigest()
+
+def calcular_progresso(assistidas, catalogo, atualizado_em):
+    """Percentual de aulas assistidas por (usuário, módulo) e (usuário, curso), com groupby vetorizado."""
+    import pandas as pd
+
+    pares = assistidas[['id_usuario', 'id_aula']].dropna().drop_duplicates().merge(catalogo, on='id_aula')
+    curso_do_modulo = catalogo.drop_duplicates('id_bubble_modulo').set_index('id_bubble_modulo')['id_bubble_curso']
+    resultados = []
+    for escopo, coluna in (('modulo', 'id_bubble_modulo'), ('curso', 'id_bubble_curso')):
+        totais = catalogo.groupby(coluna).size().rename('total_aulas')
+        feitas = pares.groupby(['id_usuario', coluna]).size().rename('aulas_assistidas').reset_index()
+        feitas = feitas.join(totais, on=coluna)
+        resultados.append(pd.DataFrame({
+            'id_usuario': feitas['id_usuario'],
+            'escopo': escopo,
+            'id_bubble': feitas[coluna],
+            'id_bubble_curso': feitas[coluna].map(curso_do_modulo) if escopo == 'modulo' else feitas[coluna],
+            'aulas_assistidas': feitas['aulas_assistidas'],
+            'total_aulas': feitas['total_aulas'],
+            'percentual': (feitas['aulas_assistidas'] * 100 / feitas['total_aulas']).round(2),
+        }))
+    progresso = pd.concat(resultados, ignore_index=True)
+    return progresso.assign(atualizado_em=atualizado_em)
+
+def _assistidas(filtro=None):
+    import pandas as pd
+
+    colunas = [CHAVE_AULAS_ASSISTIDAS, 'id_aula', 'id_usuario']
+    linhas = escanear_tabela(supabase, 'aulas_assistidas', ', '.join(colunas), chave=CHAVE_AULAS_ASSISTIDAS,
+                             filtro=filtro, prefetch=True)
+    return pd.DataFrame.from_records(list(linhas), columns=colunas)
+
+def _assistidas_dos_usuarios(usuarios):
+    import pandas as pd
+
+    partes = [_assistidas(lambda q, lote=usuarios[i:i + USUARIOS_POR_CONSULTA]: q.in_('id_usuario', lote))
+              for i in range(0, len(usuarios), USUARIOS_POR_CONSULTA)]
+    return pd.concat(partes, ignore_index=True)
+
+def _marca(assistidas, anterior=None):
+    import pandas as pd
+
+    chaves = assistidas[CHAVE_AULAS_ASSISTIDAS]
+    if chaves.empty or not pd.api.types.is_integer_dtype(chaves):
+        return anterior
+    return max(int(chaves.max()), anterior or 0)
+
+def _gravar(progresso, chunk_size, concorrencia, metricas):
+    registros = progresso.to_dict('records')
+    lotes = [registros[i:i + chunk_size] for i in range(0, len(registros), chunk_size)]
+    if concorrencia > 1:
+        operacoes = [Operacao(TABELA_PROGRESSO, 'upsert', lote, on_conflict=CONFLITO_PROGRESSO) for lote in lotes]
+        resultado = escrever(operacoes, concorrencia, ao_concluir=metricas.ao_concluir)
+        metricas.registrar_escrita(resultado)
+        for op, erro in resultado.falhas:
+            print(f"Erro ao gravar lote de {len(op.dados)} linhas de progresso: {erro}")
+        return not resultado.falhas
+    ok = True
+    for lote in lotes:
+        try:
+            supabase.table(TABELA_PROGRESSO).upsert(lote, on_conflict=CONFLITO_PROGRESSO).execute()
+            metricas.contar('gravadas', len(lote))
+        except Exception as e:
+            metricas.falha(f"Erro ao gravar lote de {len(lote)} linhas de progresso: {str(e)}", len(lote))
+            ok = False
+    return ok
+
+def atualizar_progresso(completo=False, chunk_size=CHUNK_SIZE, concorrencia=1, estado_path=ESTADO_PATH):
+    """Recalcula progresso_usuarios e grava o resultado com upserts em lote.
+
+    Sem `completo`, só os usuários com aulas_assistidas novas desde a última execução
+    (chave acima da marca d'água menos MARGEM_MARCA) são recalculados, a partir de
+    todas as aulas que cada um já assistiu. O recálculo é completo na primeira execução, quando o
+    catálogo de aulas/módulos/cursos mudou (os totais de todos mudam), quando a chave
+    de aulas_assistidas não é inteira ou com `completo=True`; nesse caso as linhas
+    que não foram regravadas (progresso que deixou de existir) são apagadas no final.
+    Retorna True quando terminou sem erros (Metricas.ok).
+    """
+    metricas = Metricas('progresso_usuarios')
+    metricas.instrumentar_cliente(supabase)
+    inicio = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    try:
+        estado = carregar_estado(estado_path)
+        with metricas.fase('catalogo'):
+            catalogo = carregar_catalogo()
+            assinatura_catalogo = assinatura(catalogo)
+        print(f"Catálogo: {len(catalogo)} aulas ativas")
+
+        if estado.get('catalogo') != assinatura_catalogo or estado.get('marca') is None:
+            completo = True
+        with metricas.fase('ler'):
+            if completo:
+                assistidas = _assistidas()
+                marca = _marca(assistidas)
+            else:
+                desde = max(estado['marca'] - MARGEM_MARCA, 0)
+                novas = _assistidas(lambda q: q.gt(CHAVE_AULAS_ASSISTIDAS, desde))
+                marca = _marca(novas, estado['marca'])
+                usuarios = sorted(novas['id_usuario'].dropna().unique())
+                assistidas = _assistidas_dos_usuarios(usuarios) if usuarios else novas.iloc[0:0]
+        metricas.contar('lidas', len(assistidas))
+        usuarios = assistidas['id_usuario'].nunique()
+        print(f"{'Recálculo completo' if completo else 'Recálculo incremental'}: "
+              f"{len(assistidas)} aulas assistidas de {usuarios} usuários")
+
+        with metricas.fase('calcular'):
+            progresso = calcular_progresso(assistidas, catalogo, inicio)
+        with metricas.fase('gravar'):
+            ok = _gravar(progresso, chunk_size, concorrencia, metricas)
+            if ok and completo:
+                removidas = supabase.table(TABELA_PROGRESSO).delete().lt('atualizado_em', inicio).execute().data
+                metricas.contar('removidas', len(removidas or []))
+
+        if ok:
+            _gravar_estado({'marca': marca, 'catalogo': assinatura_catalogo, 'atualizado_em': inicio}, estado_path)
+        else:
+            print("Houve falhas: a marca d'água não avançou e a próxima execução recalcula os mesmos usuários.")
+        print(f"\nProgresso atualizado! Linhas gravadas: {metricas.contadores['gravadas']} | "
+              f"Usuários: {usuarios} | Erros: {metricas.contadores['falhas']}")
+    except Exception as e:
+        metricas.erro(f"Erro durante a execução: {str(e)}")
+    finally:
+        metricas.finalizar()
+    return metricas.ok
+
+if __name__ == "__main__":
+    # Uso: python progresso_usuarios.py [--completo] [--async] [--profile]
+    # (requer a migração 20240330 e SUPABASE_SERVICE_ROLE_KEY: a tabela tem RLS sem política de escrita)
+    parser = argparse.ArgumentParser(description="Materializa o progresso por usuário, módulo e curso")
+    parser.add_argument('--completo', action='store_true', help="Recalcula todos os usuários")
+    parser.add_argument('--async', dest='assincrono', action='store_true',
+                        help=f"Grava os lotes com {CONCURRENCY} requisições simultâneas")
+    parser.add_argument('--profile', action='store_true', help="Executa sob cProfile e grava progresso_usuarios.prof")
+    args = parser.parse_args()
+
+    with perfilar(args.profile, 'progresso_usuarios'):
+        ok = atualizar_progresso(args.completo, concorrencia=CONCURRENCY if args.assincrono else 1)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,202 @@
+import argparse
+import functools
+import json
+import operator
+from collections import namedtuple
+
+from cliente_supabase import supabase
+from table_scan import escanear_tabela
+from metricas import Metricas, perfilar
+from snapshot_tabelas import SNAPSHOT_DIR, colunas_snapshot, ler_snapshot
+from verificar_indices import CHAVES_UNICAS
+
+# Referência de `tabela.coluna` para `alvo`: válida se o valor aparece em alguma das `colunas_alvo`
+Relacao = namedtuple('Relacao', 'tabela coluna alvo colunas_alvo')
+
+# IDs do Bubble que os scripts resolvem linha a linha (update_modules, atualizar_aula, import_membros)
+REFERENCIAS_BUBBLE = [
+    Relacao('modulos', 'id_bubble_curso', 'cursos', ('id_bubble_curso',)),
+    Relacao('aulas', 'id_bubble_modulo', 'modulos', ('id_bubble_modulo',)),
+    Relacao('membros', 'id_bubble_user', 'usuarios', ('id_bubble_usuario',)),
+]
+# Chaves já resolvidas; modulos.id_curso recebe cursos.id_curso ou cursos.id (ver backfill_modulos_id_curso)
+CHAVES_ESTRANGEIRAS = [
+    Relacao('modulos', 'id_curso', 'cursos', ('id_curso', 'id')),
+    Relacao('aulas', 'id_modulo', 'modulos', ('id_modulo',)),
+    Relacao('aulas_assistidas', 'id_aula', 'aulas', ('id_aula',)),
+    Relacao('aulas_assistidas', 'id_usuario', 'usuarios', ('id_usuario',)),
+]
+# Valores únicos: IDs do Bubble e o par de aulas_assistidas (uq_aulas_assistidas_aula_usuario)
+UNICAS = CHAVES_UNICAS + [('aulas_assistidas', ('id_aula', 'id_usuario'))]
+
+# Chave que identifica as linhas nos exemplos do relatório
+CHAVE = 'id'
+# IDs de linhas listados por problema
+MAX_EXEMPLOS = 5
+
+COLUNAS_RELATORIO = ['tipo', 'tabela', 'coluna', 'alvo', 'valor', 'ocorrencias', 'exemplos']
+
+def colunas_necessarias():
+    """Colunas de cada tabela usadas nas verificações (mais a chave para os exemplos)."""
+    necessarias = {}
+    for relacao in REFERENCIAS_BUBBLE + CHAVES_ESTRANGEIRAS:
+        necessarias.setdefault(relacao.tabela, {CHAVE}).add(relacao.coluna)
+        necessarias.setdefault(relacao.alvo, {CHAVE}).update(relacao.colunas_alvo)
+    for tabela, colunas in UNICAS:
+        necessarias.setdefault(tabela, {CHAVE}).update(colunas)
+    return necessarias
+
+def _colunas_supabase(tabela):
+    amostra = supabase.table(tabela).select('*').limit(1).execute().data
+    return set(amostra[0]) if amostra else None
+
+def carregar_tabela(tabela, colunas, diretorio=None):
+    """Lê só as `colunas` de `tabela` que existem, do snapshot em `diretorio` ou do Supabase.
+
+    Uma linha de amostra (ou o esquema do Parquet) diz quais colunas existem, então uma
+    coluna ausente neste banco desativa a verificação em vez de derrubar a consulta.
+    """
+    import pandas as pd
+
+    existentes = colunas_snapshot(tabela, diretorio) if diretorio else None
+    if existentes is not None:
+        return ler_snapshot(tabela, sorted(colunas & set(existentes)), diretorio)
+    existentes = _colunas_supabase(tabela)
+    if existentes is None:
+        return pd.DataFrame(columns=sorted(colunas))
+    selecao = sorted(colunas & existentes)
+    linhas = escanear_tabela(supabase, tabela, ', '.join(selecao), chave=CHAVE, prefetch=True)
+    return pd.DataFrame.from_records(list(linhas), columns=selecao)
+
+def _texto(serie):
+    """Valores como texto, para comparar UUID, BIGINT e IDs do Bubble do mesmo jeito."""
+    import pandas as pd
+
+    # Inteiros com nulos voltam do Parquet como float (12.0): volta para inteiro antes de converter
+    if pd.api.types.is_float_dtype(serie):
+        serie = serie.astype('Int64')
+    return serie.astype(str)
+
+def _preenchidos(df, coluna):
+    valores = df[coluna]
+    return valores.notna() & (_texto(valores).str.strip() != '')
+
+def _agrupar(linhas, colunas, tipo, tabela, alvo=''):
+    """Uma linha de relatório por valor: quantas vezes aparece e alguns IDs de exemplo."""
+    import pandas as pd
+
+    if linhas.empty:
+        return pd.DataFrame(columns=COLUNAS_RELATORIO)
+    colunas = list(colunas)
+    linhas = linhas.assign(valor=_texto(linhas[colunas[0]]) if len(colunas) == 1
+                           else linhas[colunas].astype(str).agg('|'.join, axis=1))
+    ocorrencias = linhas.groupby('valor', sort=True).size().rename('ocorrencias')
+    if CHAVE in linhas.columns:
+        exemplos = _texto(linhas.groupby('valor').head(MAX_EXEMPLOS).set_index('valor')[CHAVE])
+        exemplos = exemplos.groupby(level=0).agg(','.join).rename('exemplos')
+    else:
+        exemplos = pd.Series('', index=ocorrencias.index, name='exemplos')
+    relatorio = pd.concat([ocorrencias, exemplos], axis=1).reset_index()
+    return relatorio.assign(tipo=tipo, tabela=tabela, coluna=','.join(colunas), alvo=alvo)[COLUNAS_RELATORIO]
+
+def verificar_unicas(tabelas):
+    """IDs do Bubble (e pares) que aparecem em mais de uma linha."""
+    resultados = []
+    for tabela, colunas in UNICAS:
+        df = tabelas.get(tabela)
+        if df is None or not set(colunas) <= set(df.columns):
+            print(f"Ignorado: {tabela}({', '.join(colunas)}) não existe")
+            continue
+        preenchidas = df[functools.reduce(operator.and_, (_preenchidos(df, c) for c in colunas))]
+        duplicadas = preenchidas[preenchidas.duplicated(list(colunas), keep=False)]
+        resultados.append(_agrupar(duplicadas, colunas, 'duplicado', tabela))
+    return resultados
+
+def verificar_relacoes(tabelas, relacoes, tipo):
+    """Valores de `tabela.coluna` que não existem no alvo: um anti-join por hash (`isin`) por relação."""
+    import pandas as pd
+
+    resultados = []
+    for relacao in relacoes:
+        df, alvo = tabelas.get(relacao.tabela), tabelas.get(relacao.alvo)
+        colunas_alvo = [c for c in relacao.colunas_alvo if alvo is not None and c in alvo.columns]
+        if df is None or relacao.coluna not in df.columns or not colunas_alvo:
+            print(f"Ignorado: {relacao.tabela}.{relacao.coluna} -> {relacao.alvo}({', '.join(relacao.colunas_alvo)}) não existe")
+            continue
+        conhecidos = pd.concat([_texto(alvo[c].dropna()) for c in colunas_alvo]).unique()
+        preenchidas = df[_preenchidos(df, relacao.coluna)]
+        faltantes = preenchidas[~_texto(preenchidas[relacao.coluna]).isin(conhecidos)]
+        destino = f"{relacao.alvo}.{'/'.join(colunas_alvo)}"
+        resultados.append(_agrupar(faltantes, [relacao.coluna], tipo, relacao.tabela, destino))
+    return resultados
+
+def reconciliar(diretorio=None, metricas=None):
+    """Carrega as colunas-chave de cada tabela uma vez e devolve um DataFrame com os problemas.
+
+    Tipos de problema:
+        duplicado           ID do Bubble (ou par id_aula/id_usuario) repetido
+        referencia_bubble   id_bubble_* que não existe na tabela referenciada
+        orfao               chave estrangeira já resolvida que aponta para uma linha inexistente
+    Com `diretorio` as tabelas vêm dos snapshots Parquet (snapshot_tabelas.py) quando existem.
+    """
+    import pandas as pd
+
+    metricas = metricas or Metricas('reconciliar')
+    tabelas = {}
+    with metricas.fase('ler'):
+        for tabela, colunas in sorted(colunas_necessarias().items()):
+            tabelas[tabela] = carregar_tabela(tabela, colunas, diretorio)
+            metricas.contar('lidas', len(tabelas[tabela]))
+            print(f"{tabela}: {len(tabelas[tabela])} linhas")
+
+    with metricas.fase('verificar'):
+        resultados = verificar_unicas(tabelas)
+        resultados += verificar_relacoes(tabelas, REFERENCIAS_BUBBLE, 'referencia_bubble')
+        resultados += verificar_relacoes(tabelas, CHAVES_ESTRANGEIRAS, 'orfao')
+    resultados = [r for r in resultados if not r.empty]
+    problemas = pd.concat(resultados, ignore_index=True) if resultados else pd.DataFrame(columns=COLUNAS_RELATORIO)
+    metricas.contar('problemas', len(problemas))
+    return problemas
+
+def resumir(problemas):
+    """Linhas afetadas por tipo, tabela, coluna e alvo."""
+    if problemas.empty:
+        return []
+    resumo = problemas.groupby(['tipo', 'tabela', 'coluna', 'alvo'], sort=True).agg(
+        valores=('valor', 'size'), linhas=('ocorrencias', 'sum')).reset_index()
+    return [{chave: (int(valor) if chave in ('valores', 'linhas') else valor) for chave, valor in linha.items()}
+            for linha in resumo.to_dict('records')]
+
+def gravar_relatorio(problemas, caminho):
+    """Grava o relatório em CSV (uma linha por valor com problema) ou, se `caminho` termina em .json, em JSON com resumo."""
+    if caminho.endswith('.json'):
+        problemas = problemas.assign(ocorrencias=problemas['ocorrencias'].astype(int))
+        with open(caminho, 'w', encoding='utf-8') as file:
+            json.dump({'resumo': resumir(problemas), 'problemas': problemas.to_dict('records')},
+                      file, indent=2, ensure_ascii=False)
+    else:
+        problemas.to_csv(caminho, index=False, sep=';')
+    print(f"Relatório gravado em {caminho}")
+
+if __name__ == "__main__":
+    # Uso: python reconciliar.py [--saida reconciliacao.csv|.json] [--snapshot [DIR]] [--profile]
+    parser = argparse.ArgumentParser(description="Verifica órfãos, IDs do Bubble duplicados e referências não resolvidas")
+    parser.add_argument('--saida', default='reconciliacao.csv', help="Arquivo do relatório, .csv ou .json (padrão: reconciliacao.csv)")
+    parser.add_argument('--snapshot', nargs='?', const=SNAPSHOT_DIR, metavar='DIR',
+                        help=f"Lê as tabelas dos snapshots Parquet (padrão: {SNAPSHOT_DIR}) em vez do Supabase")
+    parser.add_argument('--profile', action='store_true', help="Executa sob cProfile e grava reconciliar.prof")
+    args = parser.parse_args()
+
+    with perfilar(args.profile, 'reconciliar'):
+        metricas = Metricas('reconciliar')
+        metricas.instrumentar_cliente(supabase)
+        try:
+            problemas = reconciliar(args.snapshot, metricas)
+            for linha in resumir(problemas):
+                print(f"  {linha['tipo']:<17} {linha['tabela']}.{linha['coluna']} -> {linha['alvo'] or '-'}: "
+                      f"{linha['valores']} valores, {linha['linhas']} linhas")
+            if problemas.empty:
+                print("Nenhum problema encontrado.")
+            gravar_relatorio(problemas, args.saida)
+        finally:
+            metricas.finalizar()
@@ -0,0 +1,446 @@
+import argparse
+import os
+import sys
+from collections import namedtuple
+
+from cliente_supabase import supabase
+from bubble_cache import CACHE_DIR
+from lote_adaptativo import LoteAdaptativo, gravar_adaptativo
+from metricas import Metricas, perfilar
+
+# Índices das exportações já importadas: um <exportação>.npz por exportação
+INDICE_DIR = os.path.join(CACHE_DIR, 'delta')
+# Linhas do CSV lidas por vez (as duas leituras do arquivo usam o mesmo valor)
+CHUNK_SIZE = 5000
+# Lote inicial dos inserts/upserts (ajustado por lote_adaptativo)
+LOTE_ESCRITA = 500
+# IDs por delete com `in_()`
+LOTE_REMOCAO = 200
+# IDs por consulta com `in_()` (chaves primárias das linhas alteradas de users)
+LOTE_CONSULTA = 200
+# Fração do índice anterior que pode sumir em uma sincronização sem --forcar-remocoes
+# (uma exportação truncada não deve apagar metade da tabela)
+MAX_FRACAO_REMOVIDAS = 0.2
+
+# `lados`: IDs do Bubble que formam a chave de cada linha; `chave`: coluna do CSV e da tabela
+# (None em aulas_assistidas, em que cada par (aula, usuário) do CSV é uma linha)
+Exportacao = namedtuple('Exportacao', 'nome tabela chave lados')
+
+EXPORTACOES = {
+    'membros': Exportacao('membros', 'membros', 'id_bubble_membro', ('id',)),
+    'users': Exportacao('users', 'users', 'id_bubble_user', ('id',)),
+    'aulas_assistidas': Exportacao('aulas_assistidas', 'aulas_assistidas', None, ('aula', 'usuario')),
+}
+
+def colunas_chave(exportacao):
+    return [f"{lado}_{parte}" for lado in exportacao.lados for parte in ('alto', 'baixo')]
+
+def caminho_indice(exportacao, diretorio=INDICE_DIR):
+    return os.path.join(diretorio, f"{exportacao.nome}.npz")
+
+def carregar_indice(exportacao, diretorio=INDICE_DIR):
+    """Índice da última exportação importada: (DataFrame chave + hash, {lado: IDs fora do formato}) ou None."""
+    import numpy as np
+    import pandas as pd
+
+    caminho = caminho_indice(exportacao, diretorio)
+    if not os.path.exists(caminho):
+        return None
+    with np.load(caminho) as arquivo:
+        indice = pd.DataFrame({coluna: arquivo[coluna] for coluna in colunas_chave(exportacao) + ['hash']})
+        outros = {lado: arquivo[f"outros_{lado}"].tolist() for lado in exportacao.lados}
+    return indice, outros
+
+def gravar_indice(exportacao, indice, outros, diretorio=INDICE_DIR):
+    """Grava o índice ao lado e troca de uma vez (um índice pela metade faria tudo parecer novo)."""
+    import numpy as np
+
+    os.makedirs(diretorio, exist_ok=True)
+    caminho = caminho_indice(exportacao, diretorio)
+    arrays = {coluna: indice[coluna].to_numpy() for coluna in colunas_chave(exportacao) + ['hash']}
+    arrays.update({f"outros_{lado}": np.array(outros[lado], dtype=str) for lado in exportacao.lados})
+    with open(f"{caminho}.tmp", 'wb') as file:
+        np.savez(file, **arrays)
+    os.replace(f"{caminho}.tmp", caminho)
+
+def _alinhar_outros(indice, lado, outros, referencia):
+    """Faz as chaves de IDs fora do formato apontarem para `referencia` (a lista do índice anterior).
+
+    As posições em `outros` dependem da ordem em que cada exportação foi lida; alinhadas,
+    o mesmo texto tem a mesma chave nas duas e a comparação pode ser só por inteiros.
+    """
+    import numpy as np
+    from bubble_ids import FORA_DO_FORMATO
+
+    posicao = {texto: i for i, texto in enumerate(referencia)}
+    mapa = []
+    for texto in outros:
+        if texto not in posicao:
+            posicao[texto] = len(referencia)
+            referencia.append(texto)
+        mapa.append(posicao[texto])
+    fora = (indice[f"{lado}_alto"] == FORA_DO_FORMATO).to_numpy()
+    if fora.any():
+        indice.loc[fora, f"{lado}_baixo"] = np.array(mapa, dtype=np.int64)[indice.loc[fora, f"{lado}_baixo"].to_numpy()]
+
+def _ler_texto(csv_path, chunk_size):
+    import pandas as pd
+
+    for df in pd.read_csv(csv_path, sep=';', dtype=str, keep_default_na=False, na_filter=False, encoding='utf-8',
+                          chunksize=chunk_size):
+        df.columns = [coluna.strip() for coluna in df.columns]
+        yield df
+
+def indexar_linhas(exportacao, csv_path, chunk_size=CHUNK_SIZE):
+    """Índice de uma exportação com uma linha por ID do Bubble: chave codificada, hash da linha e posição no CSV.
+
+    O hash (pd.util.hash_pandas_object) é do texto das colunas, em ordem de nome, então
+    qualquer mudança no conteúdo da linha muda o hash; a posição permite reler só as
+    linhas alteradas. Linhas sem ID ficam de fora; um ID repetido vale pela última linha.
+    """
+    import numpy as np
+    import pandas as pd
+    from bubble_ids import codificar
+
+    partes, outros, inicio = [], [], 0
+    for df in _ler_texto(csv_path, chunk_size):
+        ids = df[exportacao.chave].str.strip() if exportacao.chave in df.columns else pd.Series('', index=df.index)
+        validos = (ids != '').to_numpy()
+        chaves, _ = codificar(ids[validos].to_numpy(), outros)
+        partes.append(pd.DataFrame({
+            'id_alto': chaves['alto'],
+            'id_baixo': chaves['baixo'],
+            'hash': pd.util.hash_pandas_object(df.loc[validos, sorted(df.columns)], index=False).to_numpy(),
+            'linha': inicio + np.flatnonzero(validos),
+        }))
+        inicio += len(df)
+    indice = pd.concat(partes, ignore_index=True) if partes else \
+        pd.DataFrame({coluna: pd.Series(dtype=tipo) for coluna, tipo in
+                      (('id_alto', 'int64'), ('id_baixo', 'int64'), ('hash', 'uint64'), ('linha', 'int64'))})
+    return indice.drop_duplicates(['id_alto', 'id_baixo'], keep='last', ignore_index=True), {'id': outros}
+
+def indexar_pares(csv_path):
+    """Índice de aulas_assistidas: um par (aula, usuário) distinto por linha, sem hash (o par é o conteúdo)."""
+    import numpy as np
+    import pandas as pd
+    from aulas_assistidas import explodir_pares
+
+    pares = explodir_pares(csv_path)
+    aulas, usuarios = pares.aulas[pares.aula], pares.usuarios[pares.usuario]
+    indice = pd.DataFrame({
+        'aula_alto': aulas['alto'], 'aula_baixo': aulas['baixo'],
+        'usuario_alto': usuarios['alto'], 'usuario_baixo': usuarios['baixo'],
+        'hash': np.zeros(len(aulas), dtype=np.uint64),
+    })
+    return indice, {'aula': pares.outros_aulas, 'usuario': pares.outros_usuarios}
+
+def comparar(exportacao, anterior, novo):
+    """Classifica o índice `novo` contra o `anterior` com uma junção por hash sobre as chaves inteiras.
+
+    Devolve (inseridas, alteradas, removidas); as duas primeiras têm as colunas de `novo`
+    (inclusive a posição no CSV), e `removidas` as do índice anterior.
+    """
+    chave = colunas_chave(exportacao)
+    # UInt64 (com <NA>) para o hash anterior: em float os hashes de 64 bits perderiam precisão
+    anteriores = anterior[chave + ['hash']].rename(columns={'hash': 'hash_anterior'})\
+        .astype({'hash_anterior': 'UInt64'})
+    junto = novo.merge(anteriores, on=chave, how='left', indicator=True)
+    inseridas = junto.loc[junto['_merge'] == 'left_only', novo.columns]
+    ambas = junto[junto['_merge'] == 'both']
+    alteradas = ambas.loc[(ambas['hash'] != ambas['hash_anterior']).to_numpy(dtype=bool), novo.columns]
+    sumiram = anterior.merge(novo[chave], on=chave, how='left', indicator=True)
+    removidas = sumiram.loc[sumiram['_merge'] == 'left_only', chave + ['hash']]
+    return inseridas, alteradas, removidas
+
+def _textos(indice, lado, outros):
+    from bubble_ids import DTYPE, decodificar
+    import numpy as np
+
+    chaves = np.empty(len(indice), dtype=DTYPE)
+    chaves['alto'], chaves['baixo'] = indice[f"{lado}_alto"].to_numpy(), indice[f"{lado}_baixo"].to_numpy()
+    return decodificar(chaves, outros[lado])
+
+def _reler(csv_path, linhas, ler, chunk_size):
+    """Relê o CSV com o leitor do script de importação e devolve só as `linhas` (posições, em ordem)."""
+    import numpy as np
+
+    linhas = np.sort(linhas)
+    inicio = 0
+    for df in ler(csv_path, chunk_size):
+        fim = inicio + len(df)
+        selecionadas = linhas[np.searchsorted(linhas, inicio):np.searchsorted(linhas, fim)]
+        if len(selecionadas):
+            yield df.iloc[selecionadas - inicio]
+        inicio = fim
+
+def _remover(tabela, coluna, ids, metricas):
+    """Apaga as linhas com `coluna` em `ids` em lotes `in_()`; devolve os IDs dos lotes que falharam."""
+    falhas = []
+    for i in range(0, len(ids), LOTE_REMOCAO):
+        lote = ids[i:i + LOTE_REMOCAO]
+        try:
+            with metricas.fase('remover'):
+                resposta = supabase.table(tabela).delete().in_(coluna, lote).execute()
+            metricas.contar('removidas', len(resposta.data or []))
+        except Exception as e:
+            metricas.falha(f"Erro ao remover {len(lote)} linhas de {tabela}: {str(e)}", len(lote))
+            falhas += lote
+    return falhas
+
+def _gravar(tabela, registros, enviar, metricas):
+    """Envia `registros` em lotes adaptativos; devolve [(registro, erro), ...] dos recusados."""
+    if not registros:
+        return []
+    controle = LoteAdaptativo(tabela, LOTE_ESCRITA)
+    with metricas.fase('gravar'):
+        gravadas, recusados = gravar_adaptativo(registros, enviar, controle)
+    metricas.contar('gravadas', gravadas)
+    for registro, erro in recusados:
+        metricas.falha(f"Erro ao gravar linha de {tabela}: {str(erro)}")
+    metricas.registrar_lote(controle)
+    return recusados
+
+def aplicar_membros(csv_path, inseridas, alteradas, ids_novos, ids_removidos, metricas, chunk_size=CHUNK_SIZE):
+    """Upsert das linhas novas e alteradas (preparadas como em import_membros) e remoção das que sumiram.
+
+    Como em import_membros, as linhas que a preparação rejeita e as que o servidor recusa
+    vão para `<csv>.delta.rejeitados.csv` e contam como falha (menos as repetidas no bloco).
+    """
+    import pandas as pd
+    from import_membros import ERRO_DUPLICADO, _gravar_rejeitados, preparar_chunk
+
+    def ler(caminho, tamanho):
+        return pd.read_csv(caminho, sep=';', dtype={'id_bubble_membro': str}, chunksize=tamanho)
+
+    reject_path = f"{os.path.splitext(csv_path)[0]}.delta.rejeitados.csv"
+    if os.path.exists(reject_path):
+        os.remove(reject_path)
+    # Os blocos do read_csv mantêm a numeração global, então o índice do DataFrame é a posição da linha
+    id_da_linha = dict(zip(pd.concat([inseridas['linha'], alteradas['linha']]).tolist(), ids_novos))
+    registros, rejeitados = [], []
+    for df in _reler(csv_path, list(id_da_linha), ler, chunk_size):
+        validos, recusadas = preparar_chunk(df)
+        registros += validos
+        if len(recusadas):
+            rejeitados.append(recusadas)
+    # Uma linha repetida não é falha: o mesmo membro foi gravado pela última linha dele
+    falhas = {id_da_linha[linha] for df in rejeitados for linha in df[df['erro'] != ERRO_DUPLICADO].index.tolist()}
+    if falhas:
+        metricas.falha(f"{len(falhas)} linhas de membros rejeitadas na preparação (ver {reject_path})", len(falhas))
+
+    def enviar(lote):
+        supabase.table('membros').upsert(lote, on_conflict='id_bubble_membro').execute()
+
+    recusados = _gravar('membros', registros, enviar, metricas)
+    if recusados:
+        rejeitados.append(pd.DataFrame([registro for registro, _ in recusados])
+                          .assign(erro=[str(erro) for _, erro in recusados]))
+    falhas |= {registro['id_bubble_membro'].strip() for registro, _ in recusados}
+    for i, df in enumerate(rejeitados):
+        _gravar_rejeitados(reject_path, df, i == 0)
+    return falhas, set(_remover('membros', 'id_bubble_membro', ids_removidos, metricas))
+
+def _ids_por_bubble(id_bubble_users, metricas):
+    """{id_bubble_user: [id, ...]} das linhas de users com esses IDs do Bubble, consultados em lotes `in_()`."""
+    ids = {}
+    for i in range(0, len(id_bubble_users), LOTE_CONSULTA):
+        lote = id_bubble_users[i:i + LOTE_CONSULTA]
+        with metricas.fase('resolver'):
+            resposta = supabase.table('users').select('id, id_bubble_user').in_('id_bubble_user', lote).execute()
+        for linha in resposta.data or []:
+            ids.setdefault(linha['id_bubble_user'], []).append(linha['id'])
+    return ids
+
+def aplicar_users(csv_path, inseridas, alteradas, ids_novos, ids_removidos, metricas, chunk_size=CHUNK_SIZE):
+    """Upsert das linhas novas, update (por id_bubble_user) das alteradas e remoção das que sumiram.
+
+    users não tem chave única em id_bubble_user: as novas vão em upsert por email sem
+    atualização (um usuário que já está no banco, por exemplo na primeira sincronização
+    sem índice, é ignorado em vez de gerar 409). Para as alteradas a chave primária é
+    buscada pelo id_bubble_user e o update vai em lotes, como upsert por id; sem as colunas
+    de padrão fixo (COLUNAS_SO_INSERCAO), que sobrescreveriam o tipo definido no Supabase.
+    Uma alterada que não está no banco é inserida como as novas.
+    """
+    from import_users import CONFLITO_USERS, COLUNAS_SO_INSERCAO, normalizar_usuarios, ler_csv_usuarios, para_registros
+
+    def preparar(linhas):
+        registros = []
+        for df in _reler(csv_path, linhas['linha'].to_numpy(), ler_csv_usuarios, chunk_size):
+            registros += para_registros(normalizar_usuarios(df))
+        return registros
+
+    def inserir(lote):
+        supabase.table('users').upsert(lote, on_conflict=CONFLITO_USERS, ignore_duplicates=True).execute()
+
+    def atualizar(lote):
+        supabase.table('users').upsert(lote, on_conflict='id').execute()
+
+    novos, alteracoes = preparar(inseridas), []
+    registros = preparar(alteradas)
+    ids = _ids_por_bubble([registro['id_bubble_user'] for registro in registros], metricas)
+    for registro in registros:
+        if registro['id_bubble_user'] not in ids:
+            novos.append(registro)
+            continue
+        alteracao = {coluna: valor for coluna, valor in registro.items() if coluna not in COLUNAS_SO_INSERCAO}
+        # id_bubble_user não é único: todas as linhas com o ID recebem a alteração, como no update por filtro
+        alteracoes += [{'id': id_user, **alteracao} for id_user in ids[registro['id_bubble_user']]]
+
+    falhas = {registro['id_bubble_user'] for registro, _ in _gravar('users', novos, inserir, metricas)}
+    falhas |= {registro['id_bubble_user'] for registro, _ in _gravar('users', alteracoes, atualizar, metricas)}
+    return falhas, set(_remover('users', 'id_bubble_user', ids_removidos, metricas))
+
+def aplicar_aulas_assistidas(inseridos, removidos, metricas):
+    """Upsert dos pares novos e remoção dos que sumiram, com os IDs do Bubble resolvidos pelo cache.
+
+    `inseridos`/`removidos` são listas de (id_aula_bubble, id_bubble_usuario). Pares novos
+    com aula ou usuário ainda inexistente no Supabase contam como falha (e voltam na
+    próxima sincronização); pares removidos que não resolvem não têm o que apagar.
+    """
+    from aulas_assistidas import CONFLITO_AULAS_ASSISTIDAS, resolver_ids
+
+    aulas = {aula for aula, _ in inseridos + removidos}
+    usuarios = {usuario for _, usuario in inseridos + removidos}
+    with metricas.fase('resolver'):
+        aulas_map, _ = resolver_ids('aulas', 'id_bubble_aula', 'id_aula', aulas)
+        usuarios_map, _ = resolver_ids('usuarios', 'id_bubble_usuario', 'id_usuario', usuarios)
+
+    registros, falhas = [], set()
+    for aula, usuario in inseridos:
+        if aula in aulas_map and usuario in usuarios_map:
+            registros.append({'id_aula': aulas_map[aula], 'id_usuario': usuarios_map[usuario],
+                              'par': (aula, usuario)})
+        else:
+            falhas.add((aula, usuario))
+    metricas.contar('ignoradas', len(falhas))
+
+    def enviar(lote):
+        supabase.table('aulas_assistidas')\
+            .upsert([{'id_aula': r['id_aula'], 'id_usuario': r['id_usuario']} for r in lote],
+                    on_conflict=CONFLITO_AULAS_ASSISTIDAS, ignore_duplicates=True)\
+            .execute()
+
+    falhas |= {registro['par'] for registro, _ in _gravar('aulas_assistidas', registros, enviar, metricas)}
+
+    # Um delete por aula: id_aula = X AND id_usuario IN (...)
+    por_aula = {}
+    for aula, usuario in removidos:
+        if aula in aulas_map and usuario in usuarios_map:
+            por_aula.setdefault(aula, []).append(usuario)
+    falhas_remocao = set()
+    for aula, lista in por_aula.items():
+        for i in range(0, len(lista), LOTE_REMOCAO):
+            lote = lista[i:i + LOTE_REMOCAO]
+            try:
+                with metricas.fase('remover'):
+                    resposta = supabase.table('aulas_assistidas').delete()\
+                        .eq('id_aula', aulas_map[aula])\
+                        .in_('id_usuario', [usuarios_map[usuario] for usuario in lote])\
+                        .execute()
+                metricas.contar('removidas', len(resposta.data or []))
+            except Exception as e:
+                metricas.falha(f"Erro ao remover {len(lote)} pares da aula {aula}: {str(e)}", len(lote))
+                falhas_remocao |= {(aula, usuario) for usuario in lote}
+    return falhas, falhas_remocao
+
+def _marcar(indice, textos, falhas):
+    """Máscara das linhas de `indice` cujo texto (ID ou par) está em `falhas`."""
+    import numpy as np
+    return np.array([texto in falhas for texto in textos], dtype=bool) if falhas else np.zeros(len(indice), dtype=bool)
+
+def sincronizar(nome, csv_path, indexar=False, simular=False, forcar_remocoes=False, diretorio=INDICE_DIR,
+                chunk_size=CHUNK_SIZE):
+    """Compara a exportação `csv_path` com o índice da anterior e aplica só as diferenças.
+
+    As linhas são classificadas em inseridas, alteradas (hash do conteúdo diferente) e
+    removidas; só elas são relidas, preparadas como no script de importação e gravadas.
+    Sem índice anterior tudo conta como inserido (uma importação completa). Com `indexar`
+    o índice é gravado sem escrever nada (para um banco que já reflete esta exportação);
+    com `simular` só a classificação é mostrada. O índice novo só substitui o anterior no
+    final, e as linhas que falharam ficam nele como estavam, para voltar na próxima execução.
+    """
+    import pandas as pd
+
+    exportacao = EXPORTACOES[nome]
+    chave = colunas_chave(exportacao)
+    metricas = Metricas(f"delta_{nome}")
+    metricas.instrumentar_cliente(supabase)
+    try:
+        with metricas.fase('indexar'):
+            novo, outros = indexar_pares(csv_path) if exportacao.chave is None else \
+                indexar_linhas(exportacao, csv_path, chunk_size)
+        metricas.contar('lidas', len(novo))
+        if indexar:
+            gravar_indice(exportacao, novo, outros, diretorio)
+            print(f"Índice de {nome} gravado com {len(novo)} linhas; nada foi enviado ao Supabase.")
+            return metricas.ok
+
+        carregado = carregar_indice(exportacao, diretorio)
+        if carregado is None:
+            print(f"Sem índice anterior de {nome}: todas as linhas contam como inseridas")
+            anterior, outros_anteriores = novo.iloc[0:0][chave + ['hash']], {lado: [] for lado in exportacao.lados}
+        else:
+            anterior, outros_anteriores = carregado
+        for lado in exportacao.lados:
+            _alinhar_outros(novo, lado, outros[lado], outros_anteriores[lado])
+
+        with metricas.fase('comparar'):
+            inseridas, alteradas, removidas = comparar(exportacao, anterior, novo)
+        for contador, linhas in (('inseridas', inseridas), ('alteradas', alteradas), ('a_remover', removidas)):
+            metricas.contar(contador, len(linhas))
+        print(f"{nome}: {len(novo)} linhas na exportação | inseridas: {len(inseridas)} | "
+              f"alteradas: {len(alteradas)} | removidas: {len(removidas)}")
+        if simular:
+            return metricas.ok
+        if len(removidas) > MAX_FRACAO_REMOVIDAS * len(anterior) and not forcar_remocoes:
+            metricas.erro(f"Abortado: {len(removidas)} de {len(anterior)} linhas sumiram da exportação "
+                  f"(limite {MAX_FRACAO_REMOVIDAS:.0%}). Confira o arquivo ou use --forcar-remocoes.")
+            return metricas.ok
+
+        if exportacao.chave is None:
+            par = lambda indice: list(zip(_textos(indice, 'aula', outros_anteriores),
+                                          _textos(indice, 'usuario', outros_anteriores)))
+            textos_novos, textos_removidos = par(inseridas), par(removidas)
+            falhas, falhas_remocao = aplicar_aulas_assistidas(textos_novos, textos_removidos, metricas)
+        else:
+            textos_novos = _textos(pd.concat([inseridas, alteradas]), 'id', outros_anteriores)
+            textos_removidos = _textos(removidas, 'id', outros_anteriores)
+            aplicar = aplicar_membros if nome == 'membros' else aplicar_users
+            falhas, falhas_remocao = aplicar(csv_path, inseridas, alteradas, textos_novos, textos_removidos,
+                                             metricas, chunk_size)
+
+        # Índice final: o novo, menos as linhas que falharam, mais a versão anterior delas
+        delta = pd.concat([inseridas, alteradas]) if exportacao.chave is not None else inseridas
+        falhou = delta[_marcar(delta, textos_novos, falhas)][chave]
+        final = novo.merge(falhou, on=chave, how='left', indicator=True)
+        final = final.loc[final['_merge'] == 'left_only', chave + ['hash']]
+        manter = pd.concat([falhou, removidas[_marcar(removidas, textos_removidos, falhas_remocao)][chave]])
+        final = pd.concat([final, anterior.merge(manter, on=chave)], ignore_index=True)
+        gravar_indice(exportacao, final, outros_anteriores, diretorio)
+
+        print(f"\nSincronização concluída! Gravadas: {metricas.contadores['gravadas']} | "
+              f"Removidas: {metricas.contadores['removidas']} | Erros: {metricas.contadores['falhas']}")
+    except Exception as e:
+        metricas.erro(f"Erro durante a sincronização: {str(e)}")
+    finally:
+        metricas.finalizar(f"{csv_path}.delta.metricas.json")
+    return metricas.ok
+
+if __name__ == "__main__":
+    # Uso: python sincronizar_delta.py membros|users|aulas_assistidas arquivo.csv [--indexar] [--simular]
+    #      [--forcar-remocoes] [--profile]
+    parser = argparse.ArgumentParser(description="Aplica só o que mudou entre duas exportações do Bubble")
+    parser.add_argument('exportacao', choices=sorted(EXPORTACOES), help="Exportação (tabela de destino)")
+    parser.add_argument('csv', help="Exportação nova (CSV separado por ;)")
+    parser.add_argument('--indexar', action='store_true',
+                        help="Só grava o índice desta exportação (o banco já está em dia com ela)")
+    parser.add_argument('--simular', action='store_true', help="Mostra inseridas/alteradas/removidas sem gravar")
+    parser.add_argument('--forcar-remocoes', action='store_true',
+                        help=f"Aplica as remoções mesmo acima de {MAX_FRACAO_REMOVIDAS:.0%} do índice anterior")
+    parser.add_argument('--dir', default=INDICE_DIR, help=f"Diretório dos índices (padrão: {INDICE_DIR})")
+    parser.add_argument('--profile', action='store_true', help="Executa sob cProfile e grava sincronizar_delta.prof")
+    args = parser.parse_args()
+
+    with perfilar(args.profile, 'sincronizar_delta'):
+        ok = sincronizar(args.exportacao, args.csv, args.indexar, args.simular, args.forcar_remocoes, args.dir)
+    sys.exit(0 if ok else 1)
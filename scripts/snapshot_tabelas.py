@@ -0,0 +1,164 @@
+import argparse
+import datetime
+import json
+import os
+
+from cliente_supabase import supabase
+from table_scan import escanear_tabela
+from metricas import Metricas, perfilar
+
+# Diretório dos snapshots (pode ser sobrescrito com SNAPSHOT_DIR)
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.snapshots'))
+# Tabelas exportadas: nome -> chave primária (paginação e mesclagem das linhas alteradas)
+TABELAS = {
+    'modulos': 'id',
+    'cursos': 'id',
+    'aulas': 'id',
+    'usuarios': 'id',
+    'membros': 'id',
+}
+# Coluna usada como marca d'água quando existe
+COLUNA_ATUALIZACAO = 'updated_at'
+# Janela relida antes da última marca (transações confirmadas fora de ordem de updated_at)
+MARGEM_ATUALIZACAO = datetime.timedelta(minutes=5)
+MANIFESTO = 'snapshot.json'
+
+def _parquet():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Os snapshots precisam do pacote pyarrow (pip install pyarrow)")
+    return pyarrow, pyarrow.parquet
+
+def caminho_snapshot(tabela, diretorio=SNAPSHOT_DIR):
+    return os.path.join(diretorio, f"{tabela}.parquet")
+
+def carregar_manifesto(diretorio=SNAPSHOT_DIR):
+    """Estado de cada tabela: marca d'água, tipo da marca, linhas e horário da última atualização."""
+    caminho = os.path.join(diretorio, MANIFESTO)
+    if not os.path.exists(caminho):
+        return {}
+    with open(caminho, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+def _gravar_manifesto(manifesto, diretorio):
+    caminho = os.path.join(diretorio, MANIFESTO)
+    with open(f"{caminho}.tmp", 'w', encoding='utf-8') as file:
+        json.dump(manifesto, file, indent=2, ensure_ascii=False)
+    os.replace(f"{caminho}.tmp", caminho)
+
+def ler_snapshot(tabela, colunas=None, diretorio=SNAPSHOT_DIR):
+    """Lê o snapshot local de `tabela` como DataFrame (arquivo mapeado em memória, só as `colunas` pedidas)."""
+    _, pq = _parquet()
+    return pq.read_table(caminho_snapshot(tabela, diretorio), columns=colunas, memory_map=True).to_pandas()
+
+def colunas_snapshot(tabela, diretorio=SNAPSHOT_DIR):
+    """Colunas gravadas no snapshot de `tabela` (só lê o esquema do arquivo); None se não houver snapshot."""
+    caminho = caminho_snapshot(tabela, diretorio)
+    if not os.path.exists(caminho):
+        return None
+    _, pq = _parquet()
+    return pq.read_schema(caminho).names
+
+def _marca(df, chave):
+    """Próxima marca d'água: maior updated_at, ou a maior chave quando ela é numérica (crescente)."""
+    import pandas as pd
+
+    if df.empty:
+        return None, None
+    if COLUNA_ATUALIZACAO in df.columns:
+        datas = pd.to_datetime(df[COLUNA_ATUALIZACAO], utc=True, errors='coerce', format='ISO8601')
+        if datas.notna().any():
+            return datas.max().isoformat(), COLUNA_ATUALIZACAO
+    if pd.api.types.is_integer_dtype(df[chave]):
+        return int(df[chave].max()), 'chave'
+    # Chave UUID sem updated_at: não há como saber o que mudou, a próxima execução relê tudo
+    return None, None
+
+def atualizar_snapshot(tabela, chave='id', completo=False, diretorio=SNAPSHOT_DIR, metricas=None):
+    """Atualiza o snapshot Parquet de `tabela` e devolve o estado gravado no manifesto.
+
+    Na primeira execução (ou com `completo=True`) a tabela inteira é lida. Depois só
+    vêm as linhas com updated_at a partir da última marca (menos MARGEM_ATUALIZACAO)
+    ou, sem updated_at, as de chave numérica maior que a última; elas substituem as
+    versões antigas pela chave. Linhas apagadas no Supabase só somem com `completo=True`.
+    """
+    import pandas as pd
+
+    pa, pq = _parquet()
+    metricas = metricas or Metricas('snapshot_tabelas')
+    os.makedirs(diretorio, exist_ok=True)
+    manifesto = carregar_manifesto(diretorio)
+    estado = manifesto.get(tabela) or {}
+    caminho = caminho_snapshot(tabela, diretorio)
+
+    filtro = None
+    incremental = not completo and os.path.exists(caminho) and estado.get('marca') is not None
+    if incremental and estado['tipo_marca'] == COLUNA_ATUALIZACAO:
+        desde = datetime.datetime.fromisoformat(estado['marca']) - MARGEM_ATUALIZACAO
+        filtro = lambda q: q.gte(COLUNA_ATUALIZACAO, desde.isoformat())
+    elif incremental:
+        filtro = lambda q: q.gt(chave, estado['marca'])
+
+    inicio = datetime.datetime.now(datetime.timezone.utc)
+    with metricas.fase(f"ler {tabela}"):
+        linhas = list(metricas.iterar('ler', escanear_tabela(supabase, tabela, '*', chave=chave, filtro=filtro,
+                                                              prefetch=True)))
+    metricas.contar('lidas', len(linhas))
+    novas = pd.DataFrame.from_records(linhas)
+
+    with metricas.fase(f"gravar {tabela}"):
+        if incremental:
+            antigas = ler_snapshot(tabela, diretorio=diretorio)
+            if not novas.empty:
+                antigas = antigas[~antigas[chave].isin(novas[chave])]
+            df = pd.concat([antigas, novas], ignore_index=True) if not novas.empty else antigas
+        else:
+            df = novas
+        if not df.empty:
+            df = df.sort_values(chave, kind='stable', ignore_index=True)
+        # Grava ao lado e troca de uma vez: um leitor nunca vê o arquivo pela metade
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), f"{caminho}.tmp")
+        os.replace(f"{caminho}.tmp", caminho)
+
+    marca, tipo_marca = _marca(df, chave)
+    if marca is None and incremental:
+        marca, tipo_marca = estado['marca'], estado['tipo_marca']
+    estado = {
+        'marca': marca,
+        'tipo_marca': tipo_marca,
+        'linhas': len(df),
+        'alteradas': len(novas),
+        'modo': 'incremental' if incremental else 'completo',
+        'atualizado_em': inicio.isoformat(),
+    }
+    manifesto[tabela] = estado
+    _gravar_manifesto(manifesto, diretorio)
+    metricas.contar('gravadas', len(novas))
+    print(f"{tabela}: {len(novas)} linhas {'alteradas' if incremental else 'lidas'}, {len(df)} no snapshot")
+    return estado
+
+def atualizar_snapshots(tabelas=None, completo=False, diretorio=SNAPSHOT_DIR):
+    """Atualiza os snapshots de `tabelas` (padrão: todas de TABELAS)."""
+    metricas = Metricas('snapshot_tabelas')
+    metricas.instrumentar_cliente(supabase)
+    estados = {}
+    try:
+        for tabela in tabelas or list(TABELAS):
+            estados[tabela] = atualizar_snapshot(tabela, TABELAS.get(tabela, 'id'), completo, diretorio, metricas)
+        return estados
+    finally:
+        metricas.finalizar(os.path.join(diretorio, 'snapshot_tabelas.metricas.json'))
+
+if __name__ == "__main__":
+    # Uso: python snapshot_tabelas.py [tabela ...] [--completo] [--dir DIR] [--profile]
+    parser = argparse.ArgumentParser(description="Exporta as tabelas do Supabase para snapshots Parquet locais")
+    parser.add_argument('tabelas', nargs='*', help=f"Tabelas (padrão: {', '.join(TABELAS)})")
+    parser.add_argument('--completo', action='store_true', help="Relê as tabelas inteiras (também remove linhas apagadas)")
+    parser.add_argument('--dir', default=SNAPSHOT_DIR, help=f"Diretório dos snapshots (padrão: {SNAPSHOT_DIR})")
+    parser.add_argument('--profile', action='store_true', help="Executa sob cProfile e grava snapshot_tabelas.prof")
+    args = parser.parse_args()
+
+    with perfilar(args.profile, 'snapshot_tabelas'):
+        atualizar_snapshots(args.tabelas, args.completo, args.dir)
@@ -1,55 +1,27 @@
-import os
-from dotenv import load_dotenv
-from supabase import create_client, Client
+import sys
+from aplicar_migracoes import aplicar_pendentes
 
-# Carrega as variáveis de ambiente
-load_dotenv()
+# Migração que cria e preenche usuarios.id_usuario
+MIGRACAO_ID_USUARIO = '20240328_usuarios_id_usuario'
 
-# Configuração do cliente Supabase
-url: str = os.environ.get("VITE_SUPABASE_URL")
-key: str = os.environ.get("VITE_SUPABASE_ANON_KEY")
-supabase: Client = create_client(url, key)
+def adicionar_coluna_id_usuario(conninfo=None):
+    """Aplica só a migração que cria a coluna id_usuario.
 
-def adicionar_coluna_id_usuario():
+    A coluna, o preenchimento em lotes e a restrição de unicidade agora estão em
+    database/migrations/20240328_usuarios_id_usuario.sql, registrada em
+    migracoes.aplicadas como as demais (requer SUPABASE_DB_URL). As migrações
+    anteriores não são executadas: para registrá-las em um banco existente use
+    `python aplicar_migracoes.py --baseline --ate <versão>`.
+    """
     try:
-        # Adiciona a coluna id_usuario na tabela usuarios
         print("Adicionando coluna id_usuario...")
-        response_add_column = supabase.postgrest.post("/rpc", json={
-            "sql": """
-                ALTER TABLE usuarios
-                ADD COLUMN IF NOT EXISTS id_usuario UUID DEFAULT gen_random_uuid();
-            """
-        })
-        if response_add_column.status_code != 200:
-            raise Exception(f"Erro ao adicionar coluna: {response_add_column.json()}")
-
-        # Preenche os registros existentes
-        print("Preenchendo registros existentes com UUIDs...")
-        response_update = supabase.postgrest.post("/rpc", json={
-            "sql": """
-                UPDATE usuarios
-                SET id_usuario = gen_random_uuid()
-                WHERE id_usuario IS NULL;
-            """
-        })
-        if response_update.status_code != 200:
-            raise Exception(f"Erro ao atualizar registros: {response_update.json()}")
-
-        # Adiciona restrição de unicidade
-        print("Adicionando restrição de unicidade na coluna id_usuario...")
-        response_add_constraint = supabase.postgrest.post("/rpc", json={
-            "sql": """
-                ALTER TABLE usuarios
-                ADD CONSTRAINT unique_id_usuario UNIQUE (id_usuario);
-            """
-        })
-        if response_add_constraint.status_code != 200:
-            raise Exception(f"Erro ao adicionar restrição: {response_add_constraint.json()}")
-
+        aplicar_pendentes(conninfo, somente=[MIGRACAO_ID_USUARIO])
         print("Coluna id_usuario adicionada e preenchida com sucesso!")
+        return True
 
     except Exception as e:
-        print(f"Erro ao adicionar ou preencher a coluna: {str(e)}")
+        print(f"Erro ao adicionar ou preencher a coluna: {str(e)}", file=sys.stderr)
+        return False
 
 if __name__ == "__main__":
-    adicionar_coluna_id_usuario()
+    sys.exit(0 if adicionar_coluna_id_usuario() else 1)
@@ -0,0 +1,46 @@
+from concurrent.futures import ThreadPoolExecutor
+
+# Linhas por página (mantenha abaixo do max-rows do PostgREST)
+PAGE_SIZE = 1000
+
+def _buscar_pagina(supabase, tabela, colunas, chave, page_size, filtro, apos):
+    query = supabase.table(tabela).select(colunas).order(chave).limit(page_size)
+    if apos is not None:
+        query = query.gt(chave, apos)
+    if filtro:
+        query = filtro(query)
+    return query.execute().data or []
+
+def escanear_tabela(supabase, tabela, colunas='*', chave='id', page_size=PAGE_SIZE, filtro=None, prefetch=False):
+    """Percorre uma tabela inteira com paginação por chave (keyset) e devolve as linhas uma a uma.
+
+    Cada página é `WHERE chave > última_chave ORDER BY chave LIMIT page_size`, então o
+    custo por página é constante e nenhuma linha é perdida pelo limite de max-rows.
+    `chave` deve ser única e estar entre as `colunas`. `filtro` recebe a query e pode
+    acrescentar condições (ex.: `lambda q: q.is_('id_modulo', 'null')`). Com
+    `prefetch=True` a próxima página é buscada em segundo plano enquanto a atual é consumida.
+    """
+    if colunas != '*' and chave not in [c.strip() for c in colunas.split(',')]:
+        colunas = f"{chave}, {colunas}"
+
+    buscar = lambda apos: _buscar_pagina(supabase, tabela, colunas, chave, page_size, filtro, apos)
+
+    if not prefetch:
+        apos = None
+        while True:
+            pagina = buscar(apos)
+            yield from pagina
+            if len(pagina) < page_size:
+                return
+            apos = pagina[-1][chave]
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pagina = buscar(None)
+        while True:
+            proxima = None
+            if len(pagina) == page_size:
+                proxima = executor.submit(buscar, pagina[-1][chave])
+            yield from pagina
+            if proxima is None:
+                return
+            pagina = proxima.result()
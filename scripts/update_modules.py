@@ -1,66 +1,77 @@
-import os
-from supabase import create_client, Client
-from dotenv import load_dotenv
-
-# Carregar variáveis de ambiente
-load_dotenv()
-
-# Configuração do Supabase
-url = os.getenv("VITE_SUPABASE_URL")
-key = os.getenv("VITE_SUPABASE_ANON_KEY")
-
-if not url or not key:
-    raise ValueError("As variáveis de ambiente VITE_SUPABASE_URL e VITE_SUPABASE_ANON_KEY devem estar definidas")
-
-supabase: Client = create_client(url, key)
+import sys
+from cliente_supabase import supabase
+from backfill_rpc import executar_backfill_rpc
+from table_scan import escanear_tabela
+from metricas import Metricas, perfilar
 
 def update_modules():
     """Atualiza os IDs dos cursos na tabela de módulos."""
+    from bubble_ids import MapaBubble
+    metricas = Metricas('update_modules')
+    metricas.instrumentar_cliente(supabase)
     try:
-        # Verificar os módulos que precisam de atualização
-        response = supabase.table('modulos').select('*').execute()
-        if hasattr(response, 'error') and response.error:
-            print(f"Erro ao buscar módulos: {response.error}")
-            return
-        
-        total_modules = len(response.data)
-        print(f"Total de módulos encontrados: {total_modules}")
-
-        # Buscar todos os cursos
-        response = supabase.table('cursos').select('*').execute()
-        if hasattr(response, 'error') and response.error:
-            print(f"Erro ao buscar cursos: {response.error}")
-            return
-        
-        total_courses = len(response.data)
-        print(f"Total de cursos encontrados: {total_courses}")
+        # Tabela ordenada id_bubble_curso -> id (bubble_ids) para facilitar a busca (só as colunas usadas)
+        with metricas.fase('resolver'):
+            courses_map = MapaBubble({
+                course['id_bubble_curso']: course['id']
+                for course in escanear_tabela(supabase, 'cursos', 'id, id_bubble_curso')
+            })
+        print(f"Total de cursos encontrados: {len(courses_map)}")
 
-        # Criar um dicionário de cursos para facilitar a busca
-        courses_dict = {course['id_bubble_curso']: course['id'] for course in response.data}
-
-        # Atualizar cada módulo
-        updated_count = 0
-        for module in response.data:
-            if module['id_bubble_curso'] in courses_dict:
-                course_id = courses_dict[module['id_bubble_curso']]
-                response = supabase.table('modulos')\
-                    .update({'id_curso': course_id})\
-                    .eq('id', module['id'])\
-                    .execute()
+        # Percorrer os módulos página a página e atualizar cada um
+        modules = escanear_tabela(supabase, 'modulos', 'id, id_bubble_curso', prefetch=True)
+        for module in metricas.iterar('ler', modules):
+            metricas.contar('lidas')
+            if module['id_bubble_curso'] in courses_map:
+                metricas.contar('resolvidas')
+                course_id = courses_map[module['id_bubble_curso']]
+                with metricas.fase('gravar'):
+                    response = supabase.table('modulos')\
+                        .update({'id_curso': course_id})\
+                        .eq('id', module['id'])\
+                        .execute()
                 
                 if hasattr(response, 'error') and response.error:
-                    print(f"Erro ao atualizar módulo {module['id']}: {response.error}")
+                    metricas.falha(f"Erro ao atualizar módulo {module['id']}: {response.error}")
                 else:
-                    updated_count += 1
+                    metricas.contar('gravadas')
             else:
-                print(f"Aviso: Curso não encontrado para o módulo {module['id']} (id_bubble_curso: {module['id_bubble_curso']})")
+                metricas.contar('ignoradas', exemplo=f"Curso não encontrado para o módulo {module['id']} "
+                                                     f"(id_bubble_curso: {module['id_bubble_curso']})")
 
+        total_modules = metricas.contadores['lidas']
+        updated_count = metricas.contadores['gravadas']
         print(f"\nAtualização concluída!")
+        print(f"Total de módulos encontrados: {total_modules}")
         print(f"Total de módulos atualizados: {updated_count}")
         print(f"Módulos não atualizados: {total_modules - updated_count}")
 
     except Exception as e:
-        print(f"Erro inesperado: {e}")
+        metricas.erro(f"Erro inesperado: {e}")
+    finally:
+        metricas.finalizar()
+    return metricas.ok
+
+def update_modules_set_based():
+    """Atualiza os IDs dos cursos com UPDATE ... FROM no Postgres, em lotes de chaves."""
+    metricas = Metricas('update_modules')
+    metricas.instrumentar_cliente(supabase)
+    try:
+        with metricas.fase('gravar'):
+            total = executar_backfill_rpc(supabase, 'backfill_modulos_id_curso', {'p_coluna_curso': 'id'})
+        metricas.contar('gravadas', total)
+        print("\nAtualização concluída!")
+        print(f"Total de módulos atualizados: {total}")
+    except Exception as e:
+        metricas.erro(f"Erro inesperado: {e}")
+    finally:
+        metricas.finalizar()
+    return metricas.ok
 
 if __name__ == "__main__":
-    update_modules()
+    with perfilar('--profile' in sys.argv[1:], 'update_modules'):
+        if '--set-based' in sys.argv[1:]:
+            ok = update_modules_set_based()
+        else:
+            ok = update_modules()
+    sys.exit(0 if ok else 1)
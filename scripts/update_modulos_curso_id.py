@@ -1,73 +1,134 @@
-import os
-from dotenv import load_dotenv
-from supabase import create_client, Client
+import sys
+from cliente_supabase import supabase
+from bubble_cache import BubbleIdCache
+from backfill_rpc import executar_backfill_rpc
+from async_writer import CONCURRENCY, Operacao, escrever
+from table_scan import escanear_tabela
+from metricas import Metricas, perfilar
 
-# Carrega as variáveis de ambiente
-load_dotenv()
-
-# Configuração do cliente Supabase
-url: str = os.environ.get("VITE_SUPABASE_URL")
-key: str = os.environ.get("VITE_SUPABASE_ANON_KEY")
-supabase: Client = create_client(url, key)
+cache = BubbleIdCache(supabase)
 
 def update_modulos_curso_id():
+    metricas = Metricas('update_modulos_curso_id')
+    metricas.instrumentar_cliente(supabase)
     try:
-        # Busca todos os módulos com id_bubble_curso definidos
-        response = supabase.table('modulos').select('id_bubble_modulo, id_bubble_curso, id_curso').execute()
-
-        # Verifica se a consulta retornou dados
-        if not response.data:
-            print(f"Erro ou nenhum módulo encontrado. Resposta: {response}")
-            return
-
-        modulos = response.data
-        print(f"Total de módulos encontrados: {len(modulos)}")
-
-        for modulo in modulos:
+        # Carrega o mapeamento id_bubble_curso -> id_curso de uma vez
+        with metricas.fase('resolver'):
+            cache.aquecer('cursos', 'id_bubble_curso', 'id_curso')
+
+        # Percorre os módulos página a página (memória constante)
+        modulos = escanear_tabela(supabase, 'modulos', 'id_bubble_modulo, id_bubble_curso, id_curso', prefetch=True)
+        for modulo in metricas.iterar('ler', modulos):
+            metricas.contar('lidas')
             id_bubble_modulo = modulo.get('id_bubble_modulo')
             id_bubble_curso = modulo.get('id_bubble_curso')
             id_curso_existente = modulo.get('id_curso')
 
             # Verifica se os campos necessários estão disponíveis
             if not id_bubble_modulo:
-                print("Módulo encontrado sem id_bubble_modulo. Ignorando...")
+                metricas.contar('ignoradas', exemplo="Módulo encontrado sem id_bubble_modulo")
                 continue
 
             if not id_bubble_curso:
-                print(f"Módulo {id_bubble_modulo} não possui id_bubble_curso. Ignorando...")
+                metricas.contar('ignoradas', exemplo=f"Módulo {id_bubble_modulo} não possui id_bubble_curso")
                 continue
 
             if id_curso_existente:
-                print(f"Módulo {id_bubble_modulo} já possui id_curso definido ({id_curso_existente}). Ignorando...")
+                metricas.contar('ignoradas')
                 continue
 
-            # Busca o curso correspondente ao id_bubble_curso
-            curso_response = supabase.table('cursos')\
-                .select('id_curso')\
-                .eq('id_bubble_curso', id_bubble_curso)\
-                .execute()
+            # Busca o curso correspondente ao id_bubble_curso no cache
+            with metricas.fase('resolver'):
+                curso_id = cache.resolver('cursos', 'id_bubble_curso', 'id_curso', id_bubble_curso)
 
-            if not curso_response.data:
-                print(f"Nenhum curso encontrado para id_bubble_curso {id_bubble_curso}. Resposta: {curso_response}")
+            if not curso_id:
+                metricas.contar('ignoradas', exemplo=f"Nenhum curso encontrado para id_bubble_curso {id_bubble_curso}")
                 continue
+            metricas.contar('resolvidas')
 
-            cursos = curso_response.data
-            # Obtém o primeiro curso correspondente e atualiza o módulo
-            curso_id = cursos[0]['id_curso']
-            update_response = supabase.table('modulos')\
-                .update({'id_curso': curso_id})\
-                .eq('id_bubble_modulo', id_bubble_modulo)\
-                .execute()
+            # Atualiza o módulo com o curso encontrado
+            with metricas.fase('gravar'):
+                update_response = supabase.table('modulos')\
+                    .update({'id_curso': curso_id})\
+                    .eq('id_bubble_modulo', id_bubble_modulo)\
+                    .execute()
 
             if not update_response.data:
-                print(f"Erro ao atualizar módulo {id_bubble_modulo}. Resposta: {update_response}")
+                metricas.falha(f"Erro ao atualizar módulo {id_bubble_modulo}. Resposta: {update_response}")
             else:
-                print(f"Módulo {id_bubble_modulo} atualizado com sucesso. id_curso: {curso_id}")
+                metricas.contar('gravadas')
 
-        print("\nAtualização concluída!")
+        if not metricas.contadores['lidas']:
+            print("Erro ou nenhum módulo encontrado.")
+            return metricas.ok
+        print(f"\nAtualização concluída! Total de módulos encontrados: {metricas.contadores['lidas']}")
 
     except Exception as e:
-        print(f"Erro durante a execução: {str(e)}")
+        metricas.erro(f"Erro durante a execução: {str(e)}")
+    finally:
+        metricas.finalizar()
+    return metricas.ok
+
+def update_modulos_curso_id_set_based():
+    """Executa o mesmo backfill com UPDATE ... FROM no Postgres, em lotes de chaves."""
+    metricas = Metricas('update_modulos_curso_id')
+    metricas.instrumentar_cliente(supabase)
+    try:
+        with metricas.fase('gravar'):
+            total = executar_backfill_rpc(supabase, 'backfill_modulos_id_curso', {
+                'p_coluna_curso': 'id_curso',
+                'p_somente_nulos': True,
+            })
+        metricas.contar('gravadas', total)
+        print(f"\nAtualização concluída! Módulos atualizados: {total}")
+    except Exception as e:
+        metricas.erro(f"Erro durante a execução: {str(e)}")
+    finally:
+        metricas.finalizar()
+    return metricas.ok
+
+def update_modulos_curso_id_async(concorrencia=CONCURRENCY):
+    """Resolve os cursos pelo cache e envia os updates com `concorrencia` requisições simultâneas."""
+    metricas = Metricas('update_modulos_curso_id')
+    metricas.instrumentar_cliente(supabase)
+    try:
+        with metricas.fase('resolver'):
+            cache.aquecer('cursos', 'id_bubble_curso', 'id_curso')
+
+        def operacoes():
+            # Só os módulos ainda sem id_curso
+            modulos = escanear_tabela(supabase, 'modulos', 'id_bubble_modulo, id_bubble_curso',
+                                      filtro=lambda q: q.is_('id_curso', 'null'), prefetch=True)
+            for modulo in metricas.iterar('ler', modulos):
+                metricas.contar('lidas')
+                if not modulo.get('id_bubble_modulo') or not modulo.get('id_bubble_curso'):
+                    metricas.contar('ignoradas')
+                    continue
+                curso_id = cache.resolver('cursos', 'id_bubble_curso', 'id_curso', modulo['id_bubble_curso'])
+                if curso_id:
+                    metricas.contar('resolvidas')
+                    yield Operacao('modulos', 'update', {'id_curso': curso_id},
+                                   filtros={'id_bubble_modulo': modulo['id_bubble_modulo']})
+                else:
+                    metricas.contar('ignoradas')
+
+        resultado = escrever(operacoes(), concorrencia, ao_concluir=metricas.ao_concluir)
+        metricas.registrar_escrita(resultado)
+        for op, erro in resultado.falhas:
+            print(f"Erro ao atualizar módulo {op.filtros['id_bubble_modulo']}: {erro}")
+        print(f"\nAtualização concluída! {resultado.resumo()}")
+    except Exception as e:
+        metricas.erro(f"Erro durante a execução: {str(e)}")
+    finally:
+        metricas.finalizar()
+    return metricas.ok
 
 if __name__ == "__main__":
-    update_modulos_curso_id()
+    with perfilar('--profile' in sys.argv[1:], 'update_modulos_curso_id'):
+        if '--set-based' in sys.argv[1:]:
+            ok = update_modulos_curso_id_set_based()
+        elif '--async' in sys.argv[1:]:
+            ok = update_modulos_curso_id_async()
+        else:
+            ok = update_modulos_curso_id()
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,429 @@
+import argparse
+import datetime
+import os
+import re
+import sys
+from collections import namedtuple
+
+from dotenv import load_dotenv
+
+from aplicar_migracoes import dividir_passos, listar_migracoes
+from pg_copy import MIGRATIONS_DIR, conectar, tabelas_da_migracao, tem_indice_unico
+
+# Carrega as variáveis de ambiente (INDICES_DB_URL)
+load_dotenv()
+
+# Postgres local descartável usado quando --dsn e INDICES_DB_URL não são informados
+DSN_PADRAO = 'postgresql://postgres@localhost:5432/postgres'
+
+# Padrão de acesso de um script: tipo ('eq', 'in', 'keyset' ou 'upsert'), tabela, colunas e quem usa
+Consulta = namedtuple('Consulta', 'tipo tabela colunas scripts')
+
+CONSULTAS = [
+    # .eq() nos updates e buscas linha a linha
+    Consulta('eq', 'aulas', ('id',), ('atualizar_aula',)),
+    Consulta('eq', 'aulas', ('id_bubble_aula',), ('aulas_assistidas',)),
+    Consulta('eq', 'modulos', ('id',), ('update_modules',)),
+    Consulta('eq', 'modulos', ('id_bubble_modulo',),
+             ('preenche_modulos', 'update_modulos_curso_id', 'import_membros', 'backfill_aulas_id_modulo')),
+    Consulta('eq', 'cursos', ('id_bubble_curso',), ('backfill_modulos_id_curso',)),
+    Consulta('eq', 'usuarios', ('id_bubble_usuario',), ('aulas_assistidas',)),
+    # .in_() do BubbleIdCache.resolver_varios
+    Consulta('in', 'aulas', ('id_bubble_aula',), ('bubble_cache',)),
+    Consulta('in', 'modulos', ('id_bubble_modulo',), ('bubble_cache',)),
+    Consulta('in', 'cursos', ('id_bubble_curso',), ('bubble_cache',)),
+    Consulta('in', 'usuarios', ('id_bubble_usuario',), ('bubble_cache',)),
+    Consulta('in', 'aulas_assistidas', ('id_usuario',), ('progresso_usuarios',)),
+    # Paginação por chave (table_scan.escanear_tabela e funções de backfill)
+    Consulta('keyset', 'aulas', ('id',), ('atualizar_aula', 'backfill_aulas_id_modulo')),
+    Consulta('keyset', 'aulas', ('id_bubble_aula',), ('bubble_cache',)),
+    Consulta('keyset', 'modulos', ('id',),
+             ('preenche_modulos', 'update_modules', 'update_modulos_curso_id', 'import_membros',
+              'backfill_modulos_id_curso')),
+    Consulta('keyset', 'modulos', ('id_bubble_modulo',), ('bubble_cache', 'backfill_chaves')),
+    Consulta('keyset', 'cursos', ('id',), ('update_modules',)),
+    Consulta('keyset', 'cursos', ('id_bubble_curso',), ('bubble_cache',)),
+    Consulta('keyset', 'usuarios', ('id_bubble_usuario',), ('bubble_cache',)),
+    Consulta('keyset', 'usuarios', ('email',), ('backfill_chaves',)),
+    Consulta('keyset', 'aulas_assistidas', ('id',), ('aulas_assistidas', 'progresso_usuarios')),
+    # on_conflict dos upserts (exige índice único com exatamente essas colunas)
+    Consulta('upsert', 'modulos', ('id_bubble_modulo',), ('preenche_modulos',)),
+    Consulta('upsert', 'membros', ('id_bubble_membro',), ('import_membros',)),
+    Consulta('upsert', 'aulas_assistidas', ('id_aula', 'id_usuario'), ('aulas_assistidas',)),
+    Consulta('upsert', 'progresso_usuarios', ('id_usuario', 'escopo', 'id_bubble'), ('progresso_usuarios',)),
+]
+
+# IDs do Bubble que identificam uma linha: além de indexados, precisam ser únicos
+CHAVES_UNICAS = [
+    ('aulas', ('id_bubble_aula',)),
+    ('modulos', ('id_bubble_modulo',)),
+    ('cursos', ('id_bubble_curso',)),
+    ('usuarios', ('id_bubble_usuario',)),
+    ('membros', ('id_bubble_membro',)),
+]
+
+# Objetos do Supabase referenciados pelas migrações, para carregá-las em um Postgres puro
+SQL_SUPABASE = """
+DO $$
+BEGIN
+    CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
+EXCEPTION WHEN OTHERS THEN
+    -- Postgres sem contrib: equivalente em SQL
+    CREATE OR REPLACE FUNCTION public.uuid_generate_v4() RETURNS UUID LANGUAGE sql AS 'SELECT gen_random_uuid()';
+END $$;
+CREATE SCHEMA IF NOT EXISTS auth;
+CREATE TABLE IF NOT EXISTS auth.users (id UUID PRIMARY KEY);
+CREATE OR REPLACE FUNCTION auth.uid() RETURNS UUID LANGUAGE sql STABLE AS 'SELECT NULL::UUID';
+CREATE OR REPLACE FUNCTION auth.role() RETURNS TEXT LANGUAGE sql STABLE AS 'SELECT NULL::TEXT';
+DO $$
+DECLARE
+    papel TEXT;
+BEGIN
+    FOREACH papel IN ARRAY ARRAY['anon', 'authenticated', 'service_role'] LOOP
+        IF NOT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = papel) THEN
+            EXECUTE format('CREATE ROLE %I', papel);
+        END IF;
+    END LOOP;
+END $$;
+"""
+
+_TABELA_AUSENTE = re.compile(r'relation "(?:public\.)?(\w+)" does not exist')
+_COLUNA_AUSENTE = re.compile(r'column (\w+)\.(\w+) does not exist')
+
+# tipo: 'seq_scan' / 'sem_indice' (nenhum índice com Index Cond na coluna), 'sem_unico' ou 'nao_verificado' (só no esqueleto)
+Problema = namedtuple('Problema', 'tipo tabela colunas scripts detalhe')
+
+def _sql_consulta(consulta):
+    """SQL equivalente ao que o PostgREST gera para o padrão, com parâmetros $n."""
+    coluna = consulta.colunas[0]
+    if consulta.tipo == 'eq':
+        return f"SELECT * FROM public.{consulta.tabela} WHERE {coluna} = $1"
+    if consulta.tipo == 'in':
+        return f"SELECT * FROM public.{consulta.tabela} WHERE {coluna} = ANY($1)"
+    if consulta.tipo == 'keyset':
+        return f"SELECT * FROM public.{consulta.tabela} WHERE {coluna} > $1 ORDER BY {coluna} LIMIT 1000"
+    raise ValueError(f"Consulta sem EXPLAIN: {consulta.tipo}")
+
+def _nos(plano):
+    yield plano
+    for filho in plano.get('Plans', []):
+        yield from _nos(filho)
+
+def _indices_com_condicao(plano, tabela, coluna):
+    """Índices do plano que leem `tabela` com uma Index Cond sobre `coluna`."""
+    mencao = re.compile(rf'\b{re.escape(coluna)}\b')
+    for no in _nos(plano):
+        if no['Node Type'] in ('Index Scan', 'Index Only Scan') and no.get('Relation Name') == tabela:
+            candidatos = [no]
+        elif no['Node Type'] == 'Bitmap Heap Scan' and no.get('Relation Name') == tabela:
+            candidatos = [filho for filho in _nos(no) if filho['Node Type'] == 'Bitmap Index Scan']
+        else:
+            continue
+        for candidato in candidatos:
+            if mencao.search(candidato.get('Index Cond', '')):
+                yield candidato['Index Name']
+
+def _coluna_lider(conn, indice):
+    """Primeira coluna do índice `indice` (de public)."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT a.attname
+            FROM pg_index i
+            JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+            WHERE i.indexrelid = to_regclass(%s)
+        """, (f"public.{indice}",))
+        linha = cur.fetchone()
+        return linha[0] if linha else None
+
+def explicar(conn, consulta):
+    """Plano genérico da consulta com seq scan desabilitado.
+
+    Com `enable_seqscan = off` o planner prefere qualquer índice a um Seq Scan, até
+    varrer inteiro um índice cuja primeira coluna é outra; por isso o padrão só conta
+    como indexado quando há uma Index Cond sobre a coluna em um índice que começa por
+    ela. Retorna (tipos de nó do plano que leem a tabela, índice que atende o padrão ou None).
+    """
+    with conn.cursor() as cur:
+        cur.execute(f"PREPARE verificar_indice AS {_sql_consulta(consulta)}")
+        try:
+            cur.execute("EXPLAIN (FORMAT JSON) EXECUTE verificar_indice(NULL)")
+            plano = cur.fetchone()[0][0]['Plan']
+        finally:
+            cur.execute("DEALLOCATE verificar_indice")
+    nos = [no['Node Type'] for no in _nos(plano) if no.get('Relation Name') == consulta.tabela]
+    coluna = consulta.colunas[0]
+    indice = next((indice for indice in _indices_com_condicao(plano, consulta.tabela, coluna)
+                   if _coluna_lider(conn, indice) == coluna), None)
+    return nos, indice
+
+def _colunas_existentes(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT table_name, column_name FROM information_schema.columns WHERE table_schema = 'public'")
+        existentes = {}
+        for tabela, coluna in cur.fetchall():
+            existentes.setdefault(tabela, set()).add(coluna)
+        return existentes
+
+def completar_esqueleto(conn, migrations_dir=MIGRATIONS_DIR):
+    """Cria como TEXT as tabelas e colunas usadas pelos scripts que as migrações não definem.
+
+    Assim o EXPLAIN roda mesmo com database/migrations incompleto; o que foi criado aqui
+    é devolvido para entrar no relatório. Tabelas novas ganham `id` UUID como chave primária.
+    Tabelas que alguma migração cria não viram esqueleto: a migração é repetida depois.
+    """
+    definidas = tabelas_da_migracao(migrations_dir)
+    necessarias = {}
+    for consulta in CONSULTAS:
+        necessarias.setdefault(consulta.tabela, set()).update(consulta.colunas)
+    for tabela, colunas in CHAVES_UNICAS:
+        necessarias.setdefault(tabela, set()).update(colunas)
+
+    existentes = _colunas_existentes(conn)
+    criadas = []
+    with conn.transaction():
+        with conn.cursor() as cur:
+            for tabela, colunas in sorted(necessarias.items()):
+                if tabela not in existentes and tabela in definidas:
+                    continue
+                if tabela not in existentes:
+                    _criar_tabela_esqueleto(cur, tabela)
+                    existentes[tabela] = {'id'}
+                    criadas.append(f"{tabela} (tabela)")
+                for coluna in sorted(colunas - existentes[tabela]):
+                    cur.execute(f"ALTER TABLE public.{tabela} ADD COLUMN {coluna} TEXT")
+                    criadas.append(f"{tabela}.{coluna}")
+    return criadas
+
+def _criar_tabela_esqueleto(cur, tabela):
+    cur.execute(f"CREATE TABLE public.{tabela} (id UUID PRIMARY KEY DEFAULT gen_random_uuid())")
+
+def carregar_migracoes(conn, migrations_dir=MIGRATIONS_DIR):
+    """Executa as migrações no banco local, cada uma em uma única transação.
+
+    Passos de backfill são pulados e CONCURRENTLY é removido (o banco está vazio).
+    Tabelas que a migração referencia mas nenhuma migração cria (só existem em produção)
+    viram esqueletos com `id` UUID e a migração é repetida; as que falharem por colunas
+    ausentes são repetidas de novo depois de `completar_esqueleto`.
+    Retorna (objetos criados no esqueleto, {versão: erro}).
+    """
+    import psycopg
+
+    criadas = []
+
+    def executar(migracao):
+        with open(migracao.path, 'r', encoding='utf-8') as file:
+            passos = [passo for passo in dividir_passos(file.read()) if passo.tipo != 'backfill']
+        while True:
+            try:
+                with conn.transaction():
+                    with conn.cursor() as cur:
+                        for passo in passos:
+                            cur.execute(re.sub(r'\bCONCURRENTLY\b', '', passo.sql))
+                return None
+            except psycopg.errors.UndefinedTable as e:
+                ausente = _TABELA_AUSENTE.search(str(e))
+                if not ausente or f"{ausente.group(1)} (tabela)" in criadas:
+                    return str(e).strip().splitlines()[0]
+                with conn.transaction():
+                    with conn.cursor() as cur:
+                        _criar_tabela_esqueleto(cur, ausente.group(1))
+                criadas.append(f"{ausente.group(1)} (tabela)")
+            except psycopg.errors.UndefinedColumn as e:
+                # Só completa tabelas criadas aqui; nas tabelas das migrações o erro é real
+                ausente = _COLUNA_AUSENTE.search(str(e))
+                if not ausente or f"{ausente.group(1)} (tabela)" not in criadas:
+                    return str(e).strip().splitlines()[0]
+                with conn.transaction():
+                    with conn.cursor() as cur:
+                        cur.execute(f"ALTER TABLE public.{ausente.group(1)} ADD COLUMN {ausente.group(2)} TEXT")
+                criadas.append(f"{ausente.group(1)}.{ausente.group(2)}")
+            except psycopg.Error as e:
+                return str(e).strip().splitlines()[0]
+
+    with conn.transaction():
+        with conn.cursor() as cur:
+            cur.execute(SQL_SUPABASE)
+    falhas = {}
+    for migracao in listar_migracoes(migrations_dir):
+        erro = executar(migracao)
+        if erro:
+            falhas[migracao] = erro
+    criadas.extend(completar_esqueleto(conn, migrations_dir))
+    for migracao in list(falhas):
+        erro = executar(migracao)
+        if erro:
+            falhas[migracao] = erro
+        else:
+            del falhas[migracao]
+    return criadas, {migracao.versao: erro for migracao, erro in falhas.items()}
+
+def _so_no_esqueleto(tabela, colunas, criadas):
+    """A tabela ou alguma das colunas só existe no esqueleto criado para o EXPLAIN?"""
+    return f"{tabela} (tabela)" in criadas or any(f"{tabela}.{coluna}" in criadas for coluna in colunas)
+
+def verificar(conn, criadas=()):
+    """Roda cada padrão de CONSULTAS e as CHAVES_UNICAS e devolve os problemas encontrados.
+
+    Padrões sobre tabelas ou colunas que só existem no esqueleto (`criadas`) não dizem
+    nada sobre o banco real (a tabela esqueleto tem `id` como chave primária e nenhum
+    outro índice) e voltam como 'nao_verificado' em vez de passar ou falhar.
+    """
+    with conn.cursor() as cur:
+        cur.execute("SET enable_seqscan = off")
+        cur.execute("SET plan_cache_mode = force_generic_plan")
+
+    problemas = []
+    for consulta in CONSULTAS:
+        if _so_no_esqueleto(consulta.tabela, consulta.colunas, criadas):
+            problemas.append(Problema('nao_verificado', consulta.tabela, consulta.colunas, consulta.scripts,
+                                      f"{consulta.tipo}: tabela ou coluna ausente das migrações"))
+            continue
+        if consulta.tipo == 'upsert':
+            if not tem_indice_unico(conn, consulta.tabela, consulta.colunas):
+                problemas.append(Problema('sem_unico', consulta.tabela, consulta.colunas, consulta.scripts,
+                                          "on_conflict sem índice único correspondente"))
+            continue
+        nos, indice = explicar(conn, consulta)
+        if indice is None:
+            tipo = 'seq_scan' if 'Seq Scan' in nos else 'sem_indice'
+            problemas.append(Problema(tipo, consulta.tabela, consulta.colunas, consulta.scripts,
+                                      f"{consulta.tipo}: {' + '.join(nos)} sem Index Cond em índice iniciado por "
+                                      f"{consulta.colunas[0]}"))
+
+    for tabela, colunas in CHAVES_UNICAS:
+        if _so_no_esqueleto(tabela, colunas, criadas):
+            problemas.append(Problema('nao_verificado', tabela, colunas, (), "unicidade: tabela ou coluna ausente das migrações"))
+        elif not tem_indice_unico(conn, tabela, colunas):
+            problemas.append(Problema('sem_unico', tabela, colunas, (), "ID do Bubble sem restrição de unicidade"))
+    return problemas
+
+def gerar_migracao(problemas):
+    """SQL de uma migração (formato do aplicar_migracoes) que cria os índices que faltam.
+
+    Colunas que precisam ser únicas ganham CREATE UNIQUE INDEX, precedido de uma
+    verificação que aborta com a lista de duplicados em vez de deixar um índice
+    inválido para trás. Os índices são criados com CONCURRENTLY, sem bloquear escritas.
+    Padrões não verificados (só no esqueleto) ficam de fora.
+    """
+    unicos, simples = {}, {}
+    for problema in problemas:
+        if problema.tipo == 'nao_verificado':
+            continue
+        alvo = (problema.tabela, problema.colunas)
+        if problema.tipo == 'sem_unico' or alvo in CHAVES_UNICAS:
+            unicos.setdefault(alvo, set()).update(problema.scripts)
+        else:
+            simples.setdefault(alvo, set()).update(problema.scripts)
+    simples = {alvo: scripts for alvo, scripts in simples.items() if alvo not in unicos}
+
+    partes = ["-- Índices para os padrões de acesso dos scripts de migração (gerado por scripts/verificar_indices.py).\n"
+              "-- Aplicar com scripts/aplicar_migracoes.py: os blocos autocommit rodam fora de transação.\n"]
+    for (tabela, colunas), scripts in sorted(unicos.items()):
+        nome, lista = f"uq_{tabela}_{'_'.join(colunas)}", ", ".join(colunas)
+        usado = f" (usado por {', '.join(sorted(scripts))})" if scripts else ""
+        partes.append(
+            f"-- {tabela}({lista}) único{usado}\n"
+            f"DO $$\n"
+            f"DECLARE\n"
+            f"    duplicados TEXT;\n"
+            f"BEGIN\n"
+            f"    SELECT string_agg(chave, ', ') INTO duplicados FROM (\n"
+            f"        SELECT concat_ws('/', {lista}) AS chave FROM public.{tabela}\n"
+            f"        WHERE ({lista}) IS NOT NULL\n"
+            f"        GROUP BY {lista} HAVING COUNT(*) > 1 LIMIT 20\n"
+            f"    ) d;\n"
+            f"    IF duplicados IS NOT NULL THEN\n"
+            f"        RAISE EXCEPTION '{tabela}({lista}) tem valores duplicados: %', duplicados;\n"
+            f"    END IF;\n"
+            f"END $$;\n\n"
+            f"-- migrar:autocommit\n"
+            f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {nome} ON public.{tabela} ({lista});\n"
+            f"-- migrar:fim\n"
+        )
+    for (tabela, colunas), scripts in sorted(simples.items()):
+        nome, lista = f"idx_{tabela}_{'_'.join(colunas)}", ", ".join(colunas)
+        partes.append(
+            f"-- {tabela}({lista}) (usado por {', '.join(sorted(scripts))})\n"
+            f"-- migrar:autocommit\n"
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {nome} ON public.{tabela} ({lista});\n"
+            f"-- migrar:fim\n"
+        )
+    return "\n".join(partes)
+
+def _banco_temporario(dsn):
+    """Cria um banco vazio no servidor de `dsn` e devolve (conninfo dele, função que o remove)."""
+    from psycopg.conninfo import make_conninfo
+
+    nome = f"verificar_indices_{os.getpid()}"
+    with conectar(dsn) as admin:
+        admin.autocommit = True
+        admin.execute(f"CREATE DATABASE {nome}")
+
+    def remover():
+        with conectar(dsn) as admin:
+            admin.autocommit = True
+            admin.execute(f"DROP DATABASE IF EXISTS {nome} WITH (FORCE)")
+
+    return make_conninfo(dsn, dbname=nome), remover
+
+def verificar_indices(dsn=None, migrations_dir=MIGRATIONS_DIR):
+    """Carrega as migrações em um banco temporário, verifica os padrões e o remove no final.
+
+    Retorna (problemas, colunas criadas no esqueleto, migrações que falharam).
+    """
+    dsn = dsn or os.environ.get('INDICES_DB_URL') or DSN_PADRAO
+    conninfo, remover = _banco_temporario(dsn)
+    try:
+        with conectar(conninfo) as conn:
+            conn.autocommit = True
+            criadas, falhas = carregar_migracoes(conn, migrations_dir)
+            return verificar(conn, criadas), criadas, falhas
+    finally:
+        remover()
+
+def _proximo_arquivo(migrations_dir, sufixo='indices_scripts'):
+    versao = datetime.date.today().strftime('%Y%m%d')
+    return os.path.join(migrations_dir, f"{versao}_{sufixo}.sql")
+
+if __name__ == "__main__":
+    # Uso: python verificar_indices.py [--dsn postgresql://...] [--gerar [arquivo.sql]]
+    # O dsn aponta para um Postgres local; um banco temporário é criado e removido nele.
+    parser = argparse.ArgumentParser(description="Verifica se os padrões de consulta dos scripts usam índices")
+    parser.add_argument('--dsn', help="Servidor Postgres local (padrão: INDICES_DB_URL ou localhost)")
+    parser.add_argument('--gerar', nargs='?', const='', metavar='ARQUIVO',
+                        help="Grava a migração com os índices que faltam (padrão: database/migrations/<data>_indices_scripts.sql)")
+    args = parser.parse_args()
+
+    problemas, criadas, falhas = verificar_indices(args.dsn)
+    if criadas:
+        print("Tabelas e colunas que as migrações não criam (esqueletos para o EXPLAIN):")
+        for item in criadas:
+            print(f"  {item}")
+    if falhas:
+        print("Migrações que não carregaram em um Postgres puro:")
+        for versao, erro in falhas.items():
+            print(f"  {versao}: {erro}")
+
+    nao_verificados = [problema for problema in problemas if problema.tipo == 'nao_verificado']
+    problemas = [problema for problema in problemas if problema.tipo != 'nao_verificado']
+
+    def mostrar(lista):
+        for problema in lista:
+            scripts = f" [{', '.join(problema.scripts)}]" if problema.scripts else ""
+            print(f"  {problema.tipo:<14} {problema.tabela}({', '.join(problema.colunas)}): {problema.detalhe}{scripts}")
+
+    if nao_verificados:
+        print(f"{len(nao_verificados)} padrão(ões) não verificado(s): só existem no esqueleto, confira no banco real:")
+        mostrar(nao_verificados)
+    if not problemas:
+        print("Todos os padrões verificados usam índice.")
+        sys.exit(0)
+    print(f"{len(problemas)} problema(s):")
+    mostrar(problemas)
+
+    if args.gerar is not None:
+        caminho = args.gerar or _proximo_arquivo(MIGRATIONS_DIR)
+        with open(caminho, 'w', encoding='utf-8') as file:
+            file.write(gerar_migracao(problemas))
+        print(f"Migração gravada em {caminho}")
+    sys.exit(1)